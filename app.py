@@ -1,17 +1,53 @@
 # app.py
+import itertools
+import logging
 import os
 import threading
 import time
 from datetime import datetime
-import importlib.util # Để tải module động an toàn hơn
 
 from flask import Flask, render_template, jsonify, request, g
 from flask_socketio import SocketIO
 
+import fixtures
+import metrics
+import profiler
+import station_log
+from emitter import EventBatcher
+from history import HistoryStore
+from led_service import LedService
+from log_store import LogStore
+from resources import ResourceLockManager, lock_resources_for
+from scheduler import build_conflict_graph, order_by_dependencies, run_tasks_parallel
+from task_registry import TaskRegistry
+from task_launcher import TaskCancelled, TaskLauncher, TaskTimeout
+
 # --- Cấu hình ứng dụng ---
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'this-is-a-very-secret-key-for-dev'
     TASK_FOLDER = 'tasks' # Tên thư mục chứa các file task test
+    MAX_PARALLEL_TASKS = 0 # Số task chạy song song tối đa trong Auto Test (0 = không giới hạn)
+    LOG_BUFFER_SIZE = 5000 # Số dòng log console tối đa giữ trong bộ nhớ
+    EMIT_INTERVAL = 0.1 # Chu kỳ (giây) gửi lô sự kiện Socket.IO tới client
+    EMIT_MAX_BATCH = 50 # Gửi lô ngay khi có từng này sự kiện đang chờ
+    MAX_TASK_WORKERS = 4 # Số tiến trình con chạy task cùng lúc
+    TASK_TIMEOUT = 600 # Thời gian tối đa (giây) cho một task nếu task không khai báo TIMEOUT
+    TASK_CANCEL_GRACE = 10 # Thời gian (giây) chờ task dọn dẹp sau khi huỷ/quá hạn trước khi kill
+    TASK_RELOAD_INTERVAL = 2 # Chu kỳ (giây) kiểm tra mtime các file task để tải lại khi có thay đổi
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO') # Mức log mặc định của server và các task
+    LOG_LEVELS = {} # Mức log riêng theo logger, ví dụ {'task_2_RS485': 'DEBUG'}
+    UI_LOG_LEVEL = 'INFO' # Mức log tối thiểu của task được đẩy lên console trên giao diện
+    HISTORY_DB = os.environ.get('HISTORY_DB') or 'data/history.db' # File SQLite lưu lịch sử test
+    HISTORY_PAGE_SIZE = 50 # Số dòng mặc định mỗi trang của /history
+    FIXTURE_FILE = os.environ.get('FIXTURE_FILE') or 'fixtures.json' # Các slot của jig nhiều board (xem fixtures.py)
+    PROFILE_TASKS = True # Ghi dòng thời gian sleep/subprocess/serial/GPIO của mỗi lần chạy (xem profiler.py)
+    STATUS_LED_HEARTBEAT = [119, 121] # LED nhịp tim: đảo trạng thái mỗi nhịp (xem led_service.py)
+    STATUS_LED_CHASE = [133, 132, 134, 125] # LED trạng thái trạm: idle/running/passed/failed
+    STATUS_LED_PATTERNS = {} # Mẫu nháy riêng theo trạng thái, ví dụ {'failed': {'interval': 0.1, 'frames': [...]}}
+
+# --- Log: ghi qua hàng đợi, luồng nền format và ghi ra stderr/journal ---
+station_log.setup_logging(Config.LOG_LEVEL, Config.LOG_LEVELS)
+logger = logging.getLogger(__name__)
 
 # --- Khởi tạo Flask App và SocketIO ---
 # Flask sẽ tự động tìm thư mục 'static' và 'templates' trong cùng cấp với file app.py
@@ -21,238 +57,684 @@ app.config.from_object(Config) # Áp dụng cấu hình
 # Khởi tạo SocketIO và liên kết với ứng dụng Flask.
 # async_mode='eventlet' là cần thiết để SocketIO hoạt động hiệu quả với nhiều kết nối đồng thời.
 socketio = SocketIO(app, async_mode='eventlet')
+# Các sự kiện trạng thái task và log được gom lại và gửi theo lô thay vì gửi từng sự kiện từ luồng task
+event_batcher = EventBatcher(socketio, app.config['EMIT_INTERVAL'], app.config['EMIT_MAX_BATCH'])
+event_batcher.start()
+# Mỗi lần chạy task là một tiến trình con riêng, có thể kill khi quá hạn
+task_launcher = TaskLauncher(app.config['MAX_TASK_WORKERS'], app.config['TASK_CANCEL_GRACE'],
+                              profile=app.config['PROFILE_TASKS'])
+
+# LED trạng thái của trạm: main.py khởi động luồng nháy, Auto Test đổi mẫu nháy theo kết quả
+status_leds = LedService(app.config['STATUS_LED_HEARTBEAT'], app.config['STATUS_LED_CHASE'],
+                         app.config['STATUS_LED_PATTERNS'])
+
+# Lịch sử test (SQLite WAL): ghi qua luồng nền, không chặn luồng chạy task hay request HTTP
+history = HistoryStore(os.path.join(os.path.dirname(os.path.abspath(__file__)), app.config['HISTORY_DB']))
+
+# --- Danh sách task: tải một lần khi khởi động, tra cứu theo id/tên ---
+# os.path.dirname(__file__) là đường dẫn của file app.py, nối với tên thư mục 'tasks'
+task_registry = TaskRegistry(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), app.config['TASK_FOLDER']),
+    {'timeout': app.config['TASK_TIMEOUT']})
+# Các slot của jig: mỗi slot là một board chạy toàn bộ task với cổng/GPIO riêng
+slots = fixtures.load_slots(os.path.join(os.path.dirname(os.path.abspath(__file__)), app.config['FIXTURE_FILE']))
+# Task của từng slot (mỗi task trong registry x mỗi slot), tra cứu theo tên hiển thị
+slot_tasks = []
+slot_tasks_by_name = {}
+slot_tasks_by_id = {}
 
 # --- Biến toàn cục để quản lý trạng thái của các task và logs ---
 # task_results: Một dictionary lưu trữ trạng thái hiện tại của mỗi task
 #   Ví dụ: {'Example Gpio': {'status': 'Pending', 'message': '...'}}
 task_results = {}
-# task_logs: Một danh sách lưu trữ tất cả các dòng log để hiển thị trên console frontend
-task_logs = []
+# task_logs: Bộ đệm vòng lưu các dòng log gần nhất để hiển thị trên console frontend
+#   Mỗi dòng có một seq tăng dần, client lấy phần còn thiếu qua /logs?after=<seq>
+task_logs = LogStore(app.config['LOG_BUFFER_SIZE'])
 # Biến cờ để kiểm soát xem chế độ Auto Test có đang chạy hay không
 auto_test_running = False
+# Được set khi người dùng huỷ Auto Test: không chạy thêm task nào trong hàng đợi
+auto_test_cancel = threading.Event()
+# Dòng thời gian (span) của lần chạy gần nhất mỗi task, không gửi qua Socket.IO mà lấy qua /task_spans
+task_spans = {}
+# Các lần chạy đang diễn ra: {tên task: owner/run_id}, dùng để huỷ theo tên task
+active_runs = {}
+# Quản lý khoá tài nguyên phần cứng (cổng serial, GPIO, sysfs, module) giữa các task đang chạy
+resource_locks = ResourceLockManager()
+# Version của trạng thái task: tăng mỗi lần task_results thay đổi và được gửi kèm mỗi delta,
+# để client phát hiện bị mất sự kiện và xin lại snapshot
+state_version = 0
+state_lock = threading.Lock()
+# Bộ đếm lượt chạy, dùng để đặt tên owner khoá duy nhất cho mỗi lần chạy task
+run_counter = itertools.count(1)
+
+# --- Metric (Prometheus, xem /metrics) ---
+TASK_DURATION = metrics.histogram(
+    'dcg_task_duration_seconds', 'Task run duration (excluding resource wait)', ['task', 'slot', 'status'],
+    buckets=(1, 5, 10, 30, 60, 120, 180, 300, 600))
+STEP_DURATION = metrics.histogram(
+    'dcg_step_duration_seconds', 'Duration of one detail item (test step)', ['task', 'item'],
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 120))
+RESOURCE_WAIT = metrics.histogram(
+    'dcg_resource_wait_seconds', 'Time a task waited for its hardware resources', ['task', 'slot'],
+    buckets=(0.1, 1, 5, 10, 30, 60, 120, 300))
+DETAIL_RESULTS = metrics.counter(
+    'dcg_detail_results_total', 'Detail item results', ['task', 'item', 'result'])
+TASK_RUNS = metrics.counter('dcg_task_runs_total', 'Task runs by final status', ['task', 'slot', 'status'])
+AUTO_TEST_CYCLE = metrics.histogram(
+    'dcg_auto_test_cycle_seconds', 'Auto Test cycle time (all slots)', ['result'],
+    buckets=(30, 60, 120, 180, 300, 450, 600, 900, 1200, 1800))
+SOCKETIO_CLIENTS = metrics.gauge('dcg_socketio_clients', 'Connected Socket.IO clients')
+SOCKETIO_CLIENTS.set(0)  # Gauge không có label: luôn có mẫu trên /metrics, kể cả trước client đầu tiên
+metrics.gauge('dcg_emit_queue_depth', 'Socket.IO events waiting for the next batch',
+              function=lambda: event_batcher.queue_depth)
+metrics.gauge('dcg_emit_last_flush_latency_seconds', 'Age of the oldest event in the last emitted batch',
+              function=lambda: event_batcher.stats()['last_flush_latency'])
+
+def record_detail_metrics(task, detail):
+    """Đếm kết quả và thời gian của một hạng mục (bước) của task."""
+    DETAIL_RESULTS.inc(task=task['title'], item=detail.get('item'), result=detail.get('result'))
+    if isinstance(detail.get('duration'), (int, float)):
+        STEP_DURATION.observe(detail['duration'], task=task['title'], item=detail.get('item'))
+
+# --- Các hàm hỗ trợ để đồng bộ trạng thái với client ---
+def publish_task_status(task_name):
+    """Tăng version và gửi trạng thái mới của một task (delta) tới tất cả client."""
+    global state_version
+    with state_lock:
+        state_version += 1
+        event_batcher.status(task_name, task_results[task_name], state_version)
+
+def publish_full_status():
+    """Tăng version và gửi toàn bộ bảng trạng thái tới tất cả client (khi reset Auto Test)."""
+    global state_version
+    with state_lock:
+        state_version += 1
+        payload = {'version': state_version, 'tasks': task_results}
+        event_batcher.emit('full_task_status_update', payload)
+
+def state_snapshot():
+    """Snapshot trạng thái hiện tại, gửi riêng cho client mới kết nối hoặc client xin đồng bộ lại."""
+    with state_lock:
+        return {
+            'version': state_version,
+            'tasks': task_results,
+            'auto_test_running': auto_test_running,
+            'log_seq': task_logs.last_seq,
+        }
 
 # --- Các hàm hỗ trợ để tải và chạy Task ---
-def load_tasks():
-    print("[DEBUG] Start loading tasks from folder.")
-    tasks = []
-    # Lấy đường dẫn tuyệt đối đến thư mục chứa các task
-    # os.path.dirname(__file__) là đường dẫn của file app.py
-    # os.path.join sẽ nối với tên thư mục 'tasks'
-    task_dir = os.path.join(os.path.dirname(__file__), app.config['TASK_FOLDER'])
-
-    if not os.path.exists(task_dir):
-        print(f"Error: Task folder '{task_dir}' not found. Please create it.")
-        return []
-
-    # Lặp qua tất cả các file trong thư mục tasks
-    for filename in os.listdir(task_dir):
-        # Chỉ xử lý các file có tên bắt đầu bằng 'task_' và kết thúc bằng '.py'
-        # và không phải là chính file __init__.py (nếu có)
-        if filename.startswith('task_') and filename.endswith('.py') and filename != '__init__.py':
-            module_name = filename[:-3] # Cắt bỏ phần mở rộng .py để lấy tên module
-            print(f"[DEBUG] loading module: {module_name}")
-            try:
-                # Tạo một spec (đặc tả) để tải module từ đường dẫn file
-                spec = importlib.util.spec_from_file_location(module_name, os.path.join(task_dir, filename))
-                module = importlib.util.module_from_spec(spec)
-                # Tải và thực thi module
-                spec.loader.exec_module(module)
-
-                # Mỗi file task phải có một hàm tên là 'test_task'
-                if hasattr(module, 'test_task'):
-                    #print(f"[DEBUG] Đã tìm thấy hàm test_task trong {filename}")
-                    tasks.append({
-                        'id': module_name, # ID duy nhất cho task (ví dụ: task_example_gpio)
-                        # Tên hiển thị trên giao diện (ví dụ: "Example Gpio")
-                        'name': module_name.replace('task_', '').replace('_', ' ').title(),
-                        # Mô tả từ module, hoặc mặc định
-                        'description': getattr(module, 'DESCRIPTION', 'No description provided.'),
-                        'function': module.test_task # Tham chiếu đến hàm test_task
-                    })
-                else:
-                    print(f"[WARNING] Task file '{filename}' there is no function 'test_task'.")
-            except Exception as e:
-                print(f"[ERROR] Error when loading task {filename}: {e}")
-    print(f"[DEBUG] Finished load {len(tasks)} task.")
-    # Sắp xếp các task theo tên để hiển thị nhất quán trên giao diện
-    return sorted(tasks, key=lambda x: x['name'])
-
-def execute_single_task(task):
-    global task_results, task_logs
+def log_to_console(log_message):
+    """Lưu một dòng log vào bộ đệm và đẩy tới các client đang kết nối."""
+    seq = task_logs.append(log_message)
+    event_batcher.log(seq, log_message)
+    return seq
+
+# Log của các task (record có trường `task`) được đẩy lên console trên giao diện
+station_log.add_sink(log_to_console, app.config['UI_LOG_LEVEL'],
+                     lambda record: getattr(record, 'task', None) is not None)
+
+def find_task(name):
+    """Tìm task của slot theo tên hiển thị (hoặc theo id)."""
+    return slot_tasks_by_name.get(name) or slot_tasks_by_id.get(name)
+
+def rerun_plan(task, dut_serial):
+    """
+    Kế hoạch chạy lại phần lỗi của task trên board dut_serial, theo kết quả gần nhất trong lịch sử.
+    None nếu lần gần nhất đã Passed (không cần chạy lại). Ngược lại {'previous': ..., 'keep': [...]}:
+    các hạng mục đã đạt (keep) được task bỏ qua qua SKIP_ITEMS và giữ lại trong kết quả mới.
+    Task không khai báo SKIP_ITEMS, hoặc chưa có lần chạy nào, được chạy lại toàn bộ (keep rỗng).
+    """
+    history.flush(5)  # Kết quả vừa chạy có thể còn trong hàng đợi ghi
+    previous = history.last_task_result(task['name'], dut_serial)
+    if previous is not None and previous['status'] == 'Passed':
+        return None
+    keep = []
+    if previous is not None and task['skippable']:
+        keep = [{'item': d['item'], 'result': d['result'], 'detail': d['detail'], 'passed': True,
+                 'previous_run': previous['run_id']}
+                for d in previous['details'] if d['passed']]
+    return {'previous': previous, 'keep': keep}
+
+def merge_rerun_details(plan, details):
+    """Kết quả đầy đủ sau khi chạy lại: hạng mục giữ lại + hạng mục vừa chạy, theo thứ tự của lần trước."""
+    rerun_items = {d.get('item') for d in details}
+    merged = [d for d in plan['keep'] if d['item'] not in rerun_items] + list(details)
+    order = {d['item']: index for index, d in enumerate(plan['previous']['details'])}
+    merged.sort(key=lambda d: order.get(d.get('item'), len(order)))
+    return merged
+
+def execute_single_task(task, cancel_event=None, run=None, plan=None):
+    """
+    Chạy một task sau khi đã giữ được một tiến trình chạy task và khoá tất cả tài nguyên phần cứng mà nó khai báo.
+    cancel_event: Event của Auto Test, nếu được set trong lúc chờ tiến trình/tài nguyên thì task không chạy nữa.
+    run: lần chạy trong lịch sử {'id': run_id, 'dut_serial': ...} mà kết quả task được ghi vào.
+    plan: kế hoạch chạy lại phần lỗi (xem rerun_plan), None = chạy toàn bộ task.
+    """
+    lock_resources = lock_resources_for(task)
+    owner = f"{task['id']}#{next(run_counter)}"
+    # Giữ chỗ tiến trình chạy task trước khi khoá tài nguyên: task chờ tiến trình trống không giữ khoá
+    # cổng serial/GPIO, thời gian chờ không tính vào thời gian chạy task
+    while not task_launcher.reserve(timeout=0.5):
+        if cancel_event is not None and cancel_event.is_set():
+            mark_cancelled(task, run)
+            return
+    try:
+        busy = resource_locks.busy(lock_resources)
+        wait_started = time.monotonic()
+        if busy:
+            # Chờ task khác nhả tài nguyên (ví dụ: chạy lẻ một task trong lúc Auto Test đang chạy)
+            task_results[task['name']] = {'status': 'Pending', 'message': f"Waiting for resources: {', '.join(sorted(busy))}", 'details': []}
+            publish_task_status(task['name'])
+        while not resource_locks.acquire(owner, lock_resources, timeout=0.5):
+            if cancel_event is not None and cancel_event.is_set():
+                mark_cancelled(task, run)
+                return
+        try:
+            if cancel_event is not None and cancel_event.is_set():
+                mark_cancelled(task, run)
+                return
+            RESOURCE_WAIT.observe(time.monotonic() - wait_started, task=task['title'], slot=task['slot'])
+            _run_task(task, owner, run, plan)
+        finally:
+            resource_locks.release(owner)
+    finally:
+        task_launcher.release()
+
+def mark_cancelled(task, run=None):
+    """Đánh dấu một task chưa kịp chạy là đã bị huỷ."""
+    task_results[task['name']] = {'status': 'Cancelled', 'message': 'Cancelled before start', 'details': []}
+    publish_task_status(task['name'])
+    if run is not None:
+        history.record_task(run['id'], run['dut_serial'], task['name'], 'Cancelled', 'Cancelled before start',
+                            [], time.time())
+
+def unmet_prerequisites(task):
+    """
+    Các điều kiện chưa đạt của task theo kết quả hiện tại trong task_results, ví dụ
+    ["1 System: Serial ports (ttyACM0-3)"]. Hạng mục chưa chạy (task điều kiện lỗi giữa chừng,
+    bị huỷ hoặc bị bỏ qua) cũng tính là chưa đạt.
+    """
+    unmet = []
+    for prerequisite_id, items in task.get('prerequisites', {}).items():
+        prerequisite = slot_tasks_by_id.get(prerequisite_id)
+        if prerequisite is None:
+            logger.warning("Task %s: unknown prerequisite task %s", task['name'], prerequisite_id)
+            continue
+        result = task_results.get(prerequisite['name'], {})
+        if not items:
+            if result.get('status') != 'Passed':
+                unmet.append(prerequisite['title'])
+            continue
+        passed = {d.get('item') for d in result.get('details') or [] if d.get('passed')}
+        unmet += [f"{prerequisite['title']}: {item}" for item in items if item not in passed]
+    return unmet
+
+def skip_if_blocked(task, run=None):
+    """Đánh dấu task là Skipped (không chạy) nếu có điều kiện chưa đạt. Trả về True nếu đã bỏ qua."""
+    unmet = unmet_prerequisites(task)
+    if not unmet:
+        return False
+    message = "Skipped, prerequisite failed: " + ', '.join(unmet)
+    logger.info("Task %s: %s", task['name'], message)
+    task_results[task['name']] = {'status': 'Skipped', 'message': message, 'details': []}
+    publish_task_status(task['name'])
+    TASK_RUNS.inc(task=task['title'], slot=task['slot'], status='Skipped')
+    if run is not None:
+        history.record_task(run['id'], run['dut_serial'], task['name'], 'Skipped', message, [], time.time())
+    return True
+
+def run_single_task(task, dut_serial=None, plan=None):
+    """Chạy lẻ một task (nút Run trên trang task) như một lần chạy riêng trong lịch sử."""
+    run = {'id': history.start_run(dut_serial, 'rerun' if plan else 'single'), 'dut_serial': dut_serial}
+    try:
+        execute_single_task(task, run=run, plan=plan)
+    finally:
+        history.finish_run(run['id'], task_results.get(task['name'], {}).get('status'))
+
+def cancel_task_run(task_name):
+    """Huỷ lần chạy đang diễn ra của một task. Trả về False nếu task không chạy."""
+    owner = active_runs.get(task_name)
+    if owner is None:
+        return False
+    logger.info("Cancel requested: %s (%s)", task_name, owner)
+    task_launcher.cancel(owner)
+    return True
+
+def cancel_all_runs():
+    """Huỷ Auto Test (các task còn trong hàng đợi) và tất cả các task đang chạy."""
+    if auto_test_running:
+        auto_test_cancel.set()
+    for task_name in list(active_runs):
+        cancel_task_run(task_name)
+
+def _run_task(task, owner, run=None, plan=None):
     task_name = task['name']
-    task_id = task['id']
+    started_at = time.time()
+    if plan and plan['keep']:
+        # Tiến trình task nhận danh sách hạng mục bỏ qua cùng các biến ghi đè của slot
+        skip_items = [d['item'] for d in plan['keep']]
+        task = dict(task, overrides=dict(task['overrides'], SKIP_ITEMS=skip_items))
 
     # Cập nhật trạng thái ban đầu
     task_results[task_name] = {'status': 'Running', 'message': 'Running test...', 'details': []}
     log_message = f"[{datetime.now().strftime('%H:%M:%S')}] Starting run: {task_name}"
     #print('DEBUG]Emit task_status_update:', {task_name: task_results[task_name]})
-    socketio.emit('task_status_update', {task_name: task_results[task_name]}, namespace='/')
-    task_logs.append(log_message)
-
+    publish_task_status(task_name)
+    log_to_console(log_message)
+
+    streamed = []
+    # Dòng của task trong lịch sử được tạo ngay, các hạng mục stream được ghi khi nhận
+    task_result_id = history.start_task(run['id'], run['dut_serial'], task_name, started_at) if run is not None else None
+
+    def on_detail(detail):
+        # Task dạng generator: đẩy từng hạng mục tới client và ghi vào lịch sử ngay khi có kết quả
+        streamed.append(detail)
+        if task_result_id is not None:
+            history.add_details(task_result_id, [detail])
+        record_detail_metrics(task, detail)
+        publish_task_status(task_name)
+        log_to_console(f"[{datetime.now().strftime('%H:%M:%S')}] Task: {task_name} - {detail['item']}: {detail['result']}")
+
+    task_spans[task_name] = {'started_at': started_at, 'finished_at': None, 'spans': []}
+    active_runs[task_name] = owner
     try:
-        # Hàm test_task trả về (overall_status, overall_message, detail_results)
-        overall_status, overall_message, detail_results = task['function']()
+        # test_task chạy trong tiến trình con, trả về (overall_status, overall_message, detail_results)
+        # hoặc yield từng detail
+        overall_status, overall_message, detail_results = task_launcher.run(
+            task, task_results[task_name]['details'], on_detail, task['timeout'], task['step_timeout'], owner,
+            task_spans[task_name]['spans'], reserved=True)
+
+        if plan and plan['keep']:
+            # Chạy lại phần lỗi: kết quả gồm cả các hạng mục đã đạt ở lần trước (không đổi trạng thái task)
+            rerun_count = len(detail_results)
+            detail_results = merge_rerun_details(plan, detail_results)
+            kept = len(detail_results) - rerun_count
+            overall_message = f"{overall_message}\nRerun: {kept} passed item(s) kept from run {plan['previous']['run_id']}."
 
         # Cập nhật kết quả
         task_results[task_name]['status'] = overall_status
         task_results[task_name]['message'] = overall_message
         task_results[task_name]['details'] = detail_results
 
+    except TaskTimeout as e:
+        task_results[task_name]['status'] = 'Failed'
+        task_results[task_name]['message'] = f"Task stopped: {str(e)}"
+
+    except TaskCancelled as e:
+        task_results[task_name]['status'] = 'Cancelled'
+        task_results[task_name]['message'] = str(e)
+
     except Exception as e:
+        # Giữ lại các hạng mục đã nhận được trước khi task bị lỗi
         task_results[task_name]['status'] = 'Failed'
         task_results[task_name]['message'] = f"An error occurred: {str(e)}"
-        task_results[task_name]['details'] = []
+
+    finally:
+        active_runs.pop(task_name, None)
+        task_spans[task_name]['finished_at'] = time.time()
+
+    # Hạng mục của task không phải generator chỉ có khi task kết thúc
+    for detail in task_results[task_name]['details'][len(streamed):]:
+        record_detail_metrics(task, detail)
+    TASK_DURATION.observe(time.time() - started_at, task=task['title'], slot=task['slot'],
+                          status=task_results[task_name]['status'])
+    TASK_RUNS.inc(task=task['title'], slot=task['slot'], status=task_results[task_name]['status'])
 
     log_message = f"[{datetime.now().strftime('%H:%M:%S')}] Task: {task_name} finished with status: {task_results[task_name]['status']} - {task_results[task_name]['message']}"
-    task_logs.append(log_message)
     #print('DEBUG]Emit task_status_update:', {task_name: task_results[task_name]})
-    socketio.emit('task_status_update', {task_name: task_results[task_name]}, namespace='/')
-    socketio.emit('console_log_update', {'log': log_message}, namespace='/')
-    print(f"[DEBUG] Task {task_name} executed with status: {task_results[task_name]['status']}")
+    publish_task_status(task_name)
+    log_to_console(log_message)
+    logger.debug("Task %s executed with status: %s", task_name, task_results[task_name]['status'])
+    if run is not None:
+        result = task_results[task_name]
+        # Hạng mục đã stream đã có trong lịch sử; chỉ ghi lại khi kết quả cuối khác (task trả về tuple,
+        # chạy lại phần lỗi có thêm hạng mục giữ lại...)
+        history.finish_task(task_result_id, result['status'], result['message'],
+                            None if result['details'] == streamed else result['details'])
   
-def execute_all_tasks():
-    print("[DEBUG] Bắt đầu Auto Test cho tất cả các task.")
+def execute_all_tasks(dut_serials=None, rerun_failed=False):
+    logger.info("Bắt đầu Auto Test cho tất cả các task.")
     """
-    Thực thi tất cả các task theo chế độ tự động.
+    Thực thi tất cả các task theo chế độ tự động, trên tất cả các slot của jig cùng lúc.
     Quản lý biến cờ auto_test_running và gửi thông báo qua SocketIO.
+    dut_serials: {tên slot: số serial của board trong slot}.
+    rerun_failed: chỉ chạy lại các task/hạng mục lỗi ở lần chạy gần nhất của từng board (xem rerun_plan),
+    task đã Passed được giữ nguyên kết quả cũ.
     """
-    global auto_test_running, task_results, task_logs
-    tasks = app.config['LOADED_TASKS'] # Lấy danh sách task từ cấu hình ứng dụng
+    global auto_test_running
+    dut_serials = dut_serials or {}
+    cycle_started = time.monotonic()
+    slot_order = {slot.name: index for index, slot in enumerate(slots)}
+    # Xếp xen kẽ các slot (task 1 của A, B..., rồi task 2...) để các board tiến triển đều nhau,
+    # task điều kiện (PREREQUISITES) luôn đứng trước task phụ thuộc nó
+    tasks = order_by_dependencies(sorted(slot_tasks, key=lambda task: (task['title'], slot_order[task['slot']])))
+    # Mỗi board (slot) là một lần chạy riêng trong lịch sử
+    runs = {slot.name: {'id': history.start_run(dut_serials.get(slot.name), 'rerun' if rerun_failed else 'auto'),
+                        'dut_serial': dut_serials.get(slot.name)} for slot in slots}
+    plans = {}
+    if rerun_failed:
+        plans = {task['name']: rerun_plan(task, dut_serials.get(task['slot'])) for task in tasks}
+    auto_test_cancel.clear()
     task_logs.clear()  # Xóa log cũ
     log_entry = f"[{datetime.now().strftime('%H:%M:%S')}] [INFO] --- Auto Test Started ---"
-    task_logs.append(log_entry)
-    socketio.emit('console_log_update', {'log': log_entry}, namespace='/')
+    log_to_console(log_entry)
 
     # Reset tất cả các task về trạng thái "Pending" khi bắt đầu auto test
     for task in tasks:
         task_results[task['name']] = {'status': 'Pending', 'message': ''}
+    # Chạy lại phần lỗi: task đã Passed ở lần trước không chạy, kết quả cũ được chép sang lần chạy mới
+    passed_before = [task for task in tasks if task['name'] in plans and plans[task['name']] is None]
+    for task in passed_before:
+        run = runs[task['slot']]
+        previous = history.last_task_result(task['name'], run['dut_serial'])
+        details = [{'item': d['item'], 'result': d['result'], 'detail': d['detail'], 'passed': bool(d['passed']),
+                    'previous_run': previous['run_id']} for d in previous['details']]
+        message = f"Passed in run {previous['run_id']}, not rerun."
+        task_results[task['name']] = {'status': 'Passed', 'message': message, 'details': details}
+        history.record_task(run['id'], run['dut_serial'], task['name'], 'Passed', message, details, time.time())
+    tasks_to_run = [task for task in tasks if task not in passed_before]
     # Gửi cập nhật trạng thái toàn bộ bảng tới client để reset giao diện
-    socketio.emit('full_task_status_update', task_results, namespace='/')
-
-    # Chạy từng task một
-    for task in tasks:
-        print(f"[DEBUG] Running (auto): {task['name']} ")
-        execute_single_task(task)
-        # time.sleep(0.5) # Giả lập một chút độ trễ giữa các task
-
-    log_entry = f"[{datetime.now().strftime('%H:%M:%S')}] [INFO] --- Auto Test Finished ---"
-    task_logs.append(log_entry)
-    socketio.emit('console_log_update', {'log': log_entry}, namespace='/')
+    publish_full_status()
+
+    # Chạy song song các task không dùng chung tài nguyên phần cứng
+    conflict_graph = build_conflict_graph(tasks_to_run)
+    for task in tasks_to_run:
+        conflicts = sorted(conflict_graph[task['id']])
+        logger.debug("Running (auto): %s conflicts with: %s", task['name'], conflicts)
+    not_started = run_tasks_parallel(
+        tasks_to_run,
+        lambda task: execute_single_task(task, auto_test_cancel, runs[task['slot']], plans.get(task['name'])),
+        app.config['MAX_PARALLEL_TASKS'], auto_test_cancel.is_set,
+        lambda task: skip_if_blocked(task, runs[task['slot']]))
+    for task in not_started:
+        mark_cancelled(task, runs[task['slot']])
+
+    for slot_name, run in runs.items():
+        statuses = [task_results[task['name']]['status'] for task in tasks if task['slot'] == slot_name]
+        if auto_test_cancel.is_set():
+            history.finish_run(run['id'], 'Cancelled')
+        else:
+            history.finish_run(run['id'], 'Passed' if all(status == 'Passed' for status in statuses) else 'Failed')
+    if auto_test_cancel.is_set():
+        cycle_result = 'Cancelled'
+    else:
+        cycle_result = 'Passed' if all(task_results[task['name']]['status'] == 'Passed' for task in tasks) else 'Failed'
+    AUTO_TEST_CYCLE.observe(time.monotonic() - cycle_started, result=cycle_result)
+    status_leds.set_state('idle' if cycle_result == 'Cancelled' else cycle_result.lower())
+
+    if auto_test_cancel.is_set():
+        log_entry = f"[{datetime.now().strftime('%H:%M:%S')}] [INFO] --- Auto Test Cancelled ---"
+    else:
+        log_entry = f"[{datetime.now().strftime('%H:%M:%S')}] [INFO] --- Auto Test Finished ---"
+    log_to_console(log_entry)
 
     auto_test_running = False # Đặt lại cờ khi hoàn thành
     # Gửi sự kiện tới client để thông báo auto test đã kết thúc (và kích hoạt lại các nút)
-    socketio.emit('auto_test_finished', namespace='/')
-
-    print("[DEBUG] Auto test done.")
+    event_batcher.emit('auto_test_finished')
+
+    logger.info("Auto test done.")
+
+
+def sync_task_registry():
+    """Tải lại các file task mới/có thay đổi và cập nhật bảng trạng thái tương ứng."""
+    global slot_tasks, slot_tasks_by_name, slot_tasks_by_id
+    added, updated, removed = task_registry.refresh()
+    if not (added or updated or removed):
+        return
+    # Gắn lại toàn bộ task vào các slot (slot sau task trước để giao diện nhóm theo slot)
+    bound = [fixtures.bind_task(task, slot) for slot in slots for task in task_registry.tasks]
+    slot_tasks_by_name = {task['name']: task for task in bound}
+    slot_tasks_by_id = {task['id']: task for task in bound}
+    slot_tasks = bound
+    for task in removed:
+        for slot in slots:
+            task_results.pop(fixtures.bind_task(task, slot)['name'], None)
+    # Khởi tạo trạng thái "Pending" cho các task mới
+    for task in bound:
+        task_results.setdefault(task['name'], {'status': 'Pending', 'message': ''})
+    logger.info("Tasks loaded: %d added, %d reloaded, %d removed.", len(added), len(updated), len(removed))
+    publish_full_status()
+
+def watch_task_folder():
+    """Luồng nền: định kỳ kiểm tra mtime các file task để tải lại mà không cần khởi động lại server."""
+    while True:
+        socketio.sleep(app.config['TASK_RELOAD_INTERVAL'])
+        try:
+            sync_task_registry()
+        except Exception as e:
+            logger.error("Task reload failed: %s", e)
+
+# Tải danh sách task một lần khi khởi động, sau đó chỉ tải lại khi file thay đổi
+sync_task_registry()
+socketio.start_background_task(watch_task_folder)
 
 
 # --- Flask Routes ---
 @app.before_request
 def load_global_tasks():
-    print(f"[DEBUG] before_request: Kiểm tra và load tasks nếu cần.")
-    """
-    Hàm này được chạy trước mỗi yêu cầu HTTP tới ứng dụng Flask.
-    Nó đảm bảo rằng danh sách các task được tải một lần và lưu vào app.config
-    để có thể truy cập dễ dàng bởi các route và trong templates qua `g.tasks`.
-    """
-    # Chỉ load tasks một lần khi app mới khởi động
-    if 'LOADED_TASKS' not in app.config:
-        print("[DEBUG] load tasks")
-        app.config['LOADED_TASKS'] = load_tasks()
-        print(f"[DEBUG] Đã load {len(app.config['LOADED_TASKS'])} tasks.")
-
-        # Khởi tạo task_results lần đầu với trạng thái "Pending" cho tất cả các task
-        for task in app.config['LOADED_TASKS']:
-            task_results[task['name']] = {'status': 'Pending', 'message': ''}
-    
-    g.tasks = app.config['LOADED_TASKS'] # Lưu vào g để truy cập trong templates
-    print(f"[DEBUG]  {len(g.tasks)} task.")
+    """Lưu danh sách task (đã tải sẵn khi khởi động) vào g để templates dùng qua `g.tasks`."""
+    g.tasks = slot_tasks
 
 
 @app.route('/')
 def dashboard():
-    print("[DEBUG] Truy cập dashboard, render danh sách task.")
+    logger.debug("Truy cập dashboard, render danh sách task.")
     """Route cho trang Dashboard chính."""
     # Truyền danh sách task và kết quả hiện tại của chúng tới template
-    return render_template('dashboard.html', tasks=g.tasks, task_results=task_results)  # tasks là list, mỗi task có .result và .summary
+    return render_template('dashboard.html', tasks=g.tasks, slots=slots, task_results=task_results, state_version=state_version)  # tasks là list, mỗi task có .result và .summary
 
 @app.route('/task/<task_name_encoded>')
 def show_task(task_name_encoded):
-    print(f"[DEBUG] Truy cập trang chi tiết task: {task_name_encoded}")
+    logger.debug("Truy cập trang chi tiết task: %s", task_name_encoded)
     """Route cho trang chi tiết của từng task."""
     # Giải mã tên task từ URL (ví dụ: "Example%20Gpio" thành "Example Gpio")
     # Sử dụng request.args.get('name') để tương thích nếu tên được truyền qua query parameter
     task_name = request.args.get('name', task_name_encoded.replace('%20', ' '))
     # Tìm thông tin task trong danh sách các task đã tải
-    task_info = next((task for task in g.tasks if task['name'] == task_name), None)
+    task_info = find_task(task_name)
     if task_info:
-        print(f"[DEBUG] found: {task_info['name']}")
+        logger.debug("found: %s", task_info['name'])
         # Render template task.html và truyền thông tin task và kết quả hiện tại của nó
         return render_template('task.html', task=task_info, result=task_results.get(task_name, {'status': 'Pending', 'message': ''}))
-    print(f"[WARNING]{task_name} not found in loaded tasks.")
+    logger.warning("%s not found in loaded tasks.", task_name)
     return "Task not found", 404 # Trả về lỗi 404 nếu không tìm thấy task
 
 @app.route('/run_task/<task_name_encoded>', methods=['POST'])
 def run_task_route(task_name_encoded):
-    print(f"[DEBUG] Run task: {task_name_encoded}")
+    logger.debug("Run task: %s", task_name_encoded)
     """API endpoint để chạy một task cụ thể (được gọi qua AJAX POST từ frontend)."""
     task_name = request.args.get('name', task_name_encoded.replace('%20', ' '))
-    task_to_run = next((task for task in g.tasks if task['name'] == task_name), None)
+    task_to_run = find_task(task_name)
     if task_to_run:
-        print(f"[DEBUG] Starting run:[{task_name}]")
+        # Không cho chạy nếu task đang dùng tài nguyên mà một task khác đang giữ
+        busy = resource_locks.busy(lock_resources_for(task_to_run))
+        if busy:
+            holders = ', '.join(f"{resource} ({owner})" for resource, owner in sorted(busy.items()))
+            logger.warning("Task %s busy: %s", task_name, holders)
+            return jsonify(success=False, message=f"Resources in use: {holders}"), 409
+        dut_serial = request.values.get('dut_serial')
+        plan = None
+        # rerun=failed: chỉ chạy lại các hạng mục lỗi ở lần chạy gần nhất của board này
+        if request.values.get('rerun') == 'failed':
+            if not dut_serial:
+                return jsonify(success=False, message="dut_serial is required to rerun failed items."), 400
+            plan = rerun_plan(task_to_run, dut_serial)
+            if plan is None:
+                return jsonify(success=False, message=f"Task '{task_name}' already passed for {dut_serial}.")
+        logger.info("Starting run: [%s]", task_name)
         # Chạy task trong một luồng riêng biệt để không làm block ứng dụng chính
-        thread = threading.Thread(target=execute_single_task, args=(task_to_run,))
+        thread = threading.Thread(target=run_single_task, args=(task_to_run, dut_serial, plan))
         thread.daemon = True # Đặt luồng là daemon để nó tự kết thúc khi ứng dụng chính tắt
         thread.start()
         return jsonify(success=True, message=f"Task '{task_name}' started in background.")
-    print(f"[WARNING] Task not found: {task_name}")
+    logger.warning("Task not found: %s", task_name)
     return jsonify(success=False, message="Task not found."), 404
 
 @app.route('/run_all_tasks', methods=['POST'])
 def run_all_tasks_route():
-    print("[DEBUG] Automatic run all tasks requested.")
+    logger.debug("Automatic run all tasks requested.")
 
     global auto_test_running # Sử dụng biến cờ toàn cục
     if auto_test_running:
-        print("[WARNING] Auto test running.")
+        logger.warning("Auto test running.")
         return jsonify(success=False, message="Auto test is already running.")
 
+    # Số serial của board đang test (DUT), dùng để tra lịch sử theo từng board
+    # Jig nhiều slot: dut_serial[<tên slot>]=...; một board: dut_serial=...
+    dut_serials = {slot.name: request.values.get(f"dut_serial[{slot.name}]") for slot in slots if slot.name}
+    if len(slots) == 1 and not dut_serials.get(slots[0].name):
+        dut_serials[slots[0].name] = request.values.get('dut_serial')
+    # rerun=failed: chỉ chạy lại các task/hạng mục lỗi ở lần chạy gần nhất của từng board
+    rerun_failed = request.values.get('rerun') == 'failed'
+    if rerun_failed and not all(dut_serials.get(slot.name) for slot in slots):
+        return jsonify(success=False, message="dut_serial of every slot is required to rerun failed items."), 400
+
     auto_test_running = True
     # Gửi sự kiện tới client để thông báo auto test đã bắt đầu (và vô hiệu hóa các nút)
-    socketio.emit('auto_test_started', namespace='/')
+    event_batcher.emit('auto_test_started')
+    status_leds.set_state('running')
 
     # Chạy tất cả các task trong một luồng riêng
-    thread = threading.Thread(target=execute_all_tasks)
+    thread = threading.Thread(target=execute_all_tasks, args=(dut_serials, rerun_failed))
     thread.daemon = True
     thread.start()
-    print("[DEBUG] o test started in background.")
+    logger.debug("Auto test started in background.")
     return jsonify(success=True, message="Auto test started in background.")
 
+@app.route('/cancel_task/<task_name_encoded>', methods=['POST'])
+def cancel_task_route(task_name_encoded):
+    """Huỷ task đang chạy: task nhận tín hiệu dừng, chạy cleanup rồi kết thúc."""
+    task_name = request.args.get('name', task_name_encoded.replace('%20', ' '))
+    if find_task(task_name) is None:
+        return jsonify(success=False, message="Task not found."), 404
+    if not cancel_task_run(task_name):
+        return jsonify(success=False, message=f"Task '{task_name}' is not running.")
+    return jsonify(success=True, message=f"Cancelling task '{task_name}'.")
+
+@app.route('/cancel_all_tasks', methods=['POST'])
+def cancel_all_tasks_route():
+    """Huỷ Auto Test: dừng task đang chạy và bỏ qua các task còn lại trong hàng đợi."""
+    cancel_all_runs()
+    return jsonify(success=True, message="Cancelling all running tasks.")
+
+@app.route('/resources')
+def get_resources():
+    """Tài nguyên khai báo của từng task và các khoá đang được giữ."""
+    declared = {task['id']: task['resources'] for task in g.tasks}
+    return jsonify(success=True, declared=declared, held=resource_locks.snapshot())
+
+@app.route('/emit_stats')
+def get_emit_stats():
+    """Độ sâu hàng đợi và độ trễ gửi lô sự kiện Socket.IO."""
+    return jsonify(success=True, **event_batcher.stats())
+
 @app.route('/test_items/<task_name>')
 def get_test_items(task_name):
-    # Tìm module task
-    task = next((t for t in g.tasks if t['name'] == task_name), None)
+    task = find_task(task_name)
     if not task:
         return jsonify({"success": False, "message": "Task not found"}), 404
-    # Lấy danh sách hạng mục từ module
-    items = getattr(task['function'].__module__, 'ITEMS', [])
-    return jsonify({"success": True, "items": items})
+    # Danh sách hạng mục mà module khai báo trong ITEMS
+    return jsonify({"success": True, "items": task['items']})
+
+@app.route('/task_spans/<task_name>')
+def get_task_spans(task_name):
+    """Dòng thời gian của lần chạy gần nhất: các span và tổng thời gian chờ (sleep) so với I/O."""
+    task = find_task(task_name)
+    if not task:
+        return jsonify(success=False, message="Task not found"), 404
+    timeline = task_spans.get(task['name'])
+    if timeline is None:
+        return jsonify(success=True, spans=[], summary=None, duration=None)
+    spans = list(timeline['spans'])
+    duration = (timeline['finished_at'] or time.time()) - timeline['started_at']
+    return jsonify(success=True, spans=spans, summary=profiler.summarize(spans), duration=round(duration, 3),
+                   running=timeline['finished_at'] is None)
+
+@app.route('/logs')
+def get_logs():
+    """Trả về các dòng log có seq > after (tối đa limit dòng)."""
+    after = request.args.get('after', 0, type=int)
+    limit = request.args.get('limit', 1000, type=int)
+    lines = task_logs.since(after, limit)
+    return jsonify(
+        success=True,
+        lines=[{'seq': seq, 'log': line} for seq, line in lines],
+        first_seq=task_logs.first_seq,
+        last_seq=task_logs.last_seq,
+        # True nếu một phần log client cần đã bị đẩy ra khỏi bộ đệm
+        truncated=after + 1 < task_logs.first_seq,
+    )
+
+def _history_filters():
+    """Đọc tham số lọc/phân trang chung của các endpoint /history."""
+    return {
+        'dut_serial': request.args.get('dut_serial'),
+        'since': request.args.get('since', type=float),  # unix timestamp
+        'until': request.args.get('until', type=float),
+        'before': request.args.get('before', type=int),  # id cuối của trang trước (next_before)
+        'limit': max(1, min(request.args.get('limit', app.config['HISTORY_PAGE_SIZE'], type=int), 500)),
+    }
+
+@app.route('/history')
+def get_history():
+    """Các lần chạy, mới nhất trước. Lọc: dut_serial, result, since, until; trang sau: before=next_before."""
+    runs, next_before = history.list_runs(result=request.args.get('result'), **_history_filters())
+    return jsonify(success=True, runs=runs, next_before=next_before)
+
+@app.route('/history/runs/<int:run_id>')
+def get_history_run(run_id):
+    """Chi tiết một lần chạy: kết quả từng task và từng hạng mục."""
+    run = history.get_run(run_id)
+    if run is None:
+        return jsonify(success=False, message="Run not found"), 404
+    return jsonify(success=True, run=run)
+
+@app.route('/history/tasks')
+def get_history_tasks():
+    """Kết quả theo task, ví dụ /history/tasks?task=2%20Rs485&status=Failed."""
+    results, next_before = history.list_task_results(
+        task=request.args.get('task'), status=request.args.get('status'), **_history_filters())
+    return jsonify(success=True, results=results, next_before=next_before)
+
+@app.route('/metrics')
+def get_metrics():
+    """Metric dạng text cho Prometheus."""
+    return app.response_class(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/log_levels', methods=['GET', 'POST'])
+def log_levels():
+    """Xem hoặc đổi mức log lúc chạy: POST {"logger": "task_2_RS485", "level": "DEBUG"}."""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            station_log.set_level(data.get('logger', 'root'), data.get('level', ''))
+        except ValueError as e:
+            return jsonify(success=False, message=str(e)), 400
+    return jsonify(success=True, levels=station_log.get_levels())
 
 # --- SocketIO Event Handlers ---
 @socketio.on('connect')
 def handle_connect():
-    print(f"[DEBUG] Client connected: {request.sid}")
     """Xử lý sự kiện khi một client kết nối tới SocketIO server."""
-    # Gửi trạng thái hiện tại của tất cả tasks cho client vừa kết nối
-    socketio.emit('full_task_status_update', task_results, namespace='/')
-    # Gửi toàn bộ lịch sử log cho client vừa kết nối
-    socketio.emit('initial_log', {'log': "\n".join(task_logs)}, namespace='/')
-    # Nếu auto test đang chạy, thông báo cho client mới để vô hiệu hóa nút
-    if auto_test_running:
-        socketio.emit('auto_test_started', namespace='/')
+    logger.debug("Client connected: %s", request.sid)
+    SOCKETIO_CLIENTS.inc()
+    # Chỉ gửi snapshot trạng thái (kèm version và cờ auto test) cho client vừa kết nối
+    socketio.emit('state_snapshot', state_snapshot(), namespace='/', to=request.sid)
+    # Lịch sử log không gửi ở đây: client tự lấy phần còn thiếu qua /logs?after=<seq>
+
+@socketio.on('cancel_auto_test')
+def handle_cancel_auto_test():
+    logger.info("Cancel auto test requested by: %s", request.sid)
+    cancel_all_runs()
+
+@socketio.on('request_snapshot')
+def handle_request_snapshot():
+    """Client phát hiện mất delta (version không liên tục) và xin đồng bộ lại."""
+    logger.debug("Snapshot requested by: %s", request.sid)
+    socketio.emit('state_snapshot', state_snapshot(), namespace='/', to=request.sid)
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    print(f"[DEBUG] Client disconnected: {request.sid}")
     """Xử lý sự kiện khi một client ngắt kết nối."""
-    # Không cần xử lý gì đặc biệt ở đây, nhưng có thể ghi log hoặc thực hiện các hành động khác nếu cần
\ No newline at end of file
+    logger.debug("Client disconnected: %s", request.sid)
+    SOCKETIO_CLIENTS.dec()
@@ -0,0 +1,208 @@
+# bench/station_bench.py
+"""
+Đo thời gian một chu kỳ Auto Test (app.execute_all_tasks) trên máy Linux bất kỳ, không cần board.
+
+Phần cứng được thay bằng bộ mô phỏng trong sim/: bus RS485/RS422 trên pty, modem SIM7600 giả,
+các công cụ giả trong sim/bin (toolpaths.DCG_TOOL_DIR) với độ trễ giống board, PWM sysfs trong
+thư mục tạm. Kết quả (thời gian chu kỳ và từng task, lấy trung vị qua nhiều chu kỳ) được ghi ra JSON
+và so sánh với kết quả của một commit trước để phát hiện chậm đi:
+
+    python bench/station_bench.py --cycles 3 --output bench/results/$(git rev-parse --short HEAD).json
+    python bench/station_bench.py --baseline bench/results/4c24c29.json --threshold 0.1
+
+Thoát với mã 1 nếu chu kỳ hoặc một task chậm hơn baseline quá ngưỡng.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import gpio  # noqa: E402
+from sim import gpio_state  # noqa: E402
+from sim.fake_tools import CONFIG_ENV as TOOLS_CONFIG_ENV  # noqa: E402
+from sim.serial_bus import LoopbackBuses  # noqa: E402
+from sim.sim7600 import Sim7600Emulator  # noqa: E402
+
+SLOT = 'A'
+# Độ trễ các công cụ giả, gần với thời gian đo trên board
+REALISTIC_TOOLS = {
+    'gpioset': {'latency': 0.004},
+    'stm32flash': {'latency': 9.0},
+    'i2cdetect': {'latency': 0.25},
+    'lsusb': {'latency': 0.05},
+    'ip': {'latency': 0.01},
+    'df': {'latency': 0.01},
+    'modprobe': {'latency': 0.05},
+}
+# Chênh lệch nhỏ hơn mức này (giây) coi như nhiễu, không tính là chậm đi
+MIN_DELTA = 0.5
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+        dirty = subprocess.run(['git', 'diff', '--quiet', 'HEAD'], cwd=ROOT).returncode != 0
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def make_pwm_chip(directory):
+    """Thư mục giống /sys/class/pwm/pwmchipN với pwm0 đã export, để task_5 ghi period/duty/enable."""
+    os.makedirs(os.path.join(directory, 'pwm0'), exist_ok=True)
+    for name in ('export', 'unexport', 'pwm0/period', 'pwm0/duty_cycle', 'pwm0/enable'):
+        with open(os.path.join(directory, name), 'w') as f:
+            f.write('0\n')
+    return directory
+
+
+class Station:
+    """Bộ mô phỏng của một jig một slot và biến môi trường để app/task dùng nó."""
+
+    def __init__(self, workdir, tool_config=None, modem_options=None):
+        self.workdir = workdir
+        ports_dir = os.path.join(workdir, 'ports')
+        self.buses = LoopbackBuses(ports_dir, slots=[SLOT])
+        self.modem = Sim7600Emulator(ports_dir, SLOT, **(modem_options or {}))
+        tools_file = os.path.join(workdir, 'tools.json')
+        with open(tools_file, 'w') as f:
+            json.dump(tool_config if tool_config is not None else REALISTIC_TOOLS, f, indent=4)
+        slot_config = self.buses.fixture_config()['slots'][SLOT]
+        slot_config.update(self.modem.fixture_config())
+        slot_config['PWM_CHIP'] = make_pwm_chip(os.path.join(workdir, 'pwmchip1'))
+        fixture_file = os.path.join(workdir, 'fixtures.json')
+        with open(fixture_file, 'w') as f:
+            json.dump({'slots': {SLOT: slot_config}}, f, indent=4)
+        self.env = {
+            'DCG_TOOL_DIR': os.path.join(ROOT, 'sim', 'bin'),
+            # Ghi GPIO trong tiến trình như backend cdev trên board, vào trạng thái GPIO giả
+            gpio.BACKEND_ENV: 'fake',
+            gpio_state.GPIO_DIR_ENV: os.path.join(workdir, 'gpio'),
+            TOOLS_CONFIG_ENV: tools_file,
+            'FIXTURE_FILE': fixture_file,
+            'HISTORY_DB': os.path.join(workdir, 'history.db'),
+        }
+
+    def start(self):
+        os.environ.update(self.env)
+        # Modem tắt nguồn như trên jig: task bật GPIO_POWER rồi chờ cổng ttyUSB xuất hiện
+        gpio_state.write_gpio(self.modem.config['power_gpio'], 0)
+        self.buses.start()
+        self.modem.start()
+
+    def stop(self):
+        self.modem.stop()
+        self.buses.stop()
+
+
+def run_cycles(cycles):
+    import app  # Import sau khi đặt biến môi trường: app đọc FIXTURE_FILE, HISTORY_DB lúc import
+
+    results = []
+    for index in range(cycles):
+        started = time.monotonic()
+        app.execute_all_tasks()
+        duration = time.monotonic() - started
+        tasks = {}
+        for task in app.slot_tasks:
+            spans = app.task_spans.get(task['name'])
+            if spans is None or spans['finished_at'] is None:
+                continue
+            tasks[task['title']] = {'duration': round(spans['finished_at'] - spans['started_at'], 3),
+                                    'status': app.task_results[task['name']]['status']}
+        results.append({'duration': round(duration, 3), 'tasks': tasks})
+        print(f"cycle {index + 1}/{cycles}: {duration:.2f}s "
+              + ', '.join(f"{title}={item['duration']:.2f}s/{item['status']}" for title, item in sorted(tasks.items())))
+    app.history.flush()
+    return results
+
+
+def summarize(cycles):
+    titles = sorted({title for cycle in cycles for title in cycle['tasks']})
+    return {
+        'cycle': round(statistics.median(cycle['duration'] for cycle in cycles), 3),
+        'tasks': {title: round(statistics.median(cycle['tasks'][title]['duration']
+                                                 for cycle in cycles if title in cycle['tasks']), 3)
+                  for title in titles},
+    }
+
+
+def compare(summary, baseline, threshold):
+    """In bảng so sánh với baseline, trả về danh sách các mục chậm đi quá ngưỡng."""
+    rows = [('cycle', baseline['cycle'], summary['cycle'])]
+    rows += [(title, baseline['tasks'].get(title), value) for title, value in summary['tasks'].items()]
+    regressions = []
+    print(f"{'':24} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, old, new in rows:
+        if old is None:
+            print(f"{name:24} {'-':>10} {new:>10.2f} {'new':>8}")
+            continue
+        change = (new - old) / old if old else 0.0
+        regressed = change > threshold and new - old > MIN_DELTA
+        if regressed:
+            regressions.append(name)
+        print(f"{name:24} {old:>10.2f} {new:>10.2f} {change:>+7.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hermetic Auto Test cycle-time benchmark")
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument('--output', help="Ghi kết quả JSON ra file này")
+    parser.add_argument('--baseline', help="File kết quả của commit trước để so sánh")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Tỉ lệ chậm đi tối đa cho phép (0.1 = 10%%)")
+    parser.add_argument('--tool-config', help="File JSON độ trễ/kết quả các công cụ giả (xem sim/fake_tools.py)")
+    parser.add_argument('--modem-script', help="File JSON tuỳ chọn của modem giả (xem sim/sim7600.py)")
+    parser.add_argument('--keep', action='store_true', help="Giữ thư mục tạm (log, history.db) sau khi chạy")
+    args = parser.parse_args(argv)
+
+    os.chdir(ROOT)  # Task tìm file (tasks/mcu_fw...) theo đường dẫn tương đối
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    tool_config = modem_options = None
+    if args.tool_config:
+        with open(args.tool_config) as f:
+            tool_config = json.load(f)
+    if args.modem_script:
+        with open(args.modem_script) as f:
+            modem_options = json.load(f)
+
+    workdir = tempfile.mkdtemp(prefix='dcg-bench-')
+    station = Station(workdir, tool_config, modem_options)
+    station.start()
+    try:
+        cycles = run_cycles(args.cycles)
+    finally:
+        station.stop()
+        if args.keep:
+            print(f"Work directory kept: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {'commit': git_commit(), 'date': datetime.now().isoformat(timespec='seconds'),
+              'cycles': cycles, 'summary': summarize(cycles)}
+    print(f"median cycle: {report['summary']['cycle']:.2f}s ({report['commit']})")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['summary']
+        regressions = compare(report['summary'], baseline, args.threshold)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
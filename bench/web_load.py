@@ -0,0 +1,272 @@
+# bench/web_load.py
+"""
+Đo tải của web server (eventlet + Flask-SocketIO như main.py) khi nhiều dashboard cùng theo dõi Auto Test.
+
+Server chạy trong tiến trình riêng với phần cứng mô phỏng (xem station_bench.Station). Bench mở
+`--clients` client Socket.IO, gọi POST /run_all_tasks rồi chờ auto_test_finished, và báo cáo:
+- độ trễ từ lúc server gửi lô (sent_at trong task_status_update/console_log_update) đến lúc client
+  nhận: p50/p95/p99/max;
+- sự kiện bị mất: khoảng trống version của delta trạng thái và seq của log trên từng client;
+- CPU (%) và bộ nhớ (RSS) của tiến trình server, lấy mẫu bằng psutil;
+- số liệu hàng đợi gửi lô phía server (/emit_stats).
+
+    pip install -r bench/requirements.txt   # psutil, requests, websocket-client
+    python bench/web_load.py --clients 50 --output bench/results/web-$(git rev-parse --short HEAD).json
+    python bench/web_load.py --clients 50 --baseline bench/results/web-cfa9c99.json
+
+Thoát với mã 1 nếu p95, số sự kiện mất, CPU hoặc RSS tệ hơn baseline quá ngưỡng.
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import psutil
+import requests
+import socketio
+
+from station_bench import ROOT, Station, git_commit
+
+# Chạy server giống main.py (eventlet monkey_patch trước khi import app), chỉ nghe trên localhost
+SERVER_CODE = (
+    "import eventlet; eventlet.monkey_patch()\n"
+    "import sys\n"
+    "from app import app, socketio\n"
+    "socketio.run(app, host='127.0.0.1', port=int(sys.argv[1]), log_output=False)\n"
+)
+# Các chỉ số dùng khi so sánh với baseline: (khoá, chênh lệch tuyệt đối tối thiểu để tính là tệ đi)
+COMPARED = [('latency_p95', 0.02), ('dropped', 0), ('cpu_avg', 5.0), ('rss_max_mb', 10.0)]
+
+
+class LoadClient:
+    """Một dashboard: ghi thời điểm nhận từng lô và phát hiện khoảng trống version/seq."""
+
+    def __init__(self, url, transports):
+        self.url = url
+        self.transports = transports
+        self.latencies = []
+        self.dropped = 0
+        self.events = 0
+        self.version = None
+        self.log_seq = None
+        self.finished = threading.Event()
+        self.sio = socketio.Client(reconnection=False)
+        self.sio.on('state_snapshot', self._on_snapshot)
+        self.sio.on('full_task_status_update', self._on_full_status)
+        self.sio.on('task_status_update', self._on_status)
+        self.sio.on('console_log_update', self._on_log)
+        self.sio.on('auto_test_finished', self._on_finished)
+
+    def connect(self):
+        self.sio.connect(self.url, transports=self.transports)
+
+    def disconnect(self):
+        self.sio.disconnect()
+
+    def _received(self, data):
+        self.events += 1
+        if 'sent_at' in data:
+            self.latencies.append(time.time() - data['sent_at'])
+
+    def _on_snapshot(self, data):
+        self.version = data['version']
+        self.log_seq = data['log_seq']
+
+    def _on_full_status(self, data):
+        self.events += 1
+        self.version = data['version']
+
+    def _on_status(self, data):
+        self._received(data)
+        if self.version is not None and data['from_version'] > self.version + 1:
+            self.dropped += data['from_version'] - self.version - 1
+        self.version = data['version']
+
+    def _on_log(self, data):
+        self._received(data)
+        if self.log_seq is not None and data['first_seq'] > self.log_seq + 1:
+            self.dropped += data['first_seq'] - self.log_seq - 1
+        self.log_seq = data['seq']
+
+    def _on_finished(self, data=None):
+        self.finished.set()
+
+
+class ResourceSampler(threading.Thread):
+    """Lấy mẫu CPU/RSS của tiến trình server trong lúc chạy tải."""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.cpu = []
+        self.rss = []
+        self._done = threading.Event()
+
+    def run(self):
+        self.process.cpu_percent(None)
+        while not self._done.wait(self.interval):
+            try:
+                self.cpu.append(self.process.cpu_percent(None))
+                self.rss.append(self.process.memory_info().rss)
+            except psutil.Error:
+                return
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))]
+
+
+def default_transports():
+    """websocket nếu có gói websocket-client (client tự nâng cấp từ polling), không thì chỉ polling."""
+    try:
+        import websocket  # noqa: F401
+    except ImportError:
+        return ['polling']
+    return ['polling', 'websocket']
+
+
+def wait_for_server(url, proc, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with code {proc.returncode}")
+        try:
+            if requests.get(url + '/emit_stats', timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server did not start within {timeout}s")
+
+
+def run_load(url, server_pid, clients, transports, timeout):
+    load_clients = [LoadClient(url, transports) for _ in range(clients)]
+    connect_started = time.monotonic()
+    for client in load_clients:
+        client.connect()
+    connect_time = time.monotonic() - connect_started
+
+    sampler = ResourceSampler(server_pid)
+    sampler.start()
+    started = time.monotonic()
+    response = requests.post(url + '/run_all_tasks', timeout=10).json()
+    if not response.get('success'):
+        raise RuntimeError(response.get('message'))
+    finished = all(client.finished.wait(max(0.0, started + timeout - time.monotonic())) for client in load_clients)
+    duration = time.monotonic() - started
+    sampler.stop()
+    emit_stats = requests.get(url + '/emit_stats', timeout=10).json()
+    for client in load_clients:
+        client.disconnect()
+
+    latencies = [latency for client in load_clients for latency in client.latencies]
+    return {
+        'clients': clients,
+        'transports': transports,
+        'connect_time': round(connect_time, 3),
+        'cycle_time': round(duration, 3),
+        'finished': finished,
+        'events_received': sum(client.events for client in load_clients),
+        'dropped': sum(client.dropped for client in load_clients),
+        'latency_p50': round(percentile(latencies, 0.50), 4),
+        'latency_p95': round(percentile(latencies, 0.95), 4),
+        'latency_p99': round(percentile(latencies, 0.99), 4),
+        'latency_max': round(max(latencies, default=0.0), 4),
+        'cpu_avg': round(sum(sampler.cpu) / len(sampler.cpu), 1) if sampler.cpu else 0.0,
+        'cpu_max': round(max(sampler.cpu, default=0.0), 1),
+        'rss_max_mb': round(max(sampler.rss, default=0) / 2**20, 1),
+        'emit_stats': {key: value for key, value in emit_stats.items() if key != 'success'},
+    }
+
+
+def compare(result, baseline, threshold):
+    """In bảng so sánh với baseline, trả về danh sách chỉ số tệ đi quá ngưỡng."""
+    regressions = []
+    print(f"{'':16} {'baseline':>10} {'current':>10}")
+    for key, min_delta in COMPARED:
+        old, new = baseline.get(key), result[key]
+        if old is None:
+            continue
+        regressed = new - old > max(min_delta, old * threshold)
+        if regressed:
+            regressions.append(key)
+        print(f"{key:16} {old:>10} {new:>10}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Socket.IO fan-out load benchmark")
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--transport', choices=['polling', 'websocket'], action='append',
+                        help="Transport của client (mặc định để client tự chọn)")
+    parser.add_argument('--timeout', type=float, default=600, help="Thời gian chờ Auto Test kết thúc (giây)")
+    parser.add_argument('--output', help="Ghi kết quả JSON ra file này")
+    parser.add_argument('--baseline', help="File kết quả của commit trước để so sánh")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Tỉ lệ tệ đi tối đa cho phép (0.2 = 20%%)")
+    parser.add_argument('--tool-config', help="File JSON độ trễ/kết quả các công cụ giả (xem sim/fake_tools.py)")
+    parser.add_argument('--modem-script', help="File JSON tuỳ chọn của modem giả (xem sim/sim7600.py)")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    tool_config = modem_options = None
+    if args.tool_config:
+        with open(args.tool_config) as f:
+            tool_config = json.load(f)
+    if args.modem_script:
+        with open(args.modem_script) as f:
+            modem_options = json.load(f)
+
+    url = f"http://127.0.0.1:{args.port}"
+    workdir = tempfile.mkdtemp(prefix='dcg-webload-')
+    station = Station(workdir, tool_config, modem_options)
+    station.start()
+    server = subprocess.Popen([sys.executable, '-c', SERVER_CODE, str(args.port)], cwd=ROOT)
+    try:
+        wait_for_server(url, server)
+        result = run_load(url, server.pid, args.clients, args.transport or default_transports(), args.timeout)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        station.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result.update(commit=git_commit(), date=datetime.now().isoformat(timespec='seconds'))
+    print(json.dumps(result, indent=4))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=4)
+    if not result['finished']:
+        print("Auto test did not finish on every client within the timeout")
+        return 1
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
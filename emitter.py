@@ -0,0 +1,143 @@
+# emitter.py
+import threading
+import time
+
+
+class EventBatcher:
+    """
+    Gom các sự kiện Socket.IO gửi từ các luồng task và gửi theo lô.
+
+    - Cập nhật trạng thái của cùng một task được gộp lại (chỉ giữ trạng thái mới nhất),
+      lô gửi đi mang khoảng version [from_version, version] mà nó bao phủ.
+    - Các dòng log được nối lại thành một khối, kèm [first_seq, seq].
+    - Lô được gửi sau mỗi `interval` giây, hoặc ngay khi có `max_events` sự kiện đang chờ.
+    Các sự kiện khác (auto_test_started, ...) đi qua emit(), hàm này gửi hết lô đang chờ
+    trước để client nhận đúng thứ tự.
+    """
+
+    def __init__(self, socketio, interval=0.1, max_events=50, namespace='/'):
+        self.socketio = socketio
+        self.interval = interval
+        self.max_events = max_events
+        self.namespace = namespace
+        self._lock = threading.Lock()       # bảo vệ hàng đợi
+        self._emit_lock = threading.Lock()  # giữ thứ tự giữa các lần gửi
+        self._started = False
+        self._reset_queue()
+        self._stats = {
+            'events_queued': 0,
+            'messages_sent': 0,
+            'flushes': 0,
+            'max_queue_depth': 0,
+            'last_flush_latency': 0.0,
+            'max_flush_latency': 0.0,
+            'last_flush_duration': 0.0,
+        }
+
+    def _reset_queue(self):
+        self._status = {}           # task_name -> result
+        self._from_version = None
+        self._version = None
+        self._logs = []             # các dòng log đang chờ
+        self._first_seq = None
+        self._last_seq = None
+        self._depth = 0             # số sự kiện đang chờ
+        self._oldest = None         # thời điểm sự kiện cũ nhất vào hàng đợi
+
+    def start(self):
+        """Khởi động luồng nền gửi lô định kỳ (chỉ một lần)."""
+        if not self._started:
+            self._started = True
+            self.socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.interval)
+            self.flush()
+
+    def _enqueued(self):
+        # Gọi khi đang giữ self._lock; trả về True nếu cần gửi ngay
+        self._depth += 1
+        self._stats['events_queued'] += 1
+        self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._depth)
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        return self._depth >= self.max_events
+
+    def status(self, task_name, result, version):
+        """Đưa một cập nhật trạng thái task (đã được gán version) vào hàng đợi."""
+        with self._lock:
+            self._status[task_name] = result
+            if self._from_version is None:
+                self._from_version = version
+            self._version = version
+            full = self._enqueued()
+        if full:
+            self.flush()
+
+    def log(self, seq, line):
+        """Đưa một dòng log (đã có seq từ LogStore) vào hàng đợi."""
+        with self._lock:
+            self._logs.append(line)
+            if self._first_seq is None:
+                self._first_seq = seq
+            self._last_seq = seq
+            full = self._enqueued()
+        if full:
+            self.flush()
+
+    def emit(self, event, data=None, **kwargs):
+        """Gửi ngay một sự kiện không gộp được, sau khi đã gửi hết lô đang chờ."""
+        kwargs.setdefault('namespace', self.namespace)
+        with self._emit_lock:
+            self._flush_locked()
+            self.socketio.emit(event, data, **kwargs)
+            self._stats['messages_sent'] += 1
+
+    def flush(self):
+        """Gửi ngay toàn bộ sự kiện đang chờ."""
+        with self._emit_lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        with self._lock:
+            if not self._depth:
+                return
+            status, from_version, version = self._status, self._from_version, self._version
+            logs, first_seq, last_seq = self._logs, self._first_seq, self._last_seq
+            oldest = self._oldest
+            self._reset_queue()
+
+        started = time.monotonic()
+        # sent_at (epoch): client đo được độ trễ từ lúc server gửi đến lúc nhận (bench/web_load.py)
+        sent_at = time.time()
+        if status:
+            self.socketio.emit('task_status_update',
+                               {'from_version': from_version, 'version': version, 'tasks': status,
+                                'sent_at': sent_at},
+                               namespace=self.namespace)
+            self._stats['messages_sent'] += 1
+        if logs:
+            self.socketio.emit('console_log_update',
+                               {'log': "\n".join(logs), 'first_seq': first_seq, 'seq': last_seq,
+                                'sent_at': sent_at},
+                               namespace=self.namespace)
+            self._stats['messages_sent'] += 1
+        done = time.monotonic()
+
+        latency = done - oldest
+        self._stats['flushes'] += 1
+        self._stats['last_flush_latency'] = latency
+        self._stats['max_flush_latency'] = max(self._stats['max_flush_latency'], latency)
+        self._stats['last_flush_duration'] = done - started
+
+    @property
+    def queue_depth(self):
+        return self._depth
+
+    def stats(self):
+        """Số liệu của hàng đợi: độ sâu hiện tại/lớn nhất, độ trễ gửi (giây), số lô và số message."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['queue_depth'] = self._depth
+        return stats
@@ -0,0 +1,114 @@
+# fixtures.py
+"""
+Chạy cùng một bộ task trên nhiều board (DUT) gắn trên một jig, mỗi board là một "slot".
+
+Mỗi slot thay các hằng số phần cứng ở cấp module của task (SERIAL_PORTS, GPIO_MODE, SIM_AT_PORT,
+CO_MCU_FLASH_PORT, PWM_CHIP...) bằng giá trị riêng của nó. File cấu hình (fixtures.json):
+
+    {
+        "slots": {
+            "A": {"SERIAL_PORTS": ["/dev/ttyACM0", "/dev/ttyACM1", "/dev/ttyACM2", "/dev/ttyACM3"]},
+            "B": {"SERIAL_PORTS": ["/dev/ttyACM4", "/dev/ttyACM5", "/dev/ttyACM6", "/dev/ttyACM7"],
+                  "GPIO_MODE": [130, 136, 123, 128],
+                  "tasks": {"task_5_MCU": {"CO_MCU_FLASH_PORT": "/dev/ttyS2"}}}
+        }
+    }
+
+Giá trị ở cấp slot áp dụng cho mọi task có biến cùng tên; "tasks" ghi đè riêng cho từng task.
+RESOURCES của task được đổi theo (ví dụ serial:/dev/ttyACM0 -> serial:/dev/ttyACM4), nên các slot
+chạy song song khi không dùng chung tài nguyên. Tài nguyên không được ghi đè (module:option, i2c:2...)
+vẫn dùng chung giữa các slot và được chạy lần lượt.
+Không có file cấu hình thì chỉ có một slot mặc định (tên rỗng) và task chạy như cũ.
+"""
+import copy
+import json
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+OVERRIDES_ENV = 'DCG_TASK_OVERRIDES'
+SLOT_NAME_RE = re.compile(r'^[A-Za-z0-9_]+$')
+
+
+class Slot:
+    """Một vị trí trên jig: tên và các giá trị ghi đè hằng số của task."""
+
+    def __init__(self, name, overrides=None, task_overrides=None):
+        self.name = name
+        self.overrides = overrides or {}
+        self.task_overrides = task_overrides or {}
+
+    def overrides_for(self, task):
+        """Các biến được ghi đè cho task, chỉ gồm những biến module task thực sự có."""
+        module_globals = vars(task['module'])
+        merged = {**self.overrides, **self.task_overrides.get(task['id'], {})}
+        return {key: value for key, value in merged.items() if key in module_globals}
+
+
+def load_slots(path):
+    """Đọc danh sách slot từ file cấu hình. Không có file thì trả về [slot mặc định]."""
+    if not path or not os.path.exists(path):
+        return [Slot('')]
+    with open(path) as f:
+        config = json.load(f)
+    slots = []
+    for name, values in config.get('slots', {}).items():
+        if not SLOT_NAME_RE.match(name):
+            raise ValueError(f"Invalid slot name '{name}' (letters, digits and '_' only)")
+        values = dict(values)
+        task_overrides = values.pop('tasks', {})
+        slots.append(Slot(name, values, task_overrides))
+    if not slots:
+        raise ValueError(f"Fixture file '{path}' has no slots")
+    logger.info("Fixture slots: %s", ', '.join(slot.name for slot in slots))
+    return slots
+
+
+def remap_resources(resources, module_globals, overrides):
+    """
+    Đổi tài nguyên theo giá trị ghi đè: mỗi giá trị cũ của biến (hoặc từng phần tử nếu là list)
+    được thay bằng giá trị mới tương ứng, ví dụ gpio:129 -> gpio:130.
+    """
+    if resources is None:
+        return None
+    mapping = {}
+    for key, new in overrides.items():
+        old = module_globals.get(key)
+        if isinstance(old, (list, tuple)) and isinstance(new, (list, tuple)):
+            pairs = zip(old, new)
+        else:
+            pairs = [(old, new)]
+        for old_value, new_value in pairs:
+            if isinstance(old_value, (str, int)) and isinstance(new_value, (str, int)):
+                mapping[str(old_value)] = str(new_value)
+    remapped = []
+    for resource in resources:
+        kind, _, value = resource.partition(':')
+        remapped.append(f"{kind}:{mapping[value]}" if value in mapping else resource)
+    return sorted(set(remapped))
+
+
+def bind_task(task, slot):
+    """Task của một slot: id/tên riêng theo slot, tài nguyên và biến ghi đè riêng."""
+    if not slot.name:
+        return dict(task, slot='', title=task['name'], overrides={})
+    overrides = slot.overrides_for(task)
+    return dict(
+        task,
+        id=f"{task['id']}@{slot.name}",
+        name=f"{slot.name} {task['name']}",
+        title=task['name'],
+        slot=slot.name,
+        resources=remap_resources(task['resources'], vars(task['module']), overrides),
+        # Điều kiện trỏ tới task cùng slot
+        prerequisites={f"{task_id}@{slot.name}": items for task_id, items in task['prerequisites'].items()},
+        overrides=copy.deepcopy(overrides),
+    )
+
+
+def apply_overrides(module, overrides):
+    """Dùng trong tiến trình task: gán giá trị của slot vào các biến của module trước khi chạy test_task."""
+    for key, value in overrides.items():
+        setattr(module, key, value)
@@ -0,0 +1,318 @@
+# gpio.py
+"""
+Ghi GPIO dùng chung cho các task, không fork gpioset cho mỗi lần ghi.
+
+Số GPIO được đánh theo cách của board: gpio = chip * 32 + line (ví dụ 144 -> gpiochip4 line 16).
+Backend được chọn bằng biến môi trường DCG_GPIO_BACKEND:
+- cdev: ioctl trực tiếp lên /dev/gpiochipN (GPIO character device, uAPI v1). Các line của một chip
+  trong một lần set_many được request chung một handle, giữ tới khi close() hoặc tiến trình kết thúc;
+  các lần ghi sau lên các line đó chỉ là một ioctl cho mỗi chip;
+- gpioset: gọi toolpaths.tool('gpioset') như trước, mỗi lần set_many là một lệnh cho mỗi chip;
+- fake: ghi vào trạng thái GPIO giả (sim.gpio_state) để chạy không cần board;
+- auto (mặc định): cdev nếu có /dev/gpiochip*, không thì gpioset. Khi cdev lỗi (không có quyền,
+  chip không tồn tại...) lần ghi đó được thử lại bằng gpioset.
+
+    ok, error = gpio.set_value(144, 1)
+    ok, error = gpio.set_many({129: 0, 135: 0, 122: 0, 127: 0})
+
+Các hàm trả về (True, "") hoặc (False, thông báo lỗi) giống set_gpio cũ của các task.
+Controller nhớ giá trị đã ghi lên từng line và bỏ qua lần ghi không làm đổi gì; force=True luôn ghi
+(ví dụ khi cần đặt lại một line có thể đã bị tác động từ bên ngoài). stats() trả về số lần ghi
+thực sự và số lần được bỏ qua.
+"""
+import errno
+import fcntl
+import glob
+import logging
+import os
+import struct
+import subprocess
+import threading
+
+import profiler
+import toolpaths
+
+logger = logging.getLogger(__name__)
+
+BACKEND_ENV = 'DCG_GPIO_BACKEND'
+LINES_PER_CHIP = 32
+CONSUMER = b'dcg-tester'
+
+# --- GPIO character device uAPI v1 (linux/gpio.h) ---
+GPIOHANDLES_MAX = 64
+GPIOHANDLE_REQUEST_OUTPUT = 1 << 1
+# struct gpiohandle_request: lineoffsets[64], flags, default_values[64], consumer_label[32], lines, fd
+_HANDLE_REQUEST = struct.Struct(f'{GPIOHANDLES_MAX}I I {GPIOHANDLES_MAX}B 32s I i')
+# struct gpiohandle_data: values[64]
+_HANDLE_DATA = struct.Struct(f'{GPIOHANDLES_MAX}B')
+
+
+def _iowr(type_, number, size):
+    return (3 << 30) | (size << 16) | (type_ << 8) | number
+
+
+GPIO_GET_LINEHANDLE_IOCTL = _iowr(0xB4, 0x03, _HANDLE_REQUEST.size)
+GPIOHANDLE_SET_LINE_VALUES_IOCTL = _iowr(0xB4, 0x09, _HANDLE_DATA.size)
+
+
+def chip_line(gpio):
+    """Số GPIO -> (tên chip, số line), ví dụ 144 -> ('gpiochip4', 16)."""
+    return f"gpiochip{gpio // LINES_PER_CHIP}", gpio % LINES_PER_CHIP
+
+
+def _by_chip(values):
+    chips = {}
+    for gpio, value in values.items():
+        chip, line = chip_line(gpio)
+        chips.setdefault(chip, []).append((line, int(value)))
+    return chips
+
+
+class CdevBackend:
+    """
+    Ghi qua /dev/gpiochipN. Các line của một chip trong cùng một lần ghi được request chung một handle
+    và ghi bằng một ioctl; handle được giữ lại (theo bộ line) cho các lần ghi sau.
+    """
+
+    name = 'cdev'
+
+    def __init__(self, dev_dir='/dev'):
+        self.dev_dir = dev_dir
+        self._handles = {}  # (chip, (line, ...)) -> (fd của handle, {line: giá trị đã ghi})
+
+    def _request(self, chip, values):
+        lines = sorted(values)
+        if len(lines) > GPIOHANDLES_MAX:
+            raise OSError(errno.EINVAL, f"Cannot request more than {GPIOHANDLES_MAX} lines of {chip} at once")
+        padding = [0] * (GPIOHANDLES_MAX - len(lines))
+        request = bytearray(_HANDLE_REQUEST.pack(*lines, *padding, GPIOHANDLE_REQUEST_OUTPUT,
+                                                 *[values[line] for line in lines], *padding, CONSUMER, len(lines), -1))
+        chip_fd = os.open(os.path.join(self.dev_dir, chip), os.O_RDWR | os.O_CLOEXEC)
+        try:
+            fcntl.ioctl(chip_fd, GPIO_GET_LINEHANDLE_IOCTL, request)
+        finally:
+            # Handle của line vẫn hợp lệ sau khi đóng fd của chip
+            os.close(chip_fd)
+        return _HANDLE_REQUEST.unpack(request)[-1]
+
+    def _covering(self, chip, lines):
+        """Handle đang giữ tất cả các line này (nếu có)."""
+        for key in self._handles:
+            if key[0] == chip and lines <= set(key[1]):
+                return key
+        return None
+
+    def set_many(self, values):
+        for chip, lines in _by_chip(values).items():
+            wanted = dict(lines)
+            key = self._covering(chip, wanted.keys())
+            if key is not None:
+                # Một ioctl cho tất cả line của handle, line không được ghi lần này giữ giá trị cũ
+                fd, current = self._handles[key]
+                current.update(wanted)
+                data = [current[line] for line in key[1]]
+                fcntl.ioctl(fd, GPIOHANDLE_SET_LINE_VALUES_IOCTL,
+                            _HANDLE_DATA.pack(*data, *[0] * (GPIOHANDLES_MAX - len(data))))
+                continue
+            # Gộp các handle đang giữ một phần các line này thành một handle mới (nhả trước, không thì EBUSY).
+            # Request với giá trị mặc định = giá trị cần ghi: lần ghi đầu tiên chỉ cần một ioctl
+            merged = {}
+            for key in [key for key in self._handles if key[0] == chip and wanted.keys() & set(key[1])]:
+                fd, current = self._handles.pop(key)
+                os.close(fd)
+                merged.update(current)
+            merged.update(wanted)
+            self._handles[(chip, tuple(sorted(merged)))] = (self._request(chip, merged), merged)
+
+    def release(self, gpios):
+        """Nhả các handle đang giữ một trong các line này (để backend khác ghi được các line đó)."""
+        lines = {chip_line(gpio) for gpio in gpios}
+        for key in list(self._handles):
+            chip, key_lines = key
+            if any((chip, line) in lines for line in key_lines):
+                os.close(self._handles.pop(key)[0])
+
+    def close(self):
+        for fd, _ in self._handles.values():
+            os.close(fd)
+        self._handles.clear()
+
+
+class GpiosetBackend:
+    """Gọi gpioset (libgpiod v1): mỗi chip một lệnh, line được nhả ngay khi lệnh kết thúc."""
+
+    name = 'gpioset'
+
+    def set_many(self, values):
+        for chip, lines in _by_chip(values).items():
+            result = subprocess.run([toolpaths.tool('gpioset'), chip] + [f"{line}={value}" for line, value in lines],
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                raise OSError(result.stderr.strip() or f"gpioset exited with code {result.returncode}")
+
+    def release(self, gpios):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeBackend:
+    """Không có phần cứng: ghi vào sim.gpio_state (thư mục DCG_SIM_GPIO_DIR) để bộ mô phỏng đọc lại."""
+
+    name = 'fake'
+
+    def __init__(self, directory=None):
+        from sim import gpio_state
+        self._state = gpio_state
+        self.directory = directory
+
+    def set_many(self, values):
+        for chip, lines in _by_chip(values).items():
+            for line, value in lines:
+                self._state.write_line(chip, line, value, self.directory)
+
+    def release(self, gpios):
+        pass
+
+    def close(self):
+        pass
+
+
+BACKENDS = {
+    'cdev': CdevBackend,
+    'gpioset': GpiosetBackend,
+    'fake': FakeBackend,
+}
+
+
+class GpioController:
+    """
+    Ghi GPIO qua một backend chính, thử lại bằng `fallback` (nếu có) khi backend chính lỗi.
+    Dùng được từ nhiều luồng (LED trạng thái của server và task có thể ghi cùng lúc).
+
+    Giá trị đã ghi thành công được nhớ theo từng line; line chưa từng ghi hoặc ghi lỗi thì chưa biết
+    giá trị nên lần ghi sau luôn được thực hiện. Bộ nhớ chỉ đúng khi không ai khác ghi line đó:
+    trong task, các line đã được khoá qua RESOURCES.
+    """
+
+    def __init__(self, backend, fallback=None):
+        self.backend = backend
+        self.fallback = fallback
+        self._lock = threading.Lock()
+        self._values = {}  # gpio -> giá trị đã ghi gần nhất
+        self._stats = {'writes_issued': 0, 'writes_skipped': 0}
+
+    def set_value(self, gpio, value, force=False):
+        return self.set_many({gpio: value}, force)
+
+    def pending(self, values):
+        """Các line trong values mà set_many (không force) sẽ thực sự ghi: {gpio: giá trị}."""
+        with self._lock:
+            return {gpio: int(value) for gpio, value in values.items() if self._values.get(gpio) != int(value)}
+
+    def set_many(self, values, force=False):
+        """Đặt nhiều line trong một lần gọi: {gpio: 0/1}. Line đã có đúng giá trị được bỏ qua trừ khi force."""
+        values = {gpio: int(value) for gpio, value in values.items()}
+        with self._lock:
+            changed = values if force else {gpio: value for gpio, value in values.items()
+                                            if self._values.get(gpio) != value}
+            self._stats['writes_skipped'] += len(values) - len(changed)
+            if not changed:
+                return True, ""
+            self._stats['writes_issued'] += len(changed)
+            ok, error = self._write(changed)
+            if ok:
+                self._values.update(changed)
+            else:
+                for gpio in changed:
+                    self._values.pop(gpio, None)
+            return ok, error
+
+    def _write(self, values):
+        description = ' '.join(f"{gpio}={value}" for gpio, value in values.items())
+        with profiler.span('gpio', f"gpio {description}"):
+            try:
+                self.backend.set_many(values)
+                return True, ""
+            except OSError as e:
+                if self.fallback is None:
+                    logger.error("GPIO write %s failed: %s", description, e)
+                    return False, str(e)
+                logger.warning("GPIO write %s failed with %s backend (%s), retrying with %s",
+                               description, self.backend.name, e, self.fallback.name)
+            try:
+                # Backend chính có thể đang giữ các line này (lỗi giữa chừng): nhả ra, không thì fallback bị EBUSY
+                self.backend.release(values)
+                self.fallback.set_many(values)
+                return True, ""
+            except OSError as e:
+                logger.error("GPIO write %s failed: %s", description, e)
+                return False, str(e)
+
+    def stats(self):
+        """Số lần ghi line thực sự (writes_issued) và số lần được bỏ qua vì không đổi giá trị (writes_skipped)."""
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        """Nhả tất cả line đang giữ (giá trị của line không còn được nhớ)."""
+        with self._lock:
+            self.backend.close()
+            if self.fallback is not None:
+                self.fallback.close()
+            self._values.clear()
+
+
+def create_controller(name=None):
+    """Tạo controller theo tên backend (mặc định lấy từ DCG_GPIO_BACKEND)."""
+    name = (name or os.environ.get(BACKEND_ENV) or 'auto').lower()
+    if name == 'auto':
+        if glob.glob('/dev/gpiochip*'):
+            return GpioController(CdevBackend(), GpiosetBackend())
+        return GpioController(GpiosetBackend())
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown GPIO backend '{name}', expected one of {sorted(BACKENDS)} or 'auto'")
+    return GpioController(BACKENDS[name]())
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def controller():
+    """Controller dùng chung của tiến trình (tạo khi dùng lần đầu)."""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = create_controller()
+            logger.debug("GPIO backend: %s", _controller.backend.name)
+        return _controller
+
+
+def set_value(gpio, value, force=False):
+    return controller().set_value(gpio, value, force)
+
+
+def set_many(values, force=False):
+    return controller().set_many(values, force)
+
+
+def pending(values):
+    """Các line sẽ đổi giá trị nếu gọi set_many(values), ví dụ để chỉ chờ phần cứng ổn định khi có thay đổi."""
+    return controller().pending(values)
+
+
+def stats():
+    """Số liệu ghi của controller dùng chung, rỗng nếu tiến trình chưa ghi GPIO nào."""
+    with _controller_lock:
+        return _controller.stats() if _controller is not None else {}
+
+
+def close():
+    """Nhả các line của controller dùng chung (lần ghi sau sẽ request lại)."""
+    global _controller
+    with _controller_lock:
+        if _controller is not None:
+            _controller.close()
+            _controller = None
@@ -0,0 +1,271 @@
+# history.py
+import itertools
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    dut_serial TEXT,
+    mode TEXT NOT NULL,            -- 'auto' (Auto Test), 'single' (chạy lẻ một task), 'rerun' (chạy lại phần lỗi)
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    result TEXT                    -- NULL khi lần chạy chưa kết thúc
+);
+CREATE TABLE IF NOT EXISTS task_results (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL,
+    dut_serial TEXT,               -- lặp lại từ runs để lọc theo board mà không cần JOIN
+    task TEXT NOT NULL,
+    status TEXT NOT NULL,
+    message TEXT,
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS detail_items (
+    id INTEGER PRIMARY KEY,
+    task_result_id INTEGER NOT NULL,
+    item TEXT,
+    result TEXT,
+    passed INTEGER,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_started ON runs (started_at);
+CREATE INDEX IF NOT EXISTS idx_runs_dut ON runs (dut_serial, id);
+CREATE INDEX IF NOT EXISTS idx_runs_result ON runs (result, id);
+CREATE INDEX IF NOT EXISTS idx_task_results_run ON task_results (run_id);
+CREATE INDEX IF NOT EXISTS idx_task_results_task ON task_results (task, id);
+CREATE INDEX IF NOT EXISTS idx_task_results_dut ON task_results (dut_serial, id);
+CREATE INDEX IF NOT EXISTS idx_task_results_status ON task_results (status, id);
+CREATE INDEX IF NOT EXISTS idx_task_results_started ON task_results (started_at);
+CREATE INDEX IF NOT EXISTS idx_detail_items_task_result ON detail_items (task_result_id);
+"""
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    # WAL: người đọc (các request HTTP) không bị chặn bởi luồng ghi và ngược lại
+    conn.execute("PRAGMA journal_mode=WAL")
+    # Trong chế độ WAL, NORMAL chỉ fsync khi checkpoint: commit nhanh, vẫn không hỏng DB khi mất điện
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class HistoryStore:
+    """
+    Lưu lịch sử test vào SQLite: mỗi lần chạy (runs), mỗi task (task_results), mỗi hạng mục (detail_items).
+
+    Các hàm ghi (start_run, record_task, start_task/add_details/finish_task, finish_run) chỉ đưa lệnh
+    vào hàng đợi và trả về ngay; một luồng nền gom các lệnh đang chờ và ghi chúng trong một transaction.
+    Task đang chạy có dòng status 'Running', các hạng mục được ghi ngay khi task gửi về.
+    Các hàm đọc dùng kết nối riêng, phân trang theo id (keyset) nên không chậm đi khi bảng lớn.
+    """
+
+    def __init__(self, path, max_batch=200):
+        self.path = path
+        self.max_batch = max_batch
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._write_conn = _connect(path)
+        self._write_conn.executescript(SCHEMA)
+        # id được cấp ngay khi gọi (không chờ luồng ghi); chỉ tiến trình server ghi vào DB
+        (max_id,) = self._write_conn.execute("SELECT COALESCE(MAX(id), 0) FROM runs").fetchone()
+        self._run_ids = itertools.count(max_id + 1)
+        (max_id,) = self._write_conn.execute("SELECT COALESCE(MAX(id), 0) FROM task_results").fetchone()
+        self._task_result_ids = itertools.count(max_id + 1)
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop)
+        self._writer.daemon = True
+        self._writer.start()
+
+    # --- Ghi (không chặn người gọi) ---
+    def start_run(self, dut_serial=None, mode='auto'):
+        """Tạo một lần chạy mới, trả về run_id."""
+        run_id = next(self._run_ids)
+        self._queue.put((
+            "INSERT INTO runs (id, dut_serial, mode, started_at) VALUES (?, ?, ?, ?)",
+            [(run_id, dut_serial or None, mode, time.time())]))
+        return run_id
+
+    def record_task(self, run_id, dut_serial, task, status, message, details, started_at, finished_at=None):
+        """Ghi kết quả một task (kèm các hạng mục) của lần chạy run_id."""
+        task_result_id = next(self._task_result_ids)
+        statements = [self._task_statement(task_result_id, run_id, dut_serial, task, status, message, started_at,
+                                           finished_at or time.time())]
+        if details:
+            statements.append(self._detail_statement(task_result_id, details))
+        self._queue.put(statements)
+        return task_result_id
+
+    def start_task(self, run_id, dut_serial, task, started_at=None):
+        """Ghi task bắt đầu chạy (status 'Running'), trả về task_result_id cho add_details/finish_task."""
+        task_result_id = next(self._task_result_ids)
+        self._queue.put(self._task_statement(task_result_id, run_id, dut_serial, task, 'Running', None,
+                                             started_at or time.time(), None))
+        return task_result_id
+
+    def add_details(self, task_result_id, details):
+        """Ghi ngay các hạng mục vừa nhận của task đang chạy: server dừng giữa chừng vẫn còn các hạng mục này."""
+        if details:
+            self._queue.put(self._detail_statement(task_result_id, details))
+
+    def finish_task(self, task_result_id, status, message, details=None, finished_at=None):
+        """
+        Cập nhật kết quả cuối của task đã start_task. details khác None: thay các hạng mục đã ghi bằng
+        danh sách này trong cùng transaction (khi kết quả cuối khác các hạng mục đã add_details).
+        """
+        statements = [("UPDATE task_results SET status = ?, message = ?, finished_at = ? WHERE id = ?",
+                       [(status, message, finished_at or time.time(), task_result_id)])]
+        if details is not None:
+            statements.append(("DELETE FROM detail_items WHERE task_result_id = ?", [(task_result_id,)]))
+            if details:
+                statements.append(self._detail_statement(task_result_id, details))
+        self._queue.put(statements)
+
+    @staticmethod
+    def _task_statement(task_result_id, run_id, dut_serial, task, status, message, started_at, finished_at):
+        return ("INSERT INTO task_results (id, run_id, dut_serial, task, status, message, started_at, finished_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(task_result_id, run_id, dut_serial or None, task, status, message, started_at, finished_at)])
+
+    @staticmethod
+    def _detail_statement(task_result_id, details):
+        return ("INSERT INTO detail_items (task_result_id, item, result, passed, detail) VALUES (?, ?, ?, ?, ?)",
+                [(task_result_id, d.get('item'), d.get('result'),
+                  None if d.get('passed') is None else int(bool(d.get('passed'))),
+                  d.get('detail') if isinstance(d.get('detail'), str) else json.dumps(d.get('detail'), default=str))
+                 for d in details])
+
+    def finish_run(self, run_id, result):
+        self._queue.put((
+            "UPDATE runs SET finished_at = ?, result = ? WHERE id = ?",
+            [(time.time(), result, run_id)]))
+
+    def flush(self, timeout=None):
+        """Chờ luồng ghi ghi xong các lệnh đang chờ (dùng khi tắt server hoặc khi cần đọc ngay)."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            waiters = [op for op in batch if isinstance(op, threading.Event)]
+            statements = []
+            for op in batch:
+                # Một lệnh (sql, rows) hoặc danh sách lệnh phải được ghi cùng nhau
+                if isinstance(op, list):
+                    statements.extend(op)
+                elif not isinstance(op, threading.Event):
+                    statements.append(op)
+            try:
+                with self._write_conn:
+                    for sql, rows in statements:
+                        self._write_conn.executemany(sql, rows)
+            except sqlite3.Error as e:
+                logger.error("Failed to write test history (%d statements dropped): %s", len(statements), e)
+            for waiter in waiters:
+                waiter.set()
+
+    # --- Đọc ---
+    def _query(self, sql, params=()):
+        # Mỗi truy vấn một kết nối ngắn: WAL cho phép đọc song song với luồng ghi
+        with closing(_connect(self.path)) as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def list_runs(self, dut_serial=None, result=None, since=None, until=None, before=None, limit=50):
+        """
+        Các lần chạy mới nhất trước (id giảm dần). Trả về (rows, next_before):
+        next_before là giá trị `before` để lấy trang tiếp theo, None nếu đã hết.
+        """
+        where, params = self._filters(dut_serial=dut_serial, result=result, since=since, until=until,
+                                      before=before)
+        rows = self._query(
+            f"SELECT runs.*,"
+            f" (SELECT COUNT(*) FROM task_results WHERE run_id = runs.id) AS task_count,"
+            f" (SELECT COUNT(*) FROM task_results WHERE run_id = runs.id AND status != 'Passed') AS failed_count"
+            f" FROM runs {where} ORDER BY id DESC LIMIT ?", params + [limit + 1])
+        return self._page(rows, limit)
+
+    def get_run(self, run_id):
+        """Một lần chạy kèm kết quả các task và hạng mục, None nếu không có."""
+        with closing(_connect(self.path)) as conn:
+            run = conn.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+            if run is None:
+                return None
+            run = dict(run)
+            tasks = [dict(row) for row in conn.execute(
+                "SELECT * FROM task_results WHERE run_id = ? ORDER BY id", (run_id,))]
+            details = {}
+            if tasks:
+                marks = ','.join('?' * len(tasks))
+                for row in conn.execute(
+                        f"SELECT * FROM detail_items WHERE task_result_id IN ({marks}) ORDER BY id",
+                        [task['id'] for task in tasks]):
+                    details.setdefault(row['task_result_id'], []).append(dict(row))
+        for task in tasks:
+            task['details'] = details.get(task['id'], [])
+        run['tasks'] = tasks
+        return run
+
+    def list_task_results(self, task=None, dut_serial=None, status=None, since=None, until=None,
+                          before=None, limit=50):
+        """Kết quả từng task (mới nhất trước), ví dụ các lần Failed của "2 Rs485". Trả về (rows, next_before)."""
+        where, params = self._filters(task=task, dut_serial=dut_serial, status=status, since=since,
+                                      until=until, before=before)
+        rows = self._query(
+            f"SELECT * FROM task_results {where} ORDER BY id DESC LIMIT ?", params + [limit + 1])
+        return self._page(rows, limit)
+
+    def last_task_result(self, task, dut_serial):
+        """Kết quả gần nhất của task trên board dut_serial (kèm 'details'), None nếu chưa từng chạy."""
+        with closing(_connect(self.path)) as conn:
+            row = conn.execute(
+                "SELECT * FROM task_results WHERE task = ? AND dut_serial IS ? ORDER BY id DESC LIMIT 1",
+                (task, dut_serial or None)).fetchone()
+            if row is None:
+                return None
+            result = dict(row)
+            result['details'] = [dict(detail) for detail in conn.execute(
+                "SELECT * FROM detail_items WHERE task_result_id = ? ORDER BY id", (result['id'],))]
+        return result
+
+    @staticmethod
+    def _filters(since=None, until=None, before=None, **equals):
+        clauses, params = [], []
+        for column, value in equals.items():
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("started_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("started_at < ?")
+            params.append(until)
+        if before is not None:
+            clauses.append("id < ?")
+            params.append(before)
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    @staticmethod
+    def _page(rows, limit):
+        # Lấy dư một dòng để biết còn trang sau hay không
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, rows[-1]['id']
+        return rows, None
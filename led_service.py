@@ -0,0 +1,120 @@
+# led_service.py
+"""
+LED trạng thái của trạm, chạy trong tiến trình server: không fork gpioset cho mỗi lần đảo LED.
+
+Mỗi trạng thái của trạm (idle, running, passed, failed) có một mẫu nháy: danh sách khung
+{gpio: 0/1} lặp lại sau mỗi `interval` giây. Một luồng nền ghi khung hiện tại qua gpio.py
+(giữ handle của line, chỉ ghi line đổi giá trị), stop() tắt hết LED và nhả các line.
+
+Mẫu mặc định dựng từ hai nhóm LED của board:
+- heartbeat (GPIO 119, 121): đảo trạng thái mỗi nhịp, cho biết server còn chạy;
+- chase (GPIO 133, 132, 134, 125): idle chạy đuổi chậm, running chạy đuổi nhanh,
+  passed sáng hết, failed nháy cả nhóm.
+Có thể thay mẫu của từng trạng thái bằng {'interval': giây, 'frames': [{gpio: giá trị}, ...]}.
+"""
+import logging
+import threading
+
+import gpio
+
+logger = logging.getLogger(__name__)
+
+STATES = ('idle', 'running', 'passed', 'failed')
+
+
+def default_patterns(heartbeat, chase):
+    """Mẫu nháy mặc định cho từng trạng thái, từ danh sách GPIO của hai nhóm LED."""
+    def frames(chase_frames, interval):
+        # Nhóm heartbeat đảo trạng thái sau mỗi khung; số khung chẵn để nhịp đều khi lặp lại
+        if len(chase_frames) % 2:
+            chase_frames = chase_frames * 2
+        return {'interval': interval,
+                'frames': [{**{pin: (index + 1) % 2 for pin in heartbeat}, **chase_frame}
+                           for index, chase_frame in enumerate(chase_frames)]}
+
+    one_on = [{pin: int(i == index) for i, pin in enumerate(chase)} for index in range(len(chase))]
+    return {
+        'idle': frames(one_on, 0.5),
+        'running': frames(one_on, 0.15),
+        'passed': frames([{pin: 1 for pin in chase}], 0.5),
+        'failed': frames([{pin: 1 for pin in chase}, {pin: 0 for pin in chase}], 0.25),
+    }
+
+
+def normalize_pattern(pattern):
+    """Kiểm tra mẫu nháy (có thể đọc từ JSON: gpio là chuỗi). Raise ValueError nếu không hợp lệ."""
+    interval = float(pattern.get('interval', 0.5))
+    frames = [{int(pin): int(bool(value)) for pin, value in frame.items()} for frame in pattern.get('frames', [])]
+    if interval <= 0 or not frames:
+        raise ValueError(f"LED pattern needs a positive interval and at least one frame: {pattern}")
+    return {'interval': interval, 'frames': frames}
+
+
+class LedService:
+    """Nháy LED trạng thái theo trạng thái của trạm trên một luồng nền."""
+
+    def __init__(self, heartbeat, chase, patterns=None, controller=None):
+        self.patterns = default_patterns(heartbeat, chase)
+        for state, pattern in (patterns or {}).items():
+            if state not in STATES:
+                logger.warning("Unknown LED state '%s' in patterns, expected one of %s", state, STATES)
+                continue
+            try:
+                self.patterns[state] = normalize_pattern(pattern)
+            except (ValueError, TypeError, AttributeError) as e:
+                logger.warning("Invalid LED pattern for '%s', using the default: %s", state, e)
+        self.pins = sorted({pin for pattern in self.patterns.values() for frame in pattern['frames'] for pin in frame})
+        self._controller = controller
+        self._state = 'idle'
+        self._changed = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def state(self):
+        return self._state
+
+    def set_state(self, state):
+        """Đổi mẫu nháy (idle, running, passed, failed), có hiệu lực ngay ở khung tiếp theo."""
+        if state not in STATES:
+            raise ValueError(f"Unknown LED state '{state}', expected one of {STATES}")
+        if state != self._state:
+            self._state = state
+            self._changed.set()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        if self._controller is None:
+            self._controller = gpio.controller()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='status-leds')
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info("Status LEDs started on GPIO %s", ', '.join(map(str, self.pins)))
+
+    def stop(self, timeout=2):
+        """Dừng luồng nháy, tắt tất cả LED và nhả các line."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._changed.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self._controller.set_many({pin: 0 for pin in self.pins}, force=True)
+        self._controller.close()
+        logger.info("Status LEDs stopped")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._changed.clear()
+            pattern = self.patterns[self._state]
+            for frame in pattern['frames']:
+                ok, error = self._controller.set_many(frame)
+                if not ok:
+                    # Không có GPIO (máy không phải board, thiếu quyền...): không thử lại mỗi nhịp
+                    logger.warning("Status LEDs disabled, GPIO write failed: %s", error)
+                    return
+                # Đổi trạng thái hoặc dừng: bỏ phần còn lại của mẫu hiện tại
+                if self._changed.wait(pattern['interval']):
+                    break
@@ -0,0 +1,54 @@
+# log_store.py
+import itertools
+import threading
+from collections import deque
+
+
+class LogStore:
+    """
+    Bộ đệm vòng (ring buffer) có giới hạn cho các dòng log của console.
+    Mỗi dòng được gán một số thứ tự (seq) tăng dần, không bao giờ dùng lại,
+    để client chỉ cần lấy các dòng sau seq cuối cùng mà nó đã có.
+    """
+
+    def __init__(self, maxlen=5000):
+        self._lines = deque(maxlen=maxlen)  # (seq, line)
+        self._lock = threading.Lock()
+        self._last_seq = 0
+
+    def append(self, line):
+        """Thêm một dòng log, trả về seq của dòng đó."""
+        with self._lock:
+            self._last_seq += 1
+            self._lines.append((self._last_seq, line))
+            return self._last_seq
+
+    def since(self, seq, limit=None):
+        """Trả về danh sách (seq, line) có seq > seq, tối đa `limit` dòng (lấy các dòng cũ nhất trước)."""
+        with self._lock:
+            if not self._lines or seq >= self._last_seq:
+                return []
+            first_seq = self._lines[0][0]
+            # seq liên tục trong bộ đệm nên vị trí bắt đầu được tính trực tiếp
+            start = max(0, seq - first_seq + 1)
+            stop = None if limit is None else start + limit
+            return list(itertools.islice(self._lines, start, stop))
+
+    def clear(self):
+        """Xoá các dòng đang lưu; seq vẫn tiếp tục tăng."""
+        with self._lock:
+            self._lines.clear()
+
+    @property
+    def first_seq(self):
+        """seq của dòng cũ nhất còn trong bộ đệm (last_seq + 1 nếu bộ đệm rỗng)."""
+        with self._lock:
+            return self._lines[0][0] if self._lines else self._last_seq + 1
+
+    @property
+    def last_seq(self):
+        with self._lock:
+            return self._last_seq
+
+    def __len__(self):
+        return len(self._lines)
@@ -3,15 +3,17 @@
 import eventlet
 eventlet.monkey_patch()
 # Import ứng dụng 'app' và 'socketio' từ file app.py
-from app import app, socketio
+from app import app, socketio, status_leds
 
-from flask import Flask
 import socket
+import logging
 import threading
 import time
-import subprocess
 import os
 import signal
+import sys
+
+logger = logging.getLogger(__name__)
 
 # Bỏ hết tác vụ GPIO
 # Xóa toàn bộ phần import, biến, hàm và thread liên quan đến GPIO
@@ -31,33 +33,26 @@ def send_udp_broadcast(port=5005, interval=1):
         udp_socket.sendto(message, ('<broadcast>', port))
         time.sleep(interval)
 
-def start_gpio_blink_process():
-    # Sử dụng đường dẫn tương đối từ thư mục hiện tại
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    script_path = os.path.join(current_dir, "tasks", "bash", "gpio_test.py")
-    
-    # Kiểm tra xem file có tồn tại không trước khi chạy
-    if not os.path.exists(script_path):
-        print(f"GPIO script not found at: {script_path}")
+# debug=True bật reloader: tiến trình cha chỉ theo dõi file, tiến trình con (WERKZEUG_RUN_MAIN) phục vụ request
+DEBUG = True
+
+def start_status_leds():
+    """LED trạng thái chạy trong tiến trình phục vụ request (xem led_service.py), không trong tiến trình reloader."""
+    if DEBUG and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
         return
-        
-    try:
-        proc = subprocess.Popen(["python3", script_path])
-        print(f"Started blink process, pid={proc.pid}")
-    except Exception as e:
-        print(f"Blink process error: {e}")
+    status_leds.start()
 
 # Chạy ở chế độ nền khi app khởi động
 threading.Thread(target=send_udp_broadcast, daemon=True).start()
-start_gpio_blink_process()
 
 # Khởi động ứng dụng
 if __name__ == "__main__":
     threading.Thread(target=send_udp_broadcast, daemon=True).start()
-    subprocess.run(["/usr/bin/pkill", "-f", "gpio_test.py"])
-    start_gpio_blink_process()
-    print("Starting Flask-SocketIO server...")
+    start_status_leds()
+    # systemd dừng service bằng SIGTERM: thoát qua finally để tắt LED và nhả các line GPIO
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    logger.info("Starting Flask-SocketIO server...")
     try:
-        socketio.run(app, debug=True, host='0.0.0.0', port=80)
+        socketio.run(app, debug=DEBUG, host='0.0.0.0', port=80)
     finally:
-        pass
\ No newline at end of file
+        status_leds.stop()
\ No newline at end of file
@@ -0,0 +1,122 @@
+# profiler.py
+"""
+Ghi lại dòng thời gian (span) của một lần chạy task, dùng trong tiến trình task (task_runner.py).
+
+install() thay time.sleep, subprocess.run/call/check_output, serial.Serial (open, read, readline,
+read_until, write, flush) bằng phiên bản có đo thời gian. Mỗi lệnh là một span:
+    {"kind": "sleep" | "subprocess" | "gpio" | "serial.open" | "serial.read" | ...,
+     "name": mô tả ngắn, "start": giây kể từ lúc task bắt đầu, "duration": giây}
+Lệnh gpioset và các lần ghi qua gpio.py được xếp vào kind "gpio". Span lồng nhau (ví dụ readline gọi read) chỉ ghi span ngoài cùng.
+Các span được gửi về server theo lô qua message {"type": "spans", "spans": [...]}.
+"""
+import functools
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_ENV = 'DCG_PROFILE'
+# Loại span được coi là chờ (không làm I/O), dùng để tính tỉ lệ chờ / I/O
+IDLE_KINDS = ('sleep',)
+
+_sleep = time.sleep
+_local = threading.local()
+_lock = threading.Lock()
+_spans = []
+_started = time.monotonic()
+_send = None
+_batch_size = 100
+
+
+@contextmanager
+def span(kind, name):
+    """Đo một khối code như một span (có thể dùng trực tiếp trong task)."""
+    if getattr(_local, 'depth', 0):
+        yield
+        return
+    _local.depth = 1
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        _local.depth = 0
+        _record(kind, name, start, time.monotonic())
+
+
+def _record(kind, name, start, end):
+    with _lock:
+        _spans.append({'kind': kind, 'name': name, 'start': round(start - _started, 4),
+                       'duration': round(end - start, 4)})
+        full = len(_spans) >= _batch_size
+    if full:
+        flush()
+
+
+def flush():
+    """Gửi các span đang giữ về server."""
+    with _lock:
+        spans = _spans[:]
+        del _spans[:]
+    if spans and _send is not None:
+        _send('spans', spans=spans)
+
+
+def _wrap(func, describe):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        kind, name = describe(*args, **kwargs)
+        with span(kind, name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _describe_sleep(seconds):
+    return 'sleep', f"sleep {seconds:g}s"
+
+
+def _describe_command(args, *rest, **kwargs):
+    argv = [args] if isinstance(args, str) else list(args)
+    command = ' '.join(str(arg) for arg in argv)
+    kind = 'gpio' if argv and str(argv[0]).split('/')[-1].startswith('gpioset') else 'subprocess'
+    return kind, command if len(command) <= 80 else command[:77] + '...'
+
+
+def _serial_describe(action):
+    def describe(ser, *args, **kwargs):
+        if action == 'write' and args:
+            return f"serial.{action}", f"{ser.port} {len(args[0])} bytes"
+        if action == 'read' and args:
+            return f"serial.{action}", f"{ser.port} {args[0]} bytes"
+        if action == 'open':
+            return f"serial.{action}", f"{ser.port} @{ser.baudrate}"
+        return f"serial.{action}", f"{ser.port} {action}"
+    return describe
+
+
+def install(send, batch_size=100):
+    """Bật đo thời gian trong tiến trình task; send(type, **fields) là hàm gửi message về server."""
+    global _send, _started, _batch_size
+    _send = send
+    _batch_size = batch_size
+    _started = time.monotonic()
+    time.sleep = _wrap(_sleep, _describe_sleep)
+    for name in ('run', 'call', 'check_call', 'check_output'):
+        setattr(subprocess, name, _wrap(getattr(subprocess, name), _describe_command))
+    try:
+        import serial
+    except ImportError:
+        return
+    for action in ('open', 'read', 'readline', 'read_until', 'write', 'flush'):
+        method = getattr(serial.Serial, action, None)
+        if method is not None:
+            setattr(serial.Serial, action, _wrap(method, _serial_describe(action)))
+
+
+def summarize(spans):
+    """Tổng thời gian theo từng loại span và tỉ lệ thời gian chờ (sleep) so với I/O."""
+    by_kind = {}
+    for item in spans:
+        by_kind[item['kind']] = round(by_kind.get(item['kind'], 0) + item['duration'], 4)
+    idle = sum(duration for kind, duration in by_kind.items() if kind in IDLE_KINDS)
+    busy = sum(duration for kind, duration in by_kind.items() if kind not in IDLE_KINDS)
+    return {'by_kind': by_kind, 'idle': round(idle, 4), 'io': round(busy, 4)}
@@ -0,0 +1,84 @@
+# resources.py
+import threading
+
+# Các loại tài nguyên phần cứng mà một task có thể khai báo trong RESOURCES.
+# Mỗi tài nguyên được viết dưới dạng "<loại>:<tên>", ví dụ:
+#   "serial:/dev/ttyACM0", "gpio:129", "sysfs:/sys/class/pwm/pwmchip1", "module:option", "i2c:2"
+RESOURCE_KINDS = ('serial', 'gpio', 'sysfs', 'module', 'i2c')
+
+# Tài nguyên đặc biệt: giữ nó nghĩa là giữ toàn bộ trạm (dùng cho task không khai báo RESOURCES)
+EXCLUSIVE = '*'
+
+
+def parse_resource(spec):
+    """Tách "<loại>:<tên>" thành (loại, tên). Raise ValueError nếu không hợp lệ."""
+    kind, sep, name = str(spec).partition(':')
+    kind = kind.strip().lower()
+    name = name.strip()
+    if not sep or not name or kind not in RESOURCE_KINDS:
+        raise ValueError(f"Invalid resource '{spec}', expected one of {RESOURCE_KINDS} as '<kind>:<name>'")
+    return kind, name
+
+
+def normalize_resources(specs):
+    """Kiểm tra và chuẩn hoá danh sách RESOURCES của một task (loại bỏ trùng lặp, sắp xếp)."""
+    if specs is None:
+        return None
+    return sorted({f"{kind}:{name}" for kind, name in map(parse_resource, specs)})
+
+
+def lock_resources_for(task):
+    """Danh sách tài nguyên cần khoá khi chạy task (kèm khoá riêng của task để không chạy trùng)."""
+    if task.get('resources') is None:
+        return [EXCLUSIVE]
+    return list(task['resources']) + [f"task:{task['id']}"]
+
+
+class ResourceLockManager:
+    """
+    Quản lý khoá tài nguyên phần cứng ở mức từng tài nguyên.
+    Một owner xin toàn bộ danh sách tài nguyên cùng lúc (tất cả hoặc không gì cả),
+    nhờ vậy không thể xảy ra deadlock giữa các task.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._holders = {}  # resource -> owner
+
+    def _busy(self, owner, resources):
+        busy = {}
+        for resource in resources:
+            holder = self._holders.get(resource)
+            if holder is not None and holder != owner:
+                busy[resource] = holder
+        if EXCLUSIVE in resources:
+            # Khoá toàn trạm: mọi tài nguyên đang bị giữ bởi owner khác đều chặn
+            busy.update({r: h for r, h in self._holders.items() if h != owner})
+        elif self._holders.get(EXCLUSIVE, owner) != owner:
+            busy[EXCLUSIVE] = self._holders[EXCLUSIVE]
+        return busy
+
+    def busy(self, resources, owner=None):
+        """Trả về {tài nguyên: owner} của các tài nguyên đang bị owner khác giữ."""
+        with self._cond:
+            return self._busy(owner, resources)
+
+    def acquire(self, owner, resources, timeout=None):
+        """Chờ tới khi xin được tất cả tài nguyên. Trả về False nếu hết timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: not self._busy(owner, resources), timeout):
+                return False
+            for resource in resources:
+                self._holders[resource] = owner
+            return True
+
+    def release(self, owner):
+        """Nhả tất cả tài nguyên mà owner đang giữ."""
+        with self._cond:
+            for resource in [r for r, h in self._holders.items() if h == owner]:
+                del self._holders[resource]
+            self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            return dict(self._holders)
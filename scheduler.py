@@ -0,0 +1,141 @@
+# scheduler.py
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prerequisites(spec):
+    """
+    Kiểm tra và chuẩn hoá PREREQUISITES của một task: {id task: [tên hạng mục phải đạt]}.
+    Danh sách rỗng nghĩa là cả task đó phải Passed. Raise ValueError nếu không hợp lệ.
+    """
+    if spec is None:
+        return {}
+    if not isinstance(spec, dict):
+        raise ValueError(f"PREREQUISITES must be a dict of task id -> item names, got {type(spec).__name__}")
+    prerequisites = {}
+    for task_id, items in spec.items():
+        if isinstance(items, str) or not all(isinstance(item, str) for item in items):
+            raise ValueError(f"Prerequisite items of '{task_id}' must be a list of item names")
+        prerequisites[str(task_id)] = list(items)
+    return prerequisites
+
+
+def tasks_conflict(task_a, task_b):
+    """
+    Hai task xung đột nếu chúng dùng chung ít nhất một tài nguyên phần cứng.
+    Task không khai báo RESOURCES (resources = None) được coi là xung đột với mọi task khác.
+    """
+    res_a = task_a.get('resources')
+    res_b = task_b.get('resources')
+    if res_a is None or res_b is None:
+        return True
+    return not set(res_a).isdisjoint(res_b)
+
+
+def build_conflict_graph(tasks):
+    """Trả về dict {task_id: set(task_id xung đột)} cho danh sách task."""
+    graph = {task['id']: set() for task in tasks}
+    for i, task_a in enumerate(tasks):
+        for task_b in tasks[i + 1:]:
+            if tasks_conflict(task_a, task_b):
+                graph[task_a['id']].add(task_b['id'])
+                graph[task_b['id']].add(task_a['id'])
+    return graph
+
+
+def build_dependency_graph(tasks):
+    """
+    Trả về dict {task_id: set(task_id phải chạy xong trước)} theo 'prerequisites' của từng task.
+    Chỉ giữ các task có trong danh sách.
+    """
+    ids = {task['id'] for task in tasks}
+    return {task['id']: set(task.get('prerequisites') or {}) & ids - {task['id']} for task in tasks}
+
+
+def order_by_dependencies(tasks):
+    """
+    Sắp xếp để task điều kiện luôn đứng trước task phụ thuộc, giữ nguyên thứ tự còn lại của `tasks`.
+    Nếu có vòng phụ thuộc, các task trong vòng giữ thứ tự ban đầu và phụ thuộc giữa chúng bị bỏ qua.
+    """
+    graph = build_dependency_graph(tasks)
+    ordered, done = [], set()
+    remaining = list(tasks)
+    while remaining:
+        ready = [task for task in remaining if graph[task['id']] <= done]
+        if not ready:
+            logger.warning("Circular prerequisites, keeping the original order of: %s", ', '.join(task['id'] for task in remaining))
+            ready = remaining
+        # Lấy task sẵn sàng đứng đầu rồi xét lại: task phía sau có thể vừa được mở khoá
+        task = ready[0]
+        ordered.append(task)
+        done.add(task['id'])
+        remaining.remove(task)
+    return ordered
+
+
+def run_tasks_parallel(tasks, run_task, max_parallel=0, should_stop=None, skip_task=None):
+    """
+    Chạy các task song song khi chúng không xung đột tài nguyên.
+
+    - Thứ tự trong `tasks` được giữ nguyên giữa các task xung đột với nhau:
+      một task chỉ bắt đầu khi mọi task xung đột đứng trước nó đã chạy xong.
+    - Task khai báo 'prerequisites' chỉ bắt đầu khi các task điều kiện đứng trước nó đã chạy xong
+      (xem order_by_dependencies); khi đó skip_task(task) được gọi, nếu trả về True thì task
+      bị bỏ qua (skip_task tự ghi nhận trạng thái) và run_task không được gọi.
+    - run_task(task) được gọi trong một luồng riêng cho mỗi task.
+    - max_parallel: số task chạy đồng thời tối đa (0 = không giới hạn).
+    - should_stop(): nếu trả về True thì không bắt đầu thêm task nào nữa (huỷ Auto Test).
+    Hàm trả về khi tất cả các task đã bắt đầu đều kết thúc, giá trị trả về là danh sách
+    các task chưa được chạy (rỗng nếu không bị dừng giữa chừng).
+    """
+    graph = build_conflict_graph(tasks)
+    position = {task['id']: index for index, task in enumerate(tasks)}
+    # Chỉ chờ task điều kiện đứng trước: vòng phụ thuộc (nếu có) không làm treo Auto Test
+    dependencies = {task_id: {dep for dep in deps if position[dep] < position[task_id]}
+                    for task_id, deps in build_dependency_graph(tasks).items()}
+    pending = list(tasks)
+    running = set()
+    cond = threading.Condition()
+
+    def worker(task):
+        try:
+            run_task(task)
+        finally:
+            with cond:
+                running.discard(task['id'])
+                cond.notify_all()
+
+    with cond:
+        while pending or running:
+            if should_stop is not None and should_stop():
+                # Không chạy thêm task, chỉ chờ các task đang chạy kết thúc
+                if not running:
+                    break
+                cond.wait(0.5)
+                continue
+            waiting_ids = set()
+            unfinished = running | {task['id'] for task in pending}
+            for task in list(pending):
+                if dependencies[task['id']] & unfinished:
+                    waiting_ids.add(task['id'])
+                    continue
+                if skip_task is not None and skip_task(task):
+                    pending.remove(task)
+                    unfinished.discard(task['id'])
+                    continue
+                if max_parallel and len(running) >= max_parallel:
+                    break
+                blockers = graph[task['id']] & (running | waiting_ids)
+                if blockers:
+                    waiting_ids.add(task['id'])
+                    continue
+                pending.remove(task)
+                running.add(task['id'])
+                thread = threading.Thread(target=worker, args=(task,))
+                thread.daemon = True
+                thread.start()
+            if pending or running:
+                cond.wait(0.5 if should_stop is not None else None)
+    return pending
@@ -0,0 +1,166 @@
+# serial_session.py
+"""
+Giữ các cổng serial mở suốt một lần chạy task và đổi baud rate / thông số đường truyền tại chỗ,
+thay vì mở rồi đóng lại tất cả các cổng cho mỗi baud rate.
+
+    with SerialSession(SERIAL_PORTS, timeout=1) as session:
+        for baud_rate in BAUD_RATES:
+            connections = session.configure(baud_rate)   # {port: serial.Serial}
+            session.drain(quiet_time(baud_rate))
+            connections[tx].write(data)
+            received = session.read_exact(rx, len(data), timeout=..., inter_byte_timeout=...)
+    logger.info(session.summary())
+
+Lần configure đầu tiên mở các cổng (chờ `open_settle` giây sau mỗi lần mở như trước), các lần sau
+chỉ đổi thông số của cổng đang mở (một lệnh termios). read_exact() trả về ngay khi nhận đủ số byte
+thay vì ngủ hết thời gian truyền dự tính; drain() xả bộ đệm và đo tới khi đường truyền im lặng thay
+vì ngủ cố định. stats() trả về số lần và tổng thời gian mở / đổi thông số / đóng / xả để so sánh chi phí.
+"""
+import logging
+import time
+
+import serial
+
+import profiler
+
+logger = logging.getLogger(__name__)
+
+BITS_PER_CHAR = 10  # 8N1: start + 8 bit dữ liệu + stop
+
+
+def char_time(baudrate):
+    """Thời gian truyền một ký tự (giây) ở baud rate này."""
+    return BITS_PER_CHAR / baudrate
+
+
+def transfer_time(byte_count, baudrate):
+    """Thời gian truyền byte_count byte (giây), chưa tính độ trễ của bộ chuyển đổi USB."""
+    return byte_count * char_time(baudrate)
+
+
+def quiet_time(baudrate, chars=20, minimum=0.005):
+    """Khoảng im lặng coi như đường truyền đã hết dữ liệu: `chars` ký tự, tối thiểu `minimum` giây."""
+    return max(minimum, chars * char_time(baudrate))
+
+
+class SerialSession:
+    """Các cổng serial dùng chung cho nhiều bước (baud rate) của một task."""
+
+    def __init__(self, ports, open_settle=0.1, **settings):
+        self.ports = list(ports)
+        self.open_settle = open_settle
+        self.settings = settings  # Thông số mặc định cho serial.Serial (timeout, parity...)
+        self._connections = {}
+        self._stats = {'opens': 0, 'open_time': 0.0, 'reconfigures': 0, 'reconfigure_time': 0.0,
+                       'closes': 0, 'close_time': 0.0, 'drains': 0, 'drain_time': 0.0, 'drained_bytes': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def configure(self, baudrate, **settings):
+        """
+        Đặt baud rate (và thông số khác) cho tất cả các cổng, mở cổng nào chưa mở.
+        Trả về {port: serial.Serial}. Raise serial.SerialException nếu không mở được một cổng.
+        """
+        settings = dict(self.settings, baudrate=baudrate, **settings)
+        for port in self.ports:
+            ser = self._connections.get(port)
+            if ser is None:
+                logger.info("Opening %s at %s baud", port, baudrate, extra={"port": port, "baud": baudrate})
+                started = time.monotonic()
+                ser = serial.Serial(port, **settings)
+                self._connections[port] = ser
+                time.sleep(self.open_settle)
+                self._stats['opens'] += 1
+                self._stats['open_time'] += time.monotonic() - started
+                continue
+            started = time.monotonic()
+            with profiler.span('serial.configure', f"{port} @{baudrate}"):
+                # pyserial áp dụng thông số mới ngay (termios) khi cổng đang mở
+                ser.apply_settings(settings)
+            self._stats['reconfigures'] += 1
+            self._stats['reconfigure_time'] += time.monotonic() - started
+        return dict(self._connections)
+
+    def __getitem__(self, port):
+        return self._connections[port]
+
+    def read_exact(self, port, size, timeout=None, inter_byte_timeout=None):
+        """
+        Đọc `size` byte từ port: trả về ngay khi đủ, hoặc khi hết `timeout` giây, hoặc khi đã nhận
+        dữ liệu mà không có byte mới trong `inter_byte_timeout` giây (None = giữ thông số hiện tại của cổng).
+        Byte đã tới nhưng vượt quá `size` cũng được trả về để bên gọi phát hiện dữ liệu thừa.
+        """
+        ser = self._connections[port]
+        changes = {key: value for key, value in (('timeout', timeout), ('inter_byte_timeout', inter_byte_timeout))
+                   if value is not None and getattr(ser, key) != value}
+        if changes:
+            ser.apply_settings(changes)
+        data = ser.read(size)
+        if len(data) == size and ser.in_waiting:
+            data += ser.read(ser.in_waiting)
+        return data
+
+    def drain(self, quiet, timeout=1.0):
+        """
+        Xả bộ đệm của tất cả các cổng: chờ dữ liệu đang gửi ra hết (tcdrain), bỏ dữ liệu đã nhận,
+        rồi xác nhận không cổng nào nhận thêm byte trong `quiet` giây (tối đa `timeout` giây).
+        Trả về số byte đã bỏ; số byte và thời gian được cộng vào stats().
+        """
+        started = time.monotonic()
+        connections = list(self._connections.values())
+        with profiler.span('serial.drain', f"{len(connections)} ports, quiet {quiet * 1000:.0f}ms"):
+            for ser in connections:
+                ser.flush()
+            discarded = 0
+            quiet_since = time.monotonic()
+            deadline = started + timeout
+            while True:
+                waiting = 0
+                for ser in connections:
+                    count = ser.in_waiting
+                    if count:
+                        waiting += count
+                        ser.reset_input_buffer()
+                now = time.monotonic()
+                if waiting:
+                    discarded += waiting
+                    quiet_since = now
+                elif now - quiet_since >= quiet:
+                    break
+                if now >= deadline:
+                    logger.warning("Serial ports still receiving after %.2fs, %d byte(s) discarded",
+                                   timeout, discarded)
+                    break
+                time.sleep(min(quiet / 4, deadline - now))
+        self._stats['drains'] += 1
+        self._stats['drain_time'] += time.monotonic() - started
+        self._stats['drained_bytes'] += discarded
+        return discarded
+
+    def close(self):
+        """Đóng tất cả các cổng đang mở (lỗi khi đóng một cổng không chặn các cổng còn lại)."""
+        for port, ser in list(self._connections.items()):
+            started = time.monotonic()
+            try:
+                ser.close()
+                logger.info("Closed %s", port)
+            except Exception as e:
+                logger.error("Error closing %s: %s", port, e)
+            self._stats['closes'] += 1
+            self._stats['close_time'] += time.monotonic() - started
+        self._connections.clear()
+
+    def stats(self):
+        return {key: round(value, 4) if isinstance(value, float) else value for key, value in self._stats.items()}
+
+    def summary(self):
+        """Một dòng mô tả chi phí mở/đổi thông số/đóng cổng, để ghi vào log và message của task."""
+        stats = self.stats()
+        return (f"Serial ports: {stats['opens']} open(s) in {stats['open_time']:.3f}s, "
+                f"{stats['reconfigures']} reconfigure(s) in {stats['reconfigure_time']:.3f}s, "
+                f"{stats['closes']} close(s) in {stats['close_time']:.3f}s, "
+                f"{stats['drains']} drain(s) in {stats['drain_time']:.3f}s ({stats['drained_bytes']} byte(s) discarded)")
@@ -0,0 +1,12 @@
+# sim/__init__.py
+"""
+Bộ mô phỏng phần cứng của jig để chạy và đo các task test trên máy Linux bất kỳ (không cần board).
+
+- sim.serial_bus: các cặp pseudo-terminal thay cho /dev/ttyACM0-3, nối thành bus 0<->1 và 2<->3.
+- sim.sim7600: modem SIM7600 giả trả lời lệnh AT trên ttyUSB1 (CCID theo SIM chọn bởi GPIO_SIMSEL).
+- sim.gpio_state: trạng thái GPIO giả (mỗi line một file) dùng chung giữa gpioset giả và các thiết bị mô phỏng.
+- sim.fake_tools và sim/bin: gpioset, stm32flash, i2cdetect, lsusb, ip, df, modprobe giả (dùng qua DCG_TOOL_DIR,
+  xem toolpaths.py) với độ trễ và kết quả cấu hình được.
+
+bench/station_bench.py dùng các bộ mô phỏng này để đo thời gian một chu kỳ Auto Test.
+"""
@@ -0,0 +1,137 @@
+# sim/fake_tools.py
+"""
+Công cụ hệ thống giả (gpioset, stm32flash, i2cdetect, lsusb, ip, df, modprobe) cho máy Linux không có board.
+
+Các file trong sim/bin gọi main(<tên công cụ>, argv). Dùng bằng cách trỏ toolpaths vào sim/bin:
+
+    DCG_TOOL_DIR=$PWD/sim/bin python main.py
+
+Mặc định mỗi công cụ trả về kết quả giống board đạt (lsusb có Terminus Hub và Ethernet adapter,
+i2cdetect thấy 0x68...). File JSON trong DCG_SIM_TOOLS điều khiển độ trễ và kết quả của từng công cụ:
+
+    {
+        "gpioset": {"latency": 0.004},
+        "stm32flash": {"latency": 9.5},
+        "i2cdetect": {"latency": 0.3, "stdout": "...bảng không có 0x68...", "exit": 0},
+        "lsusb": {"stderr": "unable to initialize libusb", "exit": 1}
+    }
+
+gpioset ghi giá trị line vào trạng thái GPIO giả (sim.gpio_state) để các thiết bị mô phỏng đọc lại.
+"""
+import json
+import os
+import sys
+import time
+
+from sim import gpio_state
+
+CONFIG_ENV = 'DCG_SIM_TOOLS'
+
+LSUSB_OUTPUT = """\
+Bus 002 Device 001: ID 1d6b:0003 Linux Foundation 3.0 root hub
+Bus 001 Device 003: ID 0bda:8153 Realtek Semiconductor Corp. RTL8153 Gigabit Ethernet 10/100/1000 Adapter
+Bus 001 Device 002: ID 1a40:0101 Terminus Technology Inc. Hub
+Bus 001 Device 001: ID 1d6b:0002 Linux Foundation 2.0 root hub
+"""
+
+IP_LINK_OUTPUT = """\
+1: lo: <LOOPBACK,UP,LOWER_UP> mtu 65536 qdisc noqueue state UNKNOWN mode DEFAULT group default qlen 1000\\    link/loopback 00:00:00:00:00:00 brd 00:00:00:00:00:00
+2: eth0: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 qdisc mq state UP mode DEFAULT group default qlen 1000\\    link/ether 02:81:3c:5e:12:01 brd ff:ff:ff:ff:ff:ff
+3: eth1: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 qdisc fq_codel state UP mode DEFAULT group default qlen 1000\\    link/ether 00:e0:4c:68:00:02 brd ff:ff:ff:ff:ff:ff
+"""
+
+IP_ADDR_OUTPUT = """\
+1: lo    inet 127.0.0.1/8 scope host lo\\       valid_lft forever preferred_lft forever
+2: eth0    inet 192.168.1.50/24 brd 192.168.1.255 scope global eth0\\       valid_lft forever preferred_lft forever
+3: eth1    inet 10.0.0.50/24 brd 10.0.0.255 scope global eth1\\       valid_lft forever preferred_lft forever
+"""
+
+DF_OUTPUT = """\
+Filesystem      Size  Used Avail Use% Mounted on
+udev            1.9G     0  1.9G   0% /dev
+tmpfs           391M  4.2M  387M   2% /run
+/dev/mmcblk1p2   29G  3.1G   25G  12% /
+/dev/mmcblk1p1  253M   52M  201M  21% /boot
+"""
+
+
+def _i2cdetect_output(addresses=(0x68,)):
+    lines = ["     0  1  2  3  4  5  6  7  8  9  a  b  c  d  e  f"]
+    for row in range(0, 0x80, 0x10):
+        cells = []
+        for address in range(row, row + 0x10):
+            if address < 0x03 or address > 0x77:
+                cells.append("  ")
+            else:
+                cells.append(f"{address:02x}" if address in addresses else "--")
+        lines.append(f"{row:02x}: " + " ".join(cells))
+    return "\n".join(lines) + "\n"
+
+
+def _gpioset(argv):
+    """gpioset <chip> <line>=<value>... (cú pháp libgpiod v1, bỏ qua các tuỳ chọn -m/--mode...)."""
+    positional = [arg for arg in argv if not arg.startswith('-')]
+    if len(positional) < 2:
+        return '', 'gpioset: at least one GPIO line offset to value mapping must be specified\n', 1
+    chip, assignments = positional[0], positional[1:]
+    for assignment in assignments:
+        line, sep, value = assignment.partition('=')
+        if not sep or not line.isdigit() or value not in ('0', '1'):
+            return '', f'gpioset: invalid offset<->value mapping: {assignment}\n', 1
+    for assignment in assignments:
+        line, _, value = assignment.partition('=')
+        gpio_state.write_line(chip, int(line), int(value))
+    return '', '', 0
+
+
+def _stm32flash(argv):
+    image = argv[argv.index('-w') + 1] if '-w' in argv and argv.index('-w') + 1 < len(argv) else None
+    if image is None or not os.path.isfile(image):
+        return '', f'Failed to open file: {image}\n', 1
+    size = os.path.getsize(image)
+    port = argv[-1] if argv else ''
+    stdout = (f"stm32flash 0.5\n\nhttp://stm32flash.sourceforge.net/\n\n"
+              f"Using Parser : Raw BINARY\nInterface serial_posix: 57600 8E1\nVersion      : 0x31\n"
+              f"Device ID    : 0x0410 (STM32F10xxx Medium-density)\nSerial port  : {port}\n"
+              f"Write to memory\nErasing memory\n"
+              f"Wrote and verified address 0x{0x08000000 + size:08x} (100.00%) Done.\n\n"
+              f"Starting execution at address 0x08000000... done.\n")
+    return stdout, '', 0
+
+
+def _ip(argv):
+    if 'addr' in argv or 'address' in argv:
+        return IP_ADDR_OUTPUT, '', 0
+    return IP_LINK_OUTPUT, '', 0
+
+
+TOOLS = {
+    'gpioset': _gpioset,
+    'stm32flash': _stm32flash,
+    'i2cdetect': lambda argv: (_i2cdetect_output(), '', 0),
+    'lsusb': lambda argv: (LSUSB_OUTPUT, '', 0),
+    'ip': _ip,
+    'df': lambda argv: (DF_OUTPUT, '', 0),
+    'modprobe': lambda argv: ('', '', 0),
+}
+
+
+def load_config():
+    path = os.environ.get(CONFIG_ENV)
+    if not path:
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(name, argv):
+    settings = load_config().get(name, {})
+    stdout, stderr, code = TOOLS[name](argv)
+    # Kết quả cấu hình trong DCG_SIM_TOOLS thay kết quả mặc định (gpioset vẫn ghi trạng thái GPIO ở trên)
+    stdout = settings.get('stdout', stdout)
+    stderr = settings.get('stderr', stderr)
+    code = settings.get('exit', code)
+    time.sleep(settings.get('latency', 0))
+    sys.stdout.write(stdout)
+    sys.stderr.write(stderr)
+    return code
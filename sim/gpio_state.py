@@ -0,0 +1,54 @@
+# sim/gpio_state.py
+"""
+Trạng thái GPIO giả cho bộ mô phỏng: mỗi line là một file <thư mục>/gpiochip<N>/<line> chứa "0" hoặc "1".
+
+Công cụ gpioset giả và backend 'fake' của gpio.py ghi vào đây, các thiết bị mô phỏng (ví dụ modem SIM7600 đọc line SIMSEL) đọc lại.
+Thư mục được chọn bằng biến môi trường DCG_SIM_GPIO_DIR.
+"""
+import os
+
+GPIO_DIR_ENV = 'DCG_SIM_GPIO_DIR'
+DEFAULT_GPIO_DIR = '/tmp/dcg-sim/gpio'
+LINES_PER_CHIP = 32  # Cách đánh số GPIO của các task: gpio = chip * 32 + line
+
+
+def gpio_dir():
+    return os.environ.get(GPIO_DIR_ENV) or DEFAULT_GPIO_DIR
+
+
+def chip_line(gpio):
+    """Số GPIO -> (tên chip, số line), ví dụ 144 -> ('gpiochip4', 16)."""
+    return f"gpiochip{gpio // LINES_PER_CHIP}", gpio % LINES_PER_CHIP
+
+
+def line_path(chip, line, directory=None):
+    return os.path.join(directory or gpio_dir(), chip, str(line))
+
+
+def read_line(chip, line, default=None, directory=None):
+    """Giá trị hiện tại của line (0/1), hoặc `default` nếu line chưa từng được đặt."""
+    try:
+        with open(line_path(chip, line, directory)) as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return default
+
+
+def write_line(chip, line, value, directory=None):
+    path = line_path(chip, line, directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Ghi file tạm rồi đổi tên để bên đọc không thấy file rỗng
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'w') as f:
+        f.write(f"{int(value)}\n")
+    os.replace(tmp, path)
+
+
+def read_gpio(gpio, default=None, directory=None):
+    chip, line = chip_line(gpio)
+    return read_line(chip, line, default, directory)
+
+
+def write_gpio(gpio, value, directory=None):
+    chip, line = chip_line(gpio)
+    write_line(chip, line, value, directory)
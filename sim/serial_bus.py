@@ -0,0 +1,237 @@
+# sim/serial_bus.py
+"""
+Bus serial ảo dựa trên pseudo-terminal (pty) thay cho các cổng RS485/RS422 của jig.
+
+Mỗi cổng mô phỏng là một cặp pty: task mở đầu slave (qua symlink ổn định, ví dụ
+/tmp/dcg-sim/A/ttyACM0), bộ mô phỏng đọc/ghi đầu master. Byte ghi vào một cổng được chuyển tới
+các cổng khác cùng bus (mặc định 0<->1 và 2<->3, giống dây nối trên jig) với:
+- latency: độ trễ cố định (giây) trước khi byte tới nơi;
+- pacing theo baud: mỗi byte mất 10 bit / baud giây trên đường truyền (baud đọc từ termios mà task
+  đã đặt trên cổng), các lần gửi trên cùng bus nối tiếp nhau như trên một đường dây thật;
+- bit_error_rate: xác suất lật mỗi bit để kiểm tra đường báo lỗi của task.
+
+Cổng mô phỏng được đưa vào task bằng file fixture (xem fixtures.py): mỗi slot ghi đè SERIAL_PORTS
+bằng các symlink của bộ mô phỏng. Chạy độc lập:
+
+    python -m sim.serial_bus --slots A,B --latency 0.002 --fixture-out /tmp/dcg-sim/fixtures.json
+    FIXTURE_FILE=/tmp/dcg-sim/fixtures.json python main.py
+"""
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import selectors
+import termios
+import threading
+import time
+import tty
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORTS = ['ttyACM0', 'ttyACM1', 'ttyACM2', 'ttyACM3']
+DEFAULT_BUSES = [(0, 1), (2, 3)]
+# Hằng số tốc độ termios -> baud
+BAUD_BY_SPEED = {getattr(termios, f"B{baud}"): baud
+                 for baud in (1200, 2400, 4800, 9600, 19200, 38400, 57600, 115200, 230400, 460800, 921600)
+                 if hasattr(termios, f"B{baud}")}
+
+
+class SimPort:
+    """Một cổng mô phỏng: cặp pty và symlink mà task mở."""
+
+    def __init__(self, name, link, publish=True):
+        self.name = name
+        self.link = link
+        self.master, self.slave = os.openpty()
+        # Giữ đầu slave mở để master không bị EIO khi task đóng cổng; chế độ raw như một UART
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.path = os.ttyname(self.slave)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        if publish:
+            self.publish()
+
+    def publish(self):
+        """Tạo symlink để task thấy cổng (ví dụ khi modem mô phỏng khởi động xong)."""
+        if os.path.lexists(self.link):
+            os.unlink(self.link)
+        os.symlink(self.path, self.link)
+
+    def unpublish(self):
+        if os.path.islink(self.link):
+            os.unlink(self.link)
+
+    def baudrate(self, default=115200):
+        """Baud mà task đã cấu hình trên cổng (termios của pty dùng chung giữa master và slave)."""
+        try:
+            speed = termios.tcgetattr(self.master)[5]
+        except termios.error:
+            return default
+        return BAUD_BY_SPEED.get(speed, default)
+
+    def close(self):
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self.unpublish()
+
+
+class LoopbackBuses:
+    """
+    Các bus serial ảo. Mỗi slot có một bộ cổng riêng (DEFAULT_PORTS) nối theo `buses`.
+
+        buses = LoopbackBuses('/tmp/dcg-sim', slots=['A'], latency=0.002)
+        buses.start()
+        buses.port_map()   # {'A': {'/dev/ttyACM0': '/tmp/dcg-sim/A/ttyACM0', ...}}
+        buses.stop()
+    """
+
+    def __init__(self, directory, slots=('A',), ports=DEFAULT_PORTS, buses=DEFAULT_BUSES,
+                 latency=0.0, bit_error_rate=0.0, pace=True, seed=None):
+        self.directory = directory
+        self.latency = latency
+        self.bit_error_rate = bit_error_rate
+        self.pace = pace
+        self._random = random.Random(seed)
+        self.ports = {}   # (slot, tên cổng) -> SimPort
+        self._peers = {}  # master fd -> [SimPort cùng bus]
+        self._by_fd = {}
+        self._line_free_at = {}  # id bus -> thời điểm đường dây rảnh
+        self._bus_of = {}
+        self._queue = []  # heap (thời điểm giao, seq, SimPort đích, bytes)
+        self._seq = itertools.count()
+        self._stop = threading.Event()
+        self._thread = None
+        for slot in slots:
+            os.makedirs(os.path.join(directory, slot), exist_ok=True)
+            slot_ports = [SimPort(name, os.path.join(directory, slot, name)) for name in ports]
+            for port in slot_ports:
+                self.ports[(slot, port.name)] = port
+                self._by_fd[port.master] = port
+            for bus_index, members in enumerate(buses):
+                bus_id = (slot, bus_index)
+                self._line_free_at[bus_id] = 0.0
+                for member in members:
+                    port = slot_ports[member]
+                    self._bus_of[port.master] = bus_id
+                    self._peers[port.master] = [slot_ports[other] for other in members if other != member]
+
+    def port_map(self):
+        """{slot: {'/dev/<cổng gốc>': symlink mô phỏng}}, dùng để tạo file fixture."""
+        mapping = {}
+        for (slot, name), port in self.ports.items():
+            mapping.setdefault(slot, {})[f"/dev/{name}"] = port.link
+        return mapping
+
+    def fixture_config(self, variable='SERIAL_PORTS'):
+        """Cấu hình fixture (fixtures.py) ghi đè `variable` của task bằng các cổng mô phỏng."""
+        return {'slots': {slot: {variable: list(ports.values())} for slot, ports in self.port_map().items()}}
+
+    def stats(self):
+        return {f"{slot}/{name}": {'bytes_in': port.bytes_in, 'bytes_out': port.bytes_out}
+                for (slot, name), port in self.ports.items()}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='sim-serial-bus')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        for port in self.ports.values():
+            port.close()
+
+    def _corrupt(self, data):
+        if not self.bit_error_rate:
+            return data
+        # Xác suất một byte có ít nhất một bit lỗi; mỗi byte lỗi bị lật một bit ngẫu nhiên
+        byte_error = 1 - (1 - self.bit_error_rate) ** 8
+        data = bytearray(data)
+        for index in range(len(data)):
+            if self._random.random() < byte_error:
+                data[index] ^= 1 << self._random.randrange(8)
+        return bytes(data)
+
+    def _transmit(self, source, data):
+        now = time.monotonic()
+        bus_id = self._bus_of.get(source.master)
+        source.bytes_in += len(data)
+        if bus_id is None:
+            return
+        start = max(now, self._line_free_at[bus_id])
+        duration = len(data) * 10 / source.baudrate() if self.pace else 0.0
+        self._line_free_at[bus_id] = start + duration
+        deliver_at = start + duration + self.latency
+        for peer in self._peers[source.master]:
+            heapq.heappush(self._queue, (deliver_at, next(self._seq), peer, self._corrupt(data)))
+
+    def _deliver_due(self):
+        now = time.monotonic()
+        while self._queue and self._queue[0][0] <= now:
+            _, _, peer, data = heapq.heappop(self._queue)
+            try:
+                os.write(peer.master, data)
+                peer.bytes_out += len(data)
+            except BlockingIOError:
+                # Bộ đệm pty đầy (task không đọc): bỏ dữ liệu như UART bị tràn
+                logger.warning("Simulated port %s overflow, dropped %d bytes", peer.link, len(data))
+
+    def _loop(self):
+        selector = selectors.DefaultSelector()
+        for fd in self._by_fd:
+            selector.register(fd, selectors.EVENT_READ)
+        while not self._stop.is_set():
+            timeout = 0.1
+            if self._queue:
+                timeout = max(0.0, min(timeout, self._queue[0][0] - time.monotonic()))
+            for key, _ in selector.select(timeout):
+                try:
+                    data = os.read(key.fd, 4096)
+                except (BlockingIOError, OSError):
+                    continue
+                if data:
+                    self._transmit(self._by_fd[key.fd], data)
+            self._deliver_due()
+        selector.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="pty-backed RS485/RS422 loopback buses")
+    parser.add_argument('--dir', default='/tmp/dcg-sim', help="Thư mục chứa symlink các cổng mô phỏng")
+    parser.add_argument('--slots', default='A', help="Danh sách slot, ví dụ A,B")
+    parser.add_argument('--latency', type=float, default=0.0, help="Độ trễ cố định mỗi lần gửi (giây)")
+    parser.add_argument('--bit-error-rate', type=float, default=0.0, help="Xác suất lỗi mỗi bit")
+    parser.add_argument('--no-pace', action='store_true', help="Không giới hạn tốc độ theo baud")
+    parser.add_argument('--fixture-out', help="Ghi file fixture (fixtures.py) dùng các cổng mô phỏng")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    buses = LoopbackBuses(args.dir, slots=args.slots.split(','), latency=args.latency,
+                          bit_error_rate=args.bit_error_rate, pace=not args.no_pace)
+    buses.start()
+    if args.fixture_out:
+        with open(args.fixture_out, 'w') as f:
+            json.dump(buses.fixture_config(), f, indent=4)
+        logger.info("Fixture file written: %s", args.fixture_out)
+    for slot, ports in buses.port_map().items():
+        for original, link in ports.items():
+            logger.info("Slot %s: %s -> %s", slot, original, link)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        buses.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+# sim/sim7600.py
+"""
+Modem SIM7600 mô phỏng trên pty để chạy task_4_SIM7600 không cần modem thật.
+
+- Ba cổng ttyUSB0-2 (symlink trong thư mục mô phỏng); lệnh AT được xử lý trên cổng AT (ttyUSB1).
+- Nguồn: nếu line GPIO_POWER (xem sim.gpio_state) được đặt, modem khởi động khi line lên 1 và các
+  cổng chỉ xuất hiện sau `boot_delay` giây, giống module thật. Line chưa từng được đặt = đã cấp nguồn.
+- SIM: AT+CFUN=1 đọc line GPIO_SIMSEL để chọn SIM (0 = SIM1, 1 = SIM2), SIM sẵn sàng sau
+  `sim_ready_delay` giây (trước đó AT+CPIN?/AT+CICCID trả "+CME ERROR: SIM busy"), đăng ký mạng
+  sau `registration_delay` giây. Các URC (+CPIN: READY, SMS DONE, PB DONE, RDY...) được gửi như modem thật.
+- Lệnh hỗ trợ: AT, ATE0/ATE1, AT+CFUN=<n>/?, AT+CGEREP=..., AT+CPIN?, AT+CICCID, AT+CSQ, AT+CREG?.
+  Có thể thêm/ghi đè phản hồi bằng `responses` ({lệnh: phản hồi}) trong file script JSON.
+
+    python -m sim.sim7600 --dir /tmp/dcg-sim --ccid 8984...01 --ccid 8984...02 --fixture-out /tmp/dcg-sim/fixtures.json
+"""
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import os
+import selectors
+import threading
+import time
+
+from sim import gpio_state
+from sim.serial_bus import SimPort
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ports': ['ttyUSB0', 'ttyUSB1', 'ttyUSB2'],
+    'at_port': 'ttyUSB1',
+    'power_gpio': 123,
+    'simsel_gpio': 144,
+    'ccids': ['89840480000000000011', '89840480000000000029'],  # SIM1, SIM2 (None = không có SIM)
+    'boot_delay': 12.0,          # Cấp nguồn -> cổng USB xuất hiện
+    'ready_delay': 3.0,          # Cổng xuất hiện -> URC RDY, modem nhận lệnh AT
+    'sim_ready_delay': 2.0,      # AT+CFUN=1 -> SIM sẵn sàng (+CPIN: READY)
+    'registration_delay': 4.0,   # SIM sẵn sàng -> đăng ký mạng (+CREG: 0,1)
+    'response_delay': 0.05,      # Thời gian xử lý mỗi lệnh AT
+    'echo': True,
+    'responses': {},
+}
+
+
+class Sim7600Emulator:
+    """Modem mô phỏng. Dùng start()/stop(); fixture_config() trả về file fixture trỏ task vào các cổng mô phỏng."""
+
+    def __init__(self, directory, slot='A', **options):
+        unknown = set(options) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown SIM7600 emulator options: {', '.join(sorted(unknown))}")
+        self.config = {**DEFAULTS, **options}
+        self.directory = os.path.join(directory, slot)
+        self.slot = slot
+        os.makedirs(self.directory, exist_ok=True)
+        self.ports = {name: SimPort(name, os.path.join(self.directory, name), publish=False)
+                      for name in self.config['ports']}
+        self.at = self.ports[self.config['at_port']]
+        self._buffer = b''
+        self._out = []  # heap (thời điểm gửi, seq, bytes)
+        self._seq = itertools.count()
+        self._stop = threading.Event()
+        self._thread = None
+        self._reset()
+
+    # --- Trạng thái modem ---
+    def _reset(self):
+        self.powered = False
+        self.booted_at = None     # thời điểm các cổng xuất hiện
+        self.cfun = 1
+        self.sim_slot = 0
+        self.sim_ready_at = None  # None = SIM chưa/không sẵn sàng
+        self.echo = self.config['echo']
+        self._buffer = b''
+        self._out = []
+
+    def _power_on(self, now):
+        self.powered = True
+        self.booted_at = now + self.config['boot_delay']
+        logger.info("SIM7600 %s: power on, ports in %.1fs", self.slot, self.config['boot_delay'])
+
+    def _power_off(self):
+        for port in self.ports.values():
+            port.unpublish()
+        self._reset()
+        logger.info("SIM7600 %s: power off", self.slot)
+
+    def _select_sim(self, now):
+        self.sim_slot = gpio_state.read_gpio(self.config['simsel_gpio'], 0) or 0
+        ccid = self._ccid()
+        self.sim_ready_at = now + self.config['sim_ready_delay'] if ccid else None
+        if ccid:
+            self._send_at(self.sim_ready_at, "+CPIN: READY")
+            self._send_at(self.sim_ready_at + 0.5, "SMS DONE")
+            self._send_at(self.sim_ready_at + 1.0, "PB DONE")
+        else:
+            self._send_at(now + self.config['sim_ready_delay'], "+CPIN: NOT INSERTED")
+
+    def _ccid(self):
+        ccids = self.config['ccids']
+        return ccids[self.sim_slot] if self.sim_slot < len(ccids) else None
+
+    def _sim_ready(self, now):
+        return self.cfun == 1 and self.sim_ready_at is not None and now >= self.sim_ready_at
+
+    # --- Lệnh AT ---
+    def handle_command(self, command, now):
+        """Trả về danh sách dòng phản hồi cho một lệnh AT (không gồm echo)."""
+        upper = command.strip().upper()
+        custom = self.config['responses'].get(upper)
+        if custom is not None:
+            return custom if isinstance(custom, list) else [custom]
+        if upper == 'AT':
+            return ['OK']
+        if upper in ('ATE0', 'ATE1'):
+            self.echo = upper == 'ATE1'
+            return ['OK']
+        if upper.startswith('AT+CFUN='):
+            value = upper.split('=', 1)[1].split(',')[0]
+            if value not in ('0', '1', '4'):
+                return ['ERROR']
+            self.cfun = int(value)
+            if self.cfun == 1:
+                self._select_sim(now)
+            else:
+                self.sim_ready_at = None
+            return ['OK']
+        if upper == 'AT+CFUN?':
+            return [f'+CFUN: {self.cfun}', 'OK']
+        if upper.startswith('AT+CGEREP'):
+            return ['OK']
+        if upper == 'AT+CPIN?':
+            if self.cfun != 1:
+                return ['+CME ERROR: SIM failure']
+            if self._ccid() is None:
+                return ['+CME ERROR: SIM not inserted']
+            if not self._sim_ready(now):
+                return ['+CME ERROR: SIM busy']
+            return ['+CPIN: READY', 'OK']
+        if upper == 'AT+CICCID':
+            if not self._sim_ready(now):
+                return ['+CME ERROR: SIM busy' if self.cfun == 1 and self._ccid() else '+CME ERROR: SIM failure']
+            return [f'+ICCID: {self._ccid()}', 'OK']
+        if upper == 'AT+CSQ':
+            return ['+CSQ: 23,99' if self._registered(now) else '+CSQ: 99,99', 'OK']
+        if upper == 'AT+CREG?':
+            return [f'+CREG: 0,{1 if self._registered(now) else 2}', 'OK']
+        return ['ERROR']
+
+    def _registered(self, now):
+        return self._sim_ready(now) and now >= self.sim_ready_at + self.config['registration_delay']
+
+    def _send_at(self, at, line):
+        heapq.heappush(self._out, (at, next(self._seq), f"\r\n{line}\r\n".encode()))
+
+    def _on_input(self, data, now):
+        if self.booted_at is None or now < self.booted_at + self.config['ready_delay']:
+            return  # Modem chưa sẵn sàng: bỏ qua lệnh như module thật
+        if self.echo:
+            heapq.heappush(self._out, (now, next(self._seq), data))
+        self._buffer += data
+        while b'\r' in self._buffer:
+            line, self._buffer = self._buffer.split(b'\r', 1)
+            command = line.decode(errors='ignore').strip()
+            if not command:
+                continue
+            reply_at = now + self.config['response_delay']
+            for reply in self.handle_command(command, now):
+                self._send_at(reply_at, reply)
+
+    # --- Vòng lặp ---
+    def _poll_power(self, now):
+        power = gpio_state.read_gpio(self.config['power_gpio'])
+        if power is None:
+            power = 1  # Line nguồn chưa được điều khiển: coi như modem luôn có nguồn
+        if power and not self.powered:
+            self._power_on(now)
+        elif not power and self.powered:
+            self._power_off()
+        if self.powered and self.booted_at is not None and now >= self.booted_at \
+                and not os.path.islink(self.at.link):
+            for port in self.ports.values():
+                port.publish()
+            ready_at = self.booted_at + self.config['ready_delay']
+            self._send_at(ready_at, 'RDY')
+            self._select_sim(ready_at)  # Module khởi động với CFUN=1: SIM được đọc ngay sau RDY
+
+    def _flush_due(self, now):
+        while self._out and self._out[0][0] <= now:
+            _, _, data = heapq.heappop(self._out)
+            try:
+                os.write(self.at.master, data)
+            except BlockingIOError:
+                logger.warning("SIM7600 %s: AT port overflow, dropped %d bytes", self.slot, len(data))
+
+    def _loop(self):
+        selector = selectors.DefaultSelector()
+        for port in self.ports.values():
+            selector.register(port.master, selectors.EVENT_READ, port)
+        while not self._stop.is_set():
+            now = time.monotonic()
+            self._poll_power(now)
+            timeout = 0.05
+            if self._out:
+                timeout = max(0.0, min(timeout, self._out[0][0] - now))
+            for key, _ in selector.select(timeout):
+                try:
+                    data = os.read(key.fd, 4096)
+                except (BlockingIOError, OSError):
+                    continue
+                if data and key.data is self.at:
+                    self._on_input(data, time.monotonic())
+            self._flush_due(time.monotonic())
+        selector.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name=f'sim7600-{self.slot}')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        for port in self.ports.values():
+            port.close()
+
+    def fixture_config(self):
+        """Giá trị ghi đè cho task_4_SIM7600 (fixtures.py) để dùng các cổng mô phỏng."""
+        return {
+            'SIM_SERIAL_PORTS': [port.link for port in self.ports.values()],
+            'SIM_AT_PORT': self.at.link,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SIM7600 AT-modem emulator on a pty")
+    parser.add_argument('--dir', default='/tmp/dcg-sim', help="Thư mục chứa symlink các cổng mô phỏng")
+    parser.add_argument('--slot', default='A')
+    parser.add_argument('--script', help="File JSON ghi đè các tuỳ chọn (delay, ccids, responses...)")
+    parser.add_argument('--ccid', action='append', help="CCID của SIM1, SIM2 (lặp lại tuỳ chọn)")
+    parser.add_argument('--boot-delay', type=float)
+    parser.add_argument('--fixture-out', help="Ghi file fixture (fixtures.py) dùng các cổng mô phỏng")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    options = {}
+    if args.script:
+        with open(args.script) as f:
+            options.update(json.load(f))
+    if args.ccid:
+        options['ccids'] = args.ccid
+    if args.boot_delay is not None:
+        options['boot_delay'] = args.boot_delay
+    modem = Sim7600Emulator(args.dir, args.slot, **options)
+    modem.start()
+    if args.fixture_out:
+        with open(args.fixture_out, 'w') as f:
+            json.dump({'slots': {args.slot: modem.fixture_config()}}, f, indent=4)
+        logger.info("Fixture file written: %s", args.fixture_out)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        modem.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+# station_log.py
+"""
+Hệ thống log chung cho server và các tiến trình task.
+
+- Server: mọi logger ghi vào một QueueHandler, một luồng nền (QueueListener) mới format và ghi
+  ra stderr/journal, nên code gọi log không phải chờ I/O.
+- Mỗi record được format đúng một lần; các handler (journal, console trên giao diện) dùng chung kết quả.
+- Tiến trình task (task_runner.py) không ghi log trực tiếp mà gửi record về server qua kênh kết quả;
+  server đưa record vào cùng hệ thống log này, kèm trường `task`.
+- Các trường có cấu trúc: task, step, port, baud. Dùng `extra={'port': ...}` hoặc `with context(baud=...)`.
+- Mức log chỉnh được lúc chạy cho từng logger (ví dụ "task_2_RS485"); tiến trình task mới nhận các
+  mức này qua biến môi trường DCG_LOG_LEVELS nên log DEBUG bị tắt không tốn chi phí ở cả hai phía.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+FIELDS = ('task', 'step', 'port', 'baud')
+LEVELS_ENV = 'DCG_LOG_LEVELS'
+
+_context = threading.local()
+_listener = None
+_formatter = None
+_levels = {}  # tên logger ('' = root) -> tên mức log đã đặt
+
+
+class ContextFilter(logging.Filter):
+    """Gắn các trường của context() hiện tại (theo luồng) vào record."""
+
+    def filter(self, record):
+        for key, value in getattr(_context, 'fields', {}).items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+@contextmanager
+def context(**fields):
+    """Gắn thêm trường có cấu trúc cho mọi log trong khối with, ví dụ: with context(baud=9600): ..."""
+    old = getattr(_context, 'fields', {})
+    _context.fields = {**old, **fields}
+    try:
+        yield
+    finally:
+        _context.fields = old
+
+
+class StructuredFormatter(logging.Formatter):
+    """Format "[HH:MM:SS] [nguồn] LEVEL: message (port=... baud=...)" và lưu kết quả vào record."""
+
+    def format(self, record):
+        cached = getattr(record, 'formatted', None)
+        if cached is not None:
+            return cached
+        source = getattr(record, 'task', None) or record.name
+        text = (f"[{time.strftime('%H:%M:%S', time.localtime(record.created))}] [{source}] "
+                f"{record.levelname}: {record.getMessage()}")
+        fields = ' '.join(f"{key}={getattr(record, key)}" for key in FIELDS[1:]
+                          if getattr(record, key, None) is not None)
+        if fields:
+            text += f" ({fields})"
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        record.formatted = text
+        return text
+
+
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Hàng đợi nằm trong cùng tiến trình: không format ở đây, listener format một lần
+        return record
+
+
+class CallbackHandler(logging.Handler):
+    """Chuyển dòng log đã format tới một hàm, ví dụ console trên giao diện."""
+
+    def __init__(self, callback, level=logging.NOTSET):
+        super().__init__(level)
+        self.callback = callback
+
+    def emit(self, record):
+        try:
+            self.callback(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def setup_logging(level='INFO', levels=None, stream=None):
+    """Cấu hình log cho server: root -> hàng đợi -> luồng nền -> stderr (journal)."""
+    global _listener, _formatter
+    _formatter = StructuredFormatter()
+    stream_handler = logging.StreamHandler(stream or sys.stderr)
+    stream_handler.setFormatter(_formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _InProcessQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+
+    if _listener is not None:
+        _listener.stop()
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    set_level('', level)
+    for name, logger_level in (levels or {}).items():
+        set_level(name, logger_level)
+
+
+def add_sink(callback, level='INFO', record_filter=None):
+    """Thêm một đích nhận log đã format (chạy trong luồng nền của listener)."""
+    handler = CallbackHandler(callback, logging.getLevelName(level))
+    handler.setFormatter(_formatter)
+    if record_filter is not None:
+        handler.addFilter(record_filter)
+    _listener.handlers = _listener.handlers + (handler,)
+    return handler
+
+
+def set_level(name, level):
+    """Đặt mức log cho một logger ('' hoặc 'root' = root logger)."""
+    name = '' if name == 'root' else name
+    level = str(level).upper()
+    if not isinstance(logging.getLevelName(level), int):
+        raise ValueError(f"Unknown log level '{level}'")
+    logging.getLogger(name or None).setLevel(level)
+    _levels[name] = level
+
+
+def get_levels():
+    return {name or 'root': level for name, level in _levels.items()}
+
+
+def child_env(env=None):
+    """Biến môi trường cho tiến trình task để nó dùng cùng các mức log với server."""
+    env = dict(os.environ if env is None else env)
+    env[LEVELS_ENV] = json.dumps(_levels)
+    return env
+
+
+def handle_remote_record(message, task_id):
+    """Đưa một record nhận từ tiến trình task vào hệ thống log của server."""
+    logger = logging.getLogger(message['name'])
+    if not logger.isEnabledFor(message['levelno']):
+        return
+    record = logging.makeLogRecord({
+        'name': message['name'],
+        'levelno': message['levelno'],
+        'levelname': logging.getLevelName(message['levelno']),
+        'msg': message['msg'],
+        'created': message['created'],
+        'task': task_id,
+        **message.get('fields', {}),
+    })
+    logger.handle(record)
+
+
+class ChannelHandler(logging.Handler):
+    """Dùng trong tiến trình task: gửi record (chưa format) về server qua kênh kết quả."""
+
+    def __init__(self, send):
+        super().__init__()
+        self.send = send
+        self.addFilter(ContextFilter())
+
+    def emit(self, record):
+        try:
+            fields = {key: getattr(record, key) for key in FIELDS[1:] if getattr(record, key, None) is not None}
+            msg = record.getMessage()
+            if record.exc_info:
+                msg += "\n" + logging.Formatter().formatException(record.exc_info)
+            self.send('log', name=record.name, levelno=record.levelno, msg=msg,
+                      created=record.created, fields=fields)
+        except Exception:
+            self.handleError(record)
+
+
+def setup_child_logging(send):
+    """Cấu hình log cho tiến trình task: mọi record được gửi về server, mức log lấy từ DCG_LOG_LEVELS."""
+    root = logging.getLogger()
+    root.handlers[:] = [ChannelHandler(send)]
+    root.setLevel(logging.INFO)
+    for name, level in json.loads(os.environ.get(LEVELS_ENV, '{}')).items():
+        logging.getLogger(name or None).setLevel(level)
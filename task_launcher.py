@@ -0,0 +1,200 @@
+# task_launcher.py
+import json
+import logging
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import fixtures
+import profiler
+import station_log
+
+logger = logging.getLogger(__name__)
+
+RUNNER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'task_runner.py')
+
+
+class TaskProcessError(Exception):
+    """Tiến trình chạy task bị lỗi hoặc kết thúc mà không trả về kết quả."""
+
+
+class TaskTimeout(TaskProcessError):
+    """Task chạy quá thời gian cho phép (toàn task hoặc một bước) và đã bị dừng."""
+
+
+class TaskCancelled(TaskProcessError):
+    """Task bị người dùng huỷ và đã dừng (sau khi chạy cleanup nếu kịp)."""
+
+
+class TaskLauncher:
+    """
+    Khởi động một tiến trình con mới (task_runner.py) cho mỗi lần chạy task, tối đa `max_workers`
+    tiến trình cùng lúc (semaphore, không phải pool tiến trình dùng lại). Mỗi lần chạy trả chi phí
+    khởi động Python và import module task, đổi lại tiến trình luôn sạch: biến cấp module của task
+    (global_message, SKIP_ITEMS, giá trị ghi đè của slot), cache GPIO và cổng serial không mang từ
+    lần chạy này sang lần khác, và huỷ/quá hạn chỉ cần kill cả nhóm tiến trình.
+
+    Một task bị treo (serial.read, stm32flash, subprocess không timeout...) chỉ làm treo tiến trình
+    con của nó: khi quá hạn hoặc bị huỷ, tiến trình nhận SIGTERM để tự dọn dẹp (cleanup), quá
+    `grace` giây thì cả nhóm tiến trình bị SIGKILL.
+    """
+
+    def __init__(self, max_workers=4, grace=10, runner=RUNNER_PATH, profile=False):
+        self.runner = runner
+        self.grace = grace
+        self.profile = profile  # Ghi dòng thời gian (span) các lệnh sleep/subprocess/serial của task
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._lock = threading.Lock()
+        self._procs = {}        # run_id -> Popen của các lần chạy đang chạy
+        self._cancelled = set() # run_id đã bị yêu cầu huỷ
+
+    def reserve(self, timeout=None):
+        """
+        Giữ chỗ một tiến trình trống trước khi chạy, trả về False nếu hết `timeout` giây mà chưa có.
+        Người gọi giữ chỗ trước khi khoá tài nguyên phần cứng (task chờ tiến trình không giữ khoá cổng
+        serial/GPIO), rồi gọi run(..., reserved=True) và trả chỗ bằng release().
+        """
+        return self._slots.acquire(timeout=timeout)
+
+    def release(self):
+        self._slots.release()
+
+    def run(self, task, details, on_detail=None, timeout=None, step_timeout=None, run_id=None, spans=None,
+            reserved=False):
+        """
+        Chạy task và trả về (status, message, details).
+
+        - details: list của người gọi, các hạng mục nhận được từ tiến trình con được thêm vào ngay.
+        - timeout: thời gian tối đa (giây) cho cả task.
+        - step_timeout: thời gian tối đa (giây) từ lúc bắt đầu tới hạng mục đầu tiên và giữa hai hạng mục
+          liên tiếp; chỉ dùng cho task gửi hạng mục trong lúc chạy (generator). None = chỉ giới hạn timeout.
+        - run_id: tên của lần chạy, dùng để huỷ bằng cancel(run_id).
+        - spans: list của người gọi, nhận các span của profiler khi launcher bật profile.
+        - reserved: người gọi đã giữ chỗ bằng reserve(), không chờ tiến trình trống nữa.
+        Raise TaskTimeout khi quá hạn, TaskCancelled khi bị huỷ, TaskProcessError khi task lỗi.
+        """
+        run_id = run_id or task['id']
+        try:
+            if reserved:
+                return self._run(task, details, on_detail, timeout, step_timeout, run_id, spans)
+            with self._slots:
+                return self._run(task, details, on_detail, timeout, step_timeout, run_id, spans)
+        finally:
+            with self._lock:
+                self._cancelled.discard(run_id)
+
+    def cancel(self, run_id):
+        """Yêu cầu dừng một lần chạy (kể cả khi nó còn đang chờ tiến trình trống)."""
+        with self._lock:
+            self._cancelled.add(run_id)
+            proc = self._procs.get(run_id)
+        if proc is not None:
+            self._signal(proc, signal.SIGTERM)
+
+    def _run(self, task, details, on_detail, timeout, step_timeout, run_id, spans):
+        env = station_log.child_env()
+        # Giá trị riêng của slot (cổng serial, GPIO...) được gán vào module task trong tiến trình con
+        env[fixtures.OVERRIDES_ENV] = json.dumps(task.get('overrides') or {})
+        if self.profile:
+            env[profiler.PROFILE_ENV] = '1'
+        with self._lock:
+            if run_id in self._cancelled:
+                raise TaskCancelled("Task cancelled before it started")
+            # start_new_session: task và các tiến trình nó gọi (stm32flash, gpioset...) cùng một nhóm
+            proc = subprocess.Popen([sys.executable, self.runner, task['path']],
+                                    stdout=subprocess.PIPE, start_new_session=True,
+                                    env=env)
+            self._procs[run_id] = proc
+        messages = queue.Queue()
+        reader = threading.Thread(target=self._read_messages, args=(proc.stdout, messages))
+        reader.daemon = True
+        reader.start()
+
+        started = time.monotonic()
+        deadline = started + timeout if timeout else None
+        step_deadline = started + step_timeout if step_timeout else None
+        kill_deadline = None  # đặt khi đã gửi SIGTERM (quá hạn hoặc bị huỷ)
+        stop_error = None
+        final = None
+        try:
+            while True:
+                if stop_error is None and run_id in self._cancelled:
+                    # cancel() đã gửi SIGTERM, chờ tiến trình dọn dẹp xong
+                    stop_error = TaskCancelled("Task cancelled by user")
+                    kill_deadline = time.monotonic() + self.grace
+                limits = [kill_deadline] if kill_deadline else [d for d in (deadline, step_deadline) if d]
+                wait = max(0.0, min(limits) - time.monotonic()) if limits else None
+                try:
+                    # Chờ từng đoạn ngắn để nhận ra yêu cầu huỷ kịp thời
+                    message = messages.get(timeout=min(wait, 0.5) if wait is not None else 0.5)
+                except queue.Empty:
+                    now = time.monotonic()
+                    if kill_deadline is not None:
+                        if now >= kill_deadline:
+                            self._signal(proc, signal.SIGKILL)
+                            break
+                    elif deadline is not None and now >= deadline:
+                        stop_error = TaskTimeout(f"Task timed out after {timeout}s")
+                    elif step_deadline is not None and now >= step_deadline:
+                        stop_error = TaskTimeout(f"Task step timed out: no progress for {step_timeout}s")
+                    if stop_error is not None and kill_deadline is None:
+                        self._signal(proc, signal.SIGTERM)
+                        kill_deadline = now + self.grace
+                    continue
+                if message is None:
+                    break  # Tiến trình con đã đóng stdout
+                if message['type'] == 'detail':
+                    details.append(message['detail'])
+                    if on_detail:
+                        on_detail(message['detail'])
+                    if step_timeout:
+                        step_deadline = time.monotonic() + step_timeout
+                elif message['type'] == 'spans':
+                    if spans is not None:
+                        spans.extend(message['spans'])
+                elif message['type'] == 'log':
+                    station_log.handle_remote_record(message, task['id'])
+                elif message['type'] in ('result', 'error', 'cancelled'):
+                    final = message
+        except BaseException:
+            self._signal(proc, signal.SIGKILL)
+            raise
+        finally:
+            proc.wait()
+            with self._lock:
+                self._procs.pop(run_id, None)
+
+        if final is not None:
+            details[:] = final['details']
+        if stop_error is not None:
+            raise stop_error
+        if final is None:
+            raise TaskProcessError(f"Task process exited with code {proc.returncode} without a result")
+        if final['type'] == 'cancelled':
+            raise TaskCancelled("Task cancelled")
+        if final['type'] == 'error':
+            raise TaskProcessError(final['message'])
+        return final['status'], final['message'], details
+
+    @staticmethod
+    def _read_messages(stream, messages):
+        try:
+            for line in stream:
+                try:
+                    messages.put(json.loads(line))
+                except ValueError:
+                    logger.warning("Invalid message from task process: %r", line)
+        finally:
+            messages.put(None)
+
+    @staticmethod
+    def _signal(proc, sig):
+        # Gửi tới cả nhóm tiến trình (task_runner và các lệnh con của nó)
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            pass
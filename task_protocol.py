@@ -0,0 +1,51 @@
+# task_protocol.py
+import inspect
+import time
+
+
+def summarize_details(details):
+    """Tính (status, message) tổng từ danh sách detail dict."""
+    num_pass = sum(1 for d in details if d.get("passed"))
+    num_fail = len(details) - num_pass
+    status = "Passed" if num_fail == 0 else "Failed"
+    return status, f"Summary: {num_pass} PASS, {num_fail} FAIL."
+
+
+def run_task_function(func, details, on_detail=None):
+    """
+    Chạy test_task và chuẩn hoá kết quả thành (status, message, details).
+
+    Hỗ trợ hai kiểu task:
+    - Hàm thường: trả về (status, message, details) khi chạy xong.
+    - Generator: yield từng detail dict ngay khi có kết quả. Giá trị return có thể là
+      (status, message), (status, message, details) hoặc None (status tính từ các detail đã yield).
+
+    Mỗi detail được yield sẽ được thêm ngay vào list `details` của người gọi rồi gọi on_detail(detail),
+    nên nếu task lỗi giữa chừng thì các detail đã nhận vẫn còn trong `details`.
+    Detail chưa có 'duration' được gán thời gian (giây) từ detail trước đó (hoặc từ lúc bắt đầu).
+    """
+    step_started = time.monotonic()
+    result = func()
+    if inspect.isgenerator(result):
+        try:
+            while True:
+                detail = next(result)
+                now = time.monotonic()
+                detail.setdefault('duration', round(now - step_started, 3))
+                step_started = now
+                details.append(detail)
+                if on_detail:
+                    on_detail(detail)
+        except StopIteration as stop:
+            result = stop.value
+
+    if result is None:
+        status, message = summarize_details(details)
+        return status, message, details
+    if len(result) == 2:
+        status, message = result
+        return status, message, details
+    status, message, returned_details = result
+    if returned_details is not details:
+        details[:] = returned_details
+    return status, message, details
@@ -0,0 +1,129 @@
+# task_registry.py
+import importlib.util
+import inspect
+import logging
+import os
+import threading
+
+from resources import normalize_resources
+from scheduler import normalize_prerequisites
+
+logger = logging.getLogger(__name__)
+
+
+def load_task_file(task_dir, filename, defaults):
+    """
+    Tải một file task và trả về dict mô tả task, hoặc None nếu file không hợp lệ.
+    defaults: giá trị mặc định {'timeout': ...} khi task không khai báo.
+    """
+    module_name = filename[:-3] # Cắt bỏ phần mở rộng .py để lấy tên module
+    logger.debug("loading module: %s", module_name)
+    try:
+        # Tạo một spec (đặc tả) để tải module từ đường dẫn file
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(task_dir, filename))
+        module = importlib.util.module_from_spec(spec)
+        # Tải và thực thi module
+        spec.loader.exec_module(module)
+    except Exception as e:
+        logger.error("Error when loading task %s: %s", filename, e)
+        return None
+
+    # Mỗi file task phải có một hàm tên là 'test_task'
+    if not hasattr(module, 'test_task'):
+        logger.warning("Task file '%s' there is no function 'test_task'.", filename)
+        return None
+    try:
+        resources = normalize_resources(getattr(module, 'RESOURCES', None))
+    except ValueError as e:
+        logger.warning("Task file '%s' has invalid RESOURCES, running it exclusively: %s", filename, e)
+        resources = None
+    try:
+        prerequisites = normalize_prerequisites(getattr(module, 'PREREQUISITES', None))
+    except ValueError as e:
+        logger.warning("Task file '%s' has invalid PREREQUISITES, ignoring them: %s", filename, e)
+        prerequisites = {}
+    return {
+        'id': module_name, # ID duy nhất cho task (ví dụ: task_example_gpio)
+        # Tên hiển thị trên giao diện (ví dụ: "Example Gpio")
+        'name': module_name.replace('task_', '').replace('_', ' ').title(),
+        # Mô tả từ module, hoặc mặc định
+        'description': getattr(module, 'DESCRIPTION', 'No description provided.'),
+        # Danh sách hạng mục kiểm tra (nếu module khai báo ITEMS)
+        'items': getattr(module, 'ITEMS', []),
+        # Tài nguyên phần cứng mà task sử dụng (None = chưa khai báo, chạy độc quyền)
+        'resources': resources,
+        # Hạng mục của task khác phải đạt trước khi chạy task này trong Auto Test: {id task: [hạng mục]}
+        'prerequisites': prerequisites,
+        # Đường dẫn file task, tiến trình con chạy task sẽ tải lại từ file này
+        'path': os.path.join(task_dir, filename),
+        # Giới hạn thời gian (giây) cho cả task và giữa hai hạng mục liên tiếp. STEP_TIMEOUT chỉ có nghĩa
+        # với task dạng generator; task không khai báo hoặc trả về kết quả một lần chỉ bị giới hạn bởi TIMEOUT
+        'timeout': getattr(module, 'TIMEOUT', defaults['timeout']),
+        'step_timeout': getattr(module, 'STEP_TIMEOUT', None) if inspect.isgeneratorfunction(module.test_task) else None,
+        # Task khai báo SKIP_ITEMS thì bỏ qua được các hạng mục đã đạt khi chạy lại hạng mục lỗi
+        'skippable': hasattr(module, 'SKIP_ITEMS'),
+        # Module đã tải, dùng để đọc giá trị gốc của các biến mà slot của jig ghi đè
+        'module': module,
+        'function': module.test_task # Tham chiếu đến hàm test_task
+    }
+
+
+class TaskRegistry:
+    """
+    Danh sách task được tải một lần khi khởi động (app.py tra cứu task theo slot, xem fixtures.bind_task).
+    refresh() chỉ tải lại các file task mới hoặc có mtime thay đổi, và bỏ các file đã bị xoá.
+    """
+
+    def __init__(self, task_dir, defaults):
+        self.task_dir = task_dir
+        self.defaults = defaults
+        self._lock = threading.Lock()
+        self._files = {}   # filename -> (mtime, task hoặc None nếu file lỗi)
+        self.tasks = []    # Danh sách task sắp xếp theo tên (dùng cho giao diện)
+
+    def _scan(self):
+        # Chỉ xử lý các file có tên bắt đầu bằng 'task_' và kết thúc bằng '.py'
+        found = {}
+        try:
+            with os.scandir(self.task_dir) as entries:
+                for entry in entries:
+                    if entry.name.startswith('task_') and entry.name.endswith('.py') and entry.is_file():
+                        found[entry.name] = entry.stat().st_mtime
+        except FileNotFoundError:
+            logger.error("Task folder '%s' not found. Please create it.", self.task_dir)
+        return found
+
+    def refresh(self):
+        """
+        Đồng bộ registry với thư mục task. Trả về (added, updated, removed): danh sách task
+        mới, task được tải lại và task đã bị xoá. Không thay đổi gì thì cả ba đều rỗng.
+        """
+        with self._lock:
+            found = self._scan()
+            added, updated, removed = [], [], []
+            files = dict(self._files)
+            for filename, mtime in found.items():
+                old = files.get(filename)
+                if old is not None and old[0] == mtime:
+                    continue
+                task = load_task_file(self.task_dir, filename, self.defaults)
+                files[filename] = (mtime, task)
+                if old is not None and old[1] is not None:
+                    if task is None:
+                        removed.append(old[1])
+                    else:
+                        updated.append(task)
+                elif task is not None:
+                    added.append(task)
+            for filename in set(files) - set(found):
+                _, task = files.pop(filename)
+                if task is not None:
+                    removed.append(task)
+
+            if added or updated or removed:
+                tasks = [task for _, task in files.values() if task is not None]
+                # Thay cả danh sách một lần để các luồng đọc luôn thấy trạng thái nhất quán;
+                # sắp xếp các task theo tên để hiển thị nhất quán trên giao diện
+                self.tasks = sorted(tasks, key=lambda x: x['name'])
+            self._files = files
+            return added, updated, removed
@@ -0,0 +1,122 @@
+# task_runner.py
+"""
+Tiến trình con chạy một task test, được task_launcher.TaskLauncher khởi động.
+
+Cách dùng: python task_runner.py <đường dẫn file task>
+
+Kết quả được gửi về server dưới dạng JSON, mỗi dòng một message, qua stdout gốc:
+    {"type": "detail", "detail": {...}}                        mỗi hạng mục (task dạng generator)
+    {"type": "result", "status": ..., "message": ..., "details": [...]}
+    {"type": "error", "message": ..., "traceback": ..., "details": [...]}
+    {"type": "cancelled", "details": [...]}                    khi bị huỷ / quá hạn (nhận SIGTERM)
+    {"type": "log", "name": ..., "levelno": ..., "msg": ..., ...} mỗi record log của task
+    {"type": "spans", "spans": [...]}                          dòng thời gian khi DCG_PROFILE=1
+Biến môi trường DCG_TASK_OVERRIDES (JSON) chứa các hằng số của module task được ghi đè cho slot
+của jig đang test (xem fixtures.py).
+Mọi thứ task in ra stdout được chuyển sang stderr để không lẫn với các message này.
+
+Khi nhận SIGTERM, TaskCancelled được raise ngay trong code của task (các khối finally của task
+vẫn chạy, ví dụ đóng cổng serial), sau đó hàm cleanup() của module task (nếu có) được gọi để
+đưa phần cứng về trạng thái an toàn. cleanup() cũng được gọi khi task bị lỗi.
+"""
+import importlib.util
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import traceback
+
+import fixtures
+import gpio
+import profiler
+import station_log
+
+from task_protocol import run_task_function
+
+
+class TaskCancelled(BaseException):
+    """Raise trong code của task khi tiến trình nhận SIGTERM (BaseException để không bị `except Exception` nuốt)."""
+
+
+def _on_sigterm(signum, frame):
+    # Chỉ huỷ một lần, tránh làm gián đoạn cleanup nếu nhận SIGTERM lần nữa
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    raise TaskCancelled()
+
+
+def run_cleanup(module):
+    cleanup = getattr(module, 'cleanup', None)
+    if cleanup is None:
+        return
+    try:
+        cleanup()
+    except Exception as e:
+        logging.getLogger(module.__name__).error("Task cleanup failed: %s", e)
+
+
+def load_task_module(task_path):
+    module_name = os.path.splitext(os.path.basename(task_path))[0]
+    spec = importlib.util.spec_from_file_location(module_name, task_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main(argv):
+    task_path = argv[1]
+
+    # Kênh riêng tới server là bản sao của stdout; stdout của task được chuyển sang stderr
+    channel = os.fdopen(os.dup(sys.stdout.fileno()), 'w', buffering=1)
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    send_lock = threading.Lock()
+
+    def send(message_type, **fields):
+        fields['type'] = message_type
+        with send_lock:
+            channel.write(json.dumps(fields, default=str) + "\n")
+            channel.flush()
+
+    # Log của task được gửi về server qua cùng kênh, server ghi journal và đẩy lên console
+    station_log.setup_child_logging(send)
+    # Dòng thời gian của các lệnh sleep, subprocess, serial, GPIO (xem profiler.py)
+    if os.environ.get(profiler.PROFILE_ENV) == '1':
+        profiler.install(send)
+
+    def finish(message_type, **fields):
+        # Số lần ghi GPIO thực sự / được bỏ qua vì không đổi giá trị (xem gpio.py)
+        gpio_stats = gpio.stats()
+        if gpio_stats:
+            logging.getLogger('gpio').info("GPIO writes: %d issued, %d skipped",
+                                           gpio_stats['writes_issued'], gpio_stats['writes_skipped'])
+        # Gửi nốt các span còn lại trước message kết thúc
+        profiler.flush()
+        send(message_type, **fields)
+
+    details = []
+    module = None
+    signal.signal(signal.SIGTERM, _on_sigterm)
+    try:
+        module = load_task_module(task_path)
+        fixtures.apply_overrides(module, json.loads(os.environ.get(fixtures.OVERRIDES_ENV, '{}')))
+        status, message, details = run_task_function(
+            module.test_task, details, lambda detail: send('detail', detail=detail))
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        finish('result', status=status, message=message, details=details)
+        return 0
+    except TaskCancelled:
+        run_cleanup(module)
+        finish('cancelled', details=details)
+        return 2
+    except Exception as e:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        run_cleanup(module)
+        finish('error', message=str(e), traceback=traceback.format_exc(), details=details)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
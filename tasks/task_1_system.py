@@ -4,10 +4,11 @@ import subprocess
 import json
 import re
 import logging
+import os
 import traceback
 
-# Cấu hình logging
-logging.basicConfig(level=logging.INFO)
+import toolpaths
+
 logger = logging.getLogger(__name__)
 
 try:
@@ -21,13 +22,22 @@ except ImportError as e:
 TASK_NAME = "System Information Test"
 DESCRIPTION = "System information and hardware checks"
 
+# Tài nguyên phần cứng mà task sử dụng (scheduler dùng để chạy song song các task không xung đột)
+RESOURCES = ["i2c:2"]
+
+# Cổng serial RS485/RS422 của board (slot của jig ghi đè giống task 2, 3)
+SERIAL_PORTS = [f"/dev/ttyACM{i}" for i in range(4)]
+
+# Giới hạn thời gian chạy (giây), quá hạn thì tiến trình task bị kill
+TIMEOUT = 60
+
 # Biến global để lưu thông điệp chi tiết
 global_message = []
 
 def check_lsusb():
     logger.info("Starting check_lsusb()")
     try:
-        output = subprocess.check_output(['/usr/bin/lsusb'], text=True)
+        output = subprocess.check_output([toolpaths.tool('lsusb')], text=True)
         devices = [
             line for line in output.strip().split('\n')
             if line.strip() and "Linux Foundation" not in line
@@ -67,8 +77,8 @@ def check_lsusb():
 def list_network_interfaces():
     logger.info("Starting list_network_interfaces()")
     try:
-        link_output = subprocess.check_output(['/sbin/ip', '-o', 'link'], text=True)
-        addr_output = subprocess.check_output(['/sbin/ip', '-o', '-4', 'addr'], text=True)
+        link_output = subprocess.check_output([toolpaths.tool('ip'), '-o', 'link'], text=True)
+        addr_output = subprocess.check_output([toolpaths.tool('ip'), '-o', '-4', 'addr'], text=True)
 
         interfaces = {}
         for line in link_output.strip().split('\n'):
@@ -123,7 +133,7 @@ def check_serial_ports():
         error_msg = "pyserial library not available"
         logger.error(error_msg)
         return {
-            "item": "Serial ports",
+            "item": "Serial ports (ttyACM0-3)",
             "result": "FAIL",
             "detail": error_msg,
             "passed": False
@@ -140,12 +150,13 @@ def check_serial_ports():
         ttyacm_ports = [port for port in all_ports if 'ttyACM' in port.device]
         logger.info(f"Found {len(ttyacm_ports)} ttyACM ports")
         
-        required_ports = [f"/dev/ttyACM{i}" for i in range(4)]
+        required_ports = list(SERIAL_PORTS)
         found_ports = []
         missing_ports = []
         
         for required_port in required_ports:
-            found = any(port.device == required_port for port in ttyacm_ports)
+            # comports() không liệt kê symlink (ví dụ cổng mô phỏng trong sim/), nên kiểm tra thêm file thiết bị
+            found = any(port.device == required_port for port in all_ports) or os.path.exists(required_port)
             if found:
                 found_ports.append(required_port)
                 logger.info(f"Found required port: {required_port}")
@@ -171,22 +182,22 @@ def check_serial_ports():
             for port in missing_ports:
                 detail_parts.append(f"- {port}")
         
-        detail_parts.append(f"Total ttyACM ports detected: {len(ttyacm_ports)}/4 required")
+        detail_parts.append(f"Total ttyACM ports detected: {len(ttyacm_ports)}/{len(required_ports)} required")
         
-        if len(ttyacm_ports) > 4:
+        if len(ttyacm_ports) > len(required_ports):
             detail_parts.append("Additional ttyACM ports found:")
             extra_ports = [p for p in ttyacm_ports if p.device not in required_ports]
             for port in extra_ports:
                 detail_parts.append(f"  {port.device} - {port.description}")
         
         detail = "\n".join(detail_parts)
-        all_found = len(found_ports) == 4
+        all_found = not missing_ports
         
         global global_message
         global_message.append(detail)
         
         logger.info(f"check_serial_ports completed: {'PASS' if all_found else 'FAIL'}")
-        logger.info(f"Found {len(found_ports)}/4 required ports")
+        logger.info(f"Found {len(found_ports)}/{len(required_ports)} required ports")
         
         return {
             "item": "Serial ports (ttyACM0-3)",
@@ -200,7 +211,7 @@ def check_serial_ports():
         logger.error(f"Exception type: {type(e).__name__}")
         logger.error(f"Traceback: {traceback.format_exc()}")
         return {
-            "item": "Serial ports",
+            "item": "Serial ports (ttyACM0-3)",
             "result": "FAIL",
             "detail": f"Error checking serial ports: {str(e)}",
             "passed": False
@@ -216,7 +227,7 @@ def run_task():
     # 1. Kiểm tra uname -a
     logger.info("Step 1: Checking system information")
     try:
-        output = subprocess.check_output(['/usr/bin/uname', '-a'], text=True).strip()
+        output = subprocess.check_output([toolpaths.tool('uname'), '-a'], text=True).strip()
         detail_results.append({
             "item": "System information",
             "result": "PASS",
@@ -236,7 +247,7 @@ def run_task():
     # 2. Kiểm tra số lượng phân vùng ổ đĩa
     logger.info("Step 2: Checking disk partitions")
     try:
-        output = subprocess.check_output(['/bin/df', '-h'], text=True)
+        output = subprocess.check_output([toolpaths.tool('df'), '-h'], text=True)
         lines = output.strip().split('\n')
         found_p1 = False
         found_p2 = False
@@ -292,7 +303,7 @@ def run_task():
         logger.error(f"Serial ports check crashed: {e}")
         logger.error(f"Traceback: {traceback.format_exc()}")
         detail_results.append({
-            "item": "Serial ports",
+            "item": "Serial ports (ttyACM0-3)",
             "result": "FAIL", 
             "detail": f"Function crashed: {str(e)}",
             "passed": False
@@ -301,7 +312,7 @@ def run_task():
     # 6. Kiểm tra I2C bus 2
     logger.info("Step 6: Checking I2C bus 2")
     try:
-        output = subprocess.check_output(['/usr/sbin/i2cdetect', '-y', '2'], text=True)
+        output = subprocess.check_output([toolpaths.tool('i2cdetect'), '-y', '2'], text=True)
         
         found_0x68 = False
         device_status = ""
@@ -341,7 +352,7 @@ def run_task():
     except Exception as e:
         logger.error(f"I2C bus 2 check failed: {e}")
         detail_results.append({
-            "item": "I2C bus 2",
+            "item": "I2C bus 2 (device 0x68)",
             "result": "FAIL",
             "detail": f"Error checking I2C bus 2: {str(e)}",
             "passed": False
@@ -1,16 +1,11 @@
 # tasks/task_example_gpio.py
 import time
-import subprocess
-import json
-import re
-import glob
 import os
-import serial
-import threading
 import logging
 
-# Cấu hình logging để xuất ra journalctl
-logging.basicConfig(level=logging.INFO)
+import gpio
+from serial_session import SerialSession, quiet_time, transfer_time
+
 logger = logging.getLogger(__name__)
 
 # Mô tả của task này, sẽ hiển thị trên giao diện người dùng
@@ -20,30 +15,58 @@ DESCRIPTION = "RS485 Communication Test"
 GPIO_MODE = [129, 135, 122, 127]
 SERIAL_PORTS = [f"/dev/ttyACM{i}" for i in range(4)]
 BAUD_RATES = [1200, 9600, 38400, 115200]
+
+# Tài nguyên phần cứng mà task sử dụng (scheduler dùng để chạy song song các task không xung đột)
+RESOURCES = [f"serial:{port}" for port in SERIAL_PORTS] + [f"gpio:{pin}" for pin in GPIO_MODE]
+
+# Auto Test chỉ chạy task này khi task System đã thấy đủ cổng serial, không thì đánh dấu Skipped
+PREREQUISITES = {"task_1_system": ["Serial ports (ttyACM0-3)"]}
+
+# Giới hạn thời gian chạy (giây): cả task, và mỗi baud rate (một hạng mục được gửi về sau mỗi baud)
+TIMEOUT = 180
+STEP_TIMEOUT = 60
+
 global_message = []
 
 TEST_DATA_LEN = 256  # Số byte test, dễ dàng thay đổi
+# Thời gian chờ transceiver chuyển mode (DE/RE) sau khi một GPIO mode thực sự đổi, giữ như trước (0.2 giây).
+# drain() chỉ xác nhận bộ đệm RX trống, không cho biết transceiver đã chuyển xong
+MODE_SETTLE_TIME = 0.2
 
-def set_gpio_mode(gpio_pin, mode):
+# Hạng mục đã đạt ở lần chạy trước, được bỏ qua khi chạy lại hạng mục lỗi (server đặt, xem app.rerun_plan)
+SKIP_ITEMS = []
+
+def should_run(item):
+    return item not in SKIP_ITEMS
+
+def pair_item(tx_port, rx_port, baud_rate):
+    """Tên hạng mục của một cặp TX/RX, giống nhau khi PASS và FAIL để chạy lại đúng cặp bị lỗi"""
+    return f"RS485 {tx_port} -> {rx_port} at {baud_rate} baud"
+
+def get_port_pairs():
+    """Các cặp kiểm tra chéo (TX, RX)"""
+    return [
+        (SERIAL_PORTS[0], SERIAL_PORTS[1]),
+        (SERIAL_PORTS[1], SERIAL_PORTS[0]),
+        (SERIAL_PORTS[2], SERIAL_PORTS[3]),
+        (SERIAL_PORTS[3], SERIAL_PORTS[2]),
+    ]
+
+def set_gpio_modes(modes):
     """
-    Ghi giá trị mode vào GPIO thực tế bằng gpioset.
+    Ghi mode cho nhiều GPIO trong một lần gọi (xem gpio.py): {gpio_pin: mode}
     mode: 0 (RS485), 1 (RS422)
+    Trả về (ok, error, changed): changed là số line thực sự đổi mode (line đã đúng mode không được ghi lại)
     """
-    GP_IOSET = "/usr/bin/gpioset"  # Đường dẫn tuyệt đối tới gpioset
-    chip_idx = gpio_pin // 32
-    line_idx = gpio_pin % 32
-    chip = f"gpiochip{chip_idx}"
-    line = str(line_idx)
-    try:
-        result = subprocess.run([GP_IOSET, chip, f"{line}={mode}"], capture_output=True, text=True)
-        if result.returncode != 0:
-            logger.error(f"gpioset error: {result.stderr}")
-            return False, result.stderr
+    changed = gpio.pending(modes)
+    ok, error = gpio.set_many(modes)
+    if not ok:
+        logger.error(f"GPIO setting failed: {error}")
+        return False, error, len(changed)
+    for gpio_pin, mode in changed.items():
+        chip, line = gpio.chip_line(gpio_pin)
         logger.info(f"GPIO {gpio_pin} ({chip} line {line}) set to {mode} (0=RS485, 1=RS422)")
-        return True, ""
-    except Exception as e:
-        logger.error(f"GPIO setting failed: {e}")
-        return False, str(e)
+    return True, "", len(changed)
 
 def check_serial_ports_exist():
     """Check if all required serial ports exist"""
@@ -76,23 +99,30 @@ def check_serial_ports_exist():
         }
 
 def calc_baud_delay(byte_count, baudrate):
-    return byte_count * 10 / baudrate + 0.1
+    """Thời gian chờ nhận tối đa: thời gian truyền + 0.1 giây dự phòng (nhận đủ byte thì trả về sớm hơn)"""
+    return transfer_time(byte_count, baudrate) + 0.1
 
-def test_rs485_at_baud(baud_rate):
-    """Test RS485 communication at specific baud rate"""
-    logger.info(f"Starting RS485 test at {baud_rate} baud")
+def test_rs485_at_baud(baud_rate, port_pairs=None, session=None):
+    """
+    Test RS485 communication at specific baud rate (port_pairs: các cặp cần test, mặc định tất cả).
+    session: SerialSession giữ các cổng mở qua nhiều baud rate; None thì mở và đóng cổng trong hàm này.
+    """
+    port_pairs = port_pairs or get_port_pairs()
+    logger.info(f"Starting RS485 test at {baud_rate} baud", extra={"baud": baud_rate})
     results = []
-    serial_connections = {}
+    own_session = session is None
+    if own_session:
+        session = SerialSession(SERIAL_PORTS, timeout=1)
     try:
-        logger.info("Opening serial ports...")
-        for port in SERIAL_PORTS:
-            logger.info(f"Opening {port} at {baud_rate} baud")
-            ser = serial.Serial(port, baud_rate, timeout=1)
-            serial_connections[port] = ser
-            time.sleep(0.1)
-        logger.info("All serial ports opened successfully")
+        logger.info(f"Setting serial ports to {baud_rate} baud...")
+        # Đọc trả về ngay khi đủ byte; quá hạn nếu hết thời gian truyền dự tính hoặc dữ liệu ngừng giữa chừng
+        serial_connections = session.configure(baud_rate, timeout=calc_baud_delay(TEST_DATA_LEN, baud_rate),
+                                               inter_byte_timeout=quiet_time(baud_rate, minimum=0.05))
+        logger.info("All serial ports ready")
     except Exception as e:
         logger.error(f"Failed to open serial ports: {e}")
+        if own_session:
+            session.close()
         return [{
             "item": f"Open serial ports at {baud_rate} baud",
             "result": "FAIL",
@@ -101,29 +131,18 @@ def test_rs485_at_baud(baud_rate):
         }]
     
     try:
-        baud_delay = calc_baud_delay(TEST_DATA_LEN, baud_rate)
-
         # Set all GPIO modes to 0 (RS485 mode)
         logger.info("Setting GPIO modes to RS485...")
-        for i, gpio_pin in enumerate(GPIO_MODE):
-            set_gpio_mode(gpio_pin, 0)
-
-        # Clear all serial buffers
-        for ser in serial_connections.values():
-            ser.reset_input_buffer()
-            ser.reset_output_buffer()
-        time.sleep(0.2)
-
-        # Định nghĩa các cặp kiểm tra chéo
-        port_pairs = [
-            (SERIAL_PORTS[0], SERIAL_PORTS[1]),
-            (SERIAL_PORTS[1], SERIAL_PORTS[0]),
-            (SERIAL_PORTS[2], SERIAL_PORTS[3]),
-            (SERIAL_PORTS[3], SERIAL_PORTS[2]),
-        ]
+        _, _, changed = set_gpio_modes({gpio_pin: 0 for gpio_pin in GPIO_MODE})
+        if changed:
+            time.sleep(MODE_SETTLE_TIME)
+
+        # Xả bộ đệm sau khi đổi baud / mode (chờ tới khi đường truyền im lặng)
+        session.drain(quiet_time(baud_rate))
 
         for tx_port, rx_port in port_pairs:
-            logger.info(f"Testing TX {tx_port} -> RX {rx_port}")
+            logger.info(f"Testing TX {tx_port} -> RX {rx_port}", extra={"port": rx_port, "baud": baud_rate})
+            pair_started = time.monotonic()
 
             # Tạo test data dài TEST_DATA_LEN bytes
             base_msg = f"TEST_RS485_{tx_port}_to_{rx_port}_{baud_rate}_"
@@ -138,24 +157,20 @@ def test_rs485_at_baud(baud_rate):
             elif len(test_data) < TEST_DATA_LEN:
                 test_data = test_data + b'X' * (TEST_DATA_LEN - len(test_data))
 
-            # Clear buffers trước khi test
-            for ser in serial_connections.values():
-                ser.reset_input_buffer()
-                ser.reset_output_buffer()
-            time.sleep(0.2)
+            # Xả bộ đệm trước khi test: chờ tới khi không cổng nào còn nhận dữ liệu
+            session.drain(quiet_time(baud_rate))
 
             # Gửi dữ liệu từ TX
             serial_connections[tx_port].write(test_data)
             serial_connections[tx_port].flush()
-            time.sleep(baud_delay)
 
             # Chỉ kiểm tra data ở RX tương ứng
             try:
-                data = serial_connections[rx_port].read_all()
-                logger.info(f"Port {rx_port} received: {len(data)} bytes")
+                data = session.read_exact(rx_port, len(test_data))
+                logger.info(f"Port {rx_port} received: {len(data)} bytes", extra={"port": rx_port, "baud": baud_rate})
                 if data == test_data:
                     results.append({
-                        "item": f"@{baud_rate}:{tx_port}->{rx_port})",
+                        "item": pair_item(tx_port, rx_port, baud_rate),
                         "result": "PASS",
                         "detail": f"✓{TEST_DATA_LEN}-byte data successfully received",
                         "passed": True
@@ -183,40 +198,35 @@ def test_rs485_at_baud(baud_rate):
                             f"Diff bytes: {diff_count}/{len(test_data)} ({diff_percent}%)"
                         )
                     results.append({
-                        "item": f"RS485 {tx_port} -> {rx_port} at {baud_rate} baud ({TEST_DATA_LEN} bytes)",
+                        "item": pair_item(tx_port, rx_port, baud_rate),
                         "result": "FAIL",
                         "detail": detail_msg,
                         "passed": False
                     })
                     logger.warning(f"✗ {tx_port} -> {rx_port} received wrong data at byte {diff_index}, diff {diff_percent}%")
             except Exception as e:
+                detail_msg = f"[RS485 RX EXCEPTION] TX:{tx_port}, RX:{rx_port}, baud:{baud_rate}: {str(e)}"
                 results.append({
-                    "item": f"RS485 {tx_port} -> {rx_port} at {baud_rate} baud ({TEST_DATA_LEN} bytes)",
+                    "item": pair_item(tx_port, rx_port, baud_rate),
                     "result": "FAIL",
                     "detail": detail_msg,
                     "passed": False
                 })
                 logger.error(detail_msg)
 
-            # Clear buffers sau mỗi test
-            for ser in serial_connections.values():
-                ser.reset_input_buffer()
-                ser.reset_output_buffer()
-            time.sleep(0.2)
+            # Thời gian của bước (một cặp TX/RX), server dùng cho metric thời gian từng bước
+            results[-1]["duration"] = round(time.monotonic() - pair_started, 3)
 
     finally:
-        logger.info("Closing serial connections...")
-        for port, ser in serial_connections.items():
-            try:
-                ser.close()
-                logger.info(f"Closed {port}")
-            except Exception as e:
-                logger.error(f"Error closing {port}: {e}")
+        if own_session:
+            logger.info("Closing serial connections...")
+            session.close()
 
     logger.info(f"Completed RS485 test at {baud_rate} baud")
     return results
 
 def test_task():
+    """Generator: yield kết quả của từng baud rate ngay khi test xong baud đó"""
     logger.info("=== Starting RS485 Communication Test ===")
     detail_results = []
     global global_message
@@ -227,34 +237,42 @@ def test_task():
         logger.info("Step 1: Checking serial ports existence")
         port_check = check_serial_ports_exist()
         detail_results.append(port_check)
+        yield port_check
         
         if not port_check["passed"]:
             # If ports don't exist, return early
             logger.error("Serial ports check failed, aborting test")
             status = "Failed"
-            message = port_check["detail"] + f"\nSummary: 0 PASS, 1 FAIL."
+            message = port_check["detail"] + "\nSummary: 0 PASS, 1 FAIL."
             return status, message, detail_results
         
         # Test RS485 communication for each baud rate
         logger.info("Step 2: Testing RS485 communication at different baud rates")
-        for baud_index, baud_rate in enumerate(BAUD_RATES):
-            # Delay giữa các baud rate tests
-            if baud_index > 0:
-                logger.info(f"Waiting before testing baud rate {baud_rate}...")
-                time.sleep(0.2)  # Delay .2 giây giữa các baud rate
-            
-            logger.info(f"Testing at {baud_rate} baud...")
-            global_message.append(f"--- Testing at {baud_rate} baud ---")
+        # Các cổng được mở một lần cho mọi baud rate, mỗi baud chỉ đổi thông số (xem serial_session.py)
+        with SerialSession(SERIAL_PORTS, timeout=1) as session:
+            for baud_rate in BAUD_RATES:
+                # Chạy lại hạng mục lỗi: bỏ qua baud mà mọi cặp đều đã đạt ở lần trước
+                port_pairs = [pair for pair in get_port_pairs() if should_run(pair_item(*pair, baud_rate))]
+                if not port_pairs:
+                    logger.info(f"Baud {baud_rate}: all pairs passed in the previous run, skipped")
+                    continue
+
+                logger.info(f"Testing at {baud_rate} baud...")
+                global_message.append(f"--- Testing at {baud_rate} baud ---")
             
-            baud_results = test_rs485_at_baud(baud_rate)
-            detail_results.extend(baud_results)
+                baud_results = test_rs485_at_baud(baud_rate, port_pairs, session)
+                detail_results.extend(baud_results)
+                yield from baud_results
             
-            # Count pass/fail for this baud rate
-            baud_pass = sum(1 for r in baud_results if r["passed"])
-            baud_total = len(baud_results)
-            logger.info(f"Baud {baud_rate}: {baud_pass}/{baud_total} tests passed")
-            global_message.append(f"Baud {baud_rate}: {baud_pass}/{baud_total} tests passed")
+                # Count pass/fail for this baud rate
+                baud_pass = sum(1 for r in baud_results if r["passed"])
+                baud_total = len(baud_results)
+                logger.info(f"Baud {baud_rate}: {baud_pass}/{baud_total} tests passed")
+                global_message.append(f"Baud {baud_rate}: {baud_pass}/{baud_total} tests passed")
         
+        logger.info(session.summary())
+        global_message.append(session.summary())
+
         # Tổng kết
         num_pass = sum(1 for r in detail_results if r["passed"])
         num_fail = len(detail_results) - num_pass
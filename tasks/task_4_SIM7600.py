@@ -6,7 +6,9 @@ import logging
 import glob
 import serial.tools.list_ports
 
-logging.basicConfig(level=logging.INFO)
+import gpio
+import toolpaths
+
 logger = logging.getLogger(__name__)
 
 DESCRIPTION = "SIM7602 Module Test"
@@ -19,22 +21,39 @@ GPIO_SIMSEL = 144
 SIM_SERIAL_PORTS = [f"/dev/ttyUSB{i}" for i in range(3)]
 SIM_AT_PORT = "/dev/ttyUSB1"
 
-def set_gpio(gpio_pin, value):
-    GP_IOSET = "/usr/bin/gpioset"
-    chip_idx = gpio_pin // 32
-    line_idx = gpio_pin % 32
-    chip = f"gpiochip{chip_idx}"
-    line = str(line_idx)
-    try:
-        result = subprocess.run([GP_IOSET, chip, f"{line}={value}"], capture_output=True, text=True)
-        if result.returncode != 0:
-            logger.error(f"gpioset error: {result.stderr}")
-            return False, result.stderr
-        logger.info(f"GPIO {gpio_pin} ({chip} line {line}) set to {value}")
-        return True, ""
-    except Exception as e:
-        logger.error(f"GPIO setting failed: {e}")
-        return False, str(e)
+# Hạng mục đã đạt ở lần chạy trước, được bỏ qua khi chạy lại hạng mục lỗi (server đặt, xem app.rerun_plan)
+SKIP_ITEMS = []
+COMPARE_ITEM = "Compare CCID SIM1 vs SIM2"
+
+# Tài nguyên phần cứng mà task sử dụng (scheduler dùng để chạy song song các task không xung đột)
+RESOURCES = [f"serial:{port}" for port in SIM_SERIAL_PORTS] + [
+    f"gpio:{GPIO_POWER}",
+    f"gpio:{GPIO_SIMSEL}",
+    "module:option",
+    "sysfs:/sys/bus/usb-serial/drivers/option1/new_id",
+]
+
+# Giới hạn thời gian chạy (giây): cả task, và giữa hai hạng mục (chờ cổng ttyUSB tối đa 20 giây)
+TIMEOUT = 150
+STEP_TIMEOUT = 60
+
+def set_gpio(gpio_pin, value, force=False):
+    """force=True: ghi cả khi line đã có giá trị này (gpio.py bỏ qua lần ghi không đổi giá trị)"""
+    ok, error = gpio.set_value(gpio_pin, value, force)
+    if not ok:
+        logger.error(f"GPIO setting failed: {error}")
+        return False, error
+    chip, line = gpio.chip_line(gpio_pin)
+    logger.info(f"GPIO {gpio_pin} ({chip} line {line}) set to {value}")
+    return True, ""
+
+def should_run(item):
+    return item not in SKIP_ITEMS
+
+def add_detail(detail_results, detail):
+    """Lưu detail vào danh sách kết quả và trả lại để test_task yield ngay cho server"""
+    detail_results.append(detail)
+    return detail
 
 def check_sim_ports_exist():
     logger.info("Checking SIM7602 serial ports with glob...")
@@ -118,6 +137,7 @@ def wait_for_ports(ports, timeout=20, interval=0.2):
     return False
 
 def test_task():
+    """Generator: yield từng hạng mục ngay khi có kết quả (module khởi động mất ~20 giây)"""
     logger.info("=== Starting SIM7602 Module Test ===")
     detail_results = []
 
@@ -126,7 +146,7 @@ def test_task():
     logger.info("Power ON SIM7602 module")
     time.sleep(2)  # Đợi module khởi động   
     try:
-        subprocess.run(["/usr/sbin/modprobe", "option"], check=True)
+        subprocess.run([toolpaths.tool("modprobe"), "option"], check=True)
         with open("/sys/bus/usb-serial/drivers/option1/new_id", "w") as f:
             f.write("1286 4e3c\n")
         logger.info("modprobe option & new_id OK")
@@ -136,7 +156,7 @@ def test_task():
     if not wait_for_ports(SIM_SERIAL_PORTS, timeout=20, interval=0.2):
         detail = "Timeout waiting for SIM7602 ports"
         logger.error(detail)
-        detail_results.append({
+        yield add_detail(detail_results, {
             "item": "Module startup",
             "result": "FAIL",
             "detail": detail,
@@ -144,183 +164,189 @@ def test_task():
         })
         set_gpio(GPIO_POWER, 0)
         return "Failed", detail, detail_results
-    detail_results.append({
+    yield add_detail(detail_results, {
         "item": "Module startup",
         "result": "PASS",
         "detail": "SIM7602 ports detected",
         "passed": True
     })
 
-    # 2. Kiểm tra SIM1
-    sim1_ok, msgSIM1 = set_gpio(GPIO_SIMSEL, 0)
-    logger.info("Select SIM1")
-    time.sleep(0.5)
+    # Chạy lại hạng mục lỗi: so sánh CCID cần CCID của cả hai SIM nên chạy lại cả hai khi nó chưa đạt
+    compare_needed = should_run(COMPARE_ITEM)
     ccid1 = ""
-    try:
-        ser = serial.Serial(SIM_AT_PORT, 115200, timeout=2)
+    ccid2 = ""
+
+    # 2. Kiểm tra SIM1
+    if compare_needed or should_run("SIM1 AT+CPIN?") or should_run("SIM1 CCID"):
+        sim1_ok, msgSIM1 = set_gpio(GPIO_SIMSEL, 0)
+        logger.info("Select SIM1")
         time.sleep(0.5)
-        # Gửi at+cfun=0
-        ser.write(b"AT+CFUN=0\r")
-        ser.flush()
-        time.sleep(1)
-        ser.read_all()
-        # Gửi AT+CGEREP=0,0
-        ser.write(b"AT+CGEREP=0,0\r")
-        ser.flush()
-        time.sleep(1)
-        ser.read_all()
-        # Chuyển sang SIM1 (đã set GPIO ở trên)
-        # Gửi at+cfun=1
-        ser.write(b"AT+CFUN=1\r")
-        ser.flush()
-        time.sleep(5)
-        ser.read_all()
-        # Kiểm tra AT+CPIN?
-        ser.write(b"AT+CPIN?\r")
-        ser.flush()
-        time.sleep(1)
-        response = ser.read_all().decode(errors="ignore")
-        logger.info(f"SIM1 AT+CPIN? Response: {response.strip()}")
-        if "READY" in response or "CPIN: READY" in response:
-            detail_results.append({
-                "item": "SIM1 AT+CPIN?",
-                "result": "PASS",
-                "detail": response.strip(),
-                "passed": True
-            })
-        else:
-            detail_results.append({
-                "item": "SIM1 AT+CPIN?",
-                "result": "FAIL",
-                "detail": response.strip(),
-                "passed": False
-            })
-        # Đọc CCID SIM1
-        ser.write(b"AT+CICCID\r")
-        ser.flush()
-        time.sleep(1)
-        response = ser.read_all().decode(errors="ignore")
-        logger.info(f"SIM1 AT+CICCID Response: {response.strip()}")
-        for line in response.splitlines():
-            if "+ICCID:" in line or "ICCID:" in line:
-                ccid1 = line.strip().split(":")[-1].strip()
-        if ccid1:
-            detail_results.append({
-                "item": "SIM1 CCID",
-                "result": "PASS",
-                "detail": ccid1,
-                "passed": True
-            })
-        else:
-            detail_results.append({
-                "item": "SIM1 CCID",
+        try:
+            ser = serial.Serial(SIM_AT_PORT, 115200, timeout=2)
+            time.sleep(0.5)
+            # Gửi at+cfun=0
+            ser.write(b"AT+CFUN=0\r")
+            ser.flush()
+            time.sleep(1)
+            ser.read_all()
+            # Gửi AT+CGEREP=0,0
+            ser.write(b"AT+CGEREP=0,0\r")
+            ser.flush()
+            time.sleep(1)
+            ser.read_all()
+            # Chuyển sang SIM1 (đã set GPIO ở trên)
+            # Gửi at+cfun=1
+            ser.write(b"AT+CFUN=1\r")
+            ser.flush()
+            time.sleep(5)
+            ser.read_all()
+            # Kiểm tra AT+CPIN?
+            ser.write(b"AT+CPIN?\r")
+            ser.flush()
+            time.sleep(1)
+            response = ser.read_all().decode(errors="ignore")
+            logger.info(f"SIM1 AT+CPIN? Response: {response.strip()}")
+            if "READY" in response or "CPIN: READY" in response:
+                yield add_detail(detail_results, {
+                    "item": "SIM1 AT+CPIN?",
+                    "result": "PASS",
+                    "detail": response.strip(),
+                    "passed": True
+                })
+            else:
+                yield add_detail(detail_results, {
+                    "item": "SIM1 AT+CPIN?",
+                    "result": "FAIL",
+                    "detail": response.strip(),
+                    "passed": False
+                })
+            # Đọc CCID SIM1
+            ser.write(b"AT+CICCID\r")
+            ser.flush()
+            time.sleep(1)
+            response = ser.read_all().decode(errors="ignore")
+            logger.info(f"SIM1 AT+CICCID Response: {response.strip()}")
+            for line in response.splitlines():
+                if "+ICCID:" in line or "ICCID:" in line:
+                    ccid1 = line.strip().split(":")[-1].strip()
+            if ccid1:
+                yield add_detail(detail_results, {
+                    "item": "SIM1 CCID",
+                    "result": "PASS",
+                    "detail": ccid1,
+                    "passed": True
+                })
+            else:
+                yield add_detail(detail_results, {
+                    "item": "SIM1 CCID",
+                    "result": "FAIL",
+                    "detail": response.strip(),
+                    "passed": False
+                })
+            ser.close()
+        except Exception as e:
+            logger.error(f"SIM1 test error: {e}")
+            yield add_detail(detail_results, {
+                "item": "SIM1 test",
                 "result": "FAIL",
-                "detail": response.strip(),
+                "detail": str(e),
                 "passed": False
             })
-        ser.close()
-    except Exception as e:
-        logger.error(f"SIM1 test error: {e}")
-        detail_results.append({
-            "item": "SIM1 test",
-            "result": "FAIL",
-            "detail": str(e),
-            "passed": False
-        })
 
     # 3. Kiểm tra SIM2
-    sim2_ok, msgSIM2 = set_gpio(GPIO_SIMSEL, 1)
-    logger.info("Select SIM2")
-    time.sleep(0.5)
-    ccid2 = ""
-    try:
-        ser = serial.Serial(SIM_AT_PORT, 115200, timeout=2)
+    if compare_needed or should_run("SIM2 AT+CPIN?") or should_run("SIM2 CCID"):
+        sim2_ok, msgSIM2 = set_gpio(GPIO_SIMSEL, 1)
+        logger.info("Select SIM2")
         time.sleep(0.5)
-        # Gửi at+cfun=0
-        ser.write(b"AT+CFUN=0\r")
-        ser.flush()
-        time.sleep(1)
-        ser.read_all()
-        # Gửi AT+CGEREP=0,0
-        ser.write(b"AT+CGEREP=0,0\r")
-        ser.flush()
-        time.sleep(1)
-        ser.read_all()
-        # Chuyển sang SIM2 (đã set GPIO ở trên)
-        time.sleep(0.5)
-        # Gửi at+cfun=1
-        ser.write(b"AT+CFUN=1\r")
-        ser.flush()
-        time.sleep(5)
-        ser.read_all()
-        # Kiểm tra AT+CPIN?
-        ser.write(b"AT+CPIN?\r")
-        ser.flush()
-        time.sleep(1)
-        response = ser.read_all().decode(errors="ignore")
-        logger.info(f"SIM2 AT+CPIN? Response: {response.strip()}")
-        if "READY" in response or "CPIN: READY" in response:
-            detail_results.append({
-                "item": "SIM2 AT+CPIN?",
-                "result": "PASS",
-                "detail": response.strip(),
-                "passed": True
-            })
-        else:
-            detail_results.append({
-                "item": "SIM2 AT+CPIN?",
+        try:
+            ser = serial.Serial(SIM_AT_PORT, 115200, timeout=2)
+            time.sleep(0.5)
+            # Gửi at+cfun=0
+            ser.write(b"AT+CFUN=0\r")
+            ser.flush()
+            time.sleep(1)
+            ser.read_all()
+            # Gửi AT+CGEREP=0,0
+            ser.write(b"AT+CGEREP=0,0\r")
+            ser.flush()
+            time.sleep(1)
+            ser.read_all()
+            # Chuyển sang SIM2 (đã set GPIO ở trên)
+            time.sleep(0.5)
+            # Gửi at+cfun=1
+            ser.write(b"AT+CFUN=1\r")
+            ser.flush()
+            time.sleep(5)
+            ser.read_all()
+            # Kiểm tra AT+CPIN?
+            ser.write(b"AT+CPIN?\r")
+            ser.flush()
+            time.sleep(1)
+            response = ser.read_all().decode(errors="ignore")
+            logger.info(f"SIM2 AT+CPIN? Response: {response.strip()}")
+            if "READY" in response or "CPIN: READY" in response:
+                yield add_detail(detail_results, {
+                    "item": "SIM2 AT+CPIN?",
+                    "result": "PASS",
+                    "detail": response.strip(),
+                    "passed": True
+                })
+            else:
+                yield add_detail(detail_results, {
+                    "item": "SIM2 AT+CPIN?",
+                    "result": "FAIL",
+                    "detail": response.strip(),
+                    "passed": False
+                })
+            # Đọc CCID SIM2
+            ser.write(b"AT+CICCID\r")
+            ser.flush()
+            time.sleep(1)
+            response = ser.read_all().decode(errors="ignore")
+            logger.info(f"SIM2 AT+CICCID Response: {response.strip()}")
+            for line in response.splitlines():
+                if "+ICCID:" in line or "ICCID:" in line:
+                    ccid2 = line.strip().split(":")[-1].strip()
+            if ccid2:
+                yield add_detail(detail_results, {
+                    "item": "SIM2 CCID",
+                    "result": "PASS",
+                    "detail": ccid2,
+                    "passed": True
+                })
+            else:
+                yield add_detail(detail_results, {
+                    "item": "SIM2 CCID",
+                    "result": "FAIL",
+                    "detail": response.strip(),
+                    "passed": False
+                })
+            ser.close()
+        except Exception as e:
+            logger.error(f"SIM2 test error: {e}")
+            yield add_detail(detail_results, {
+                "item": "SIM2 test",
                 "result": "FAIL",
-                "detail": response.strip(),
+                "detail": str(e),
                 "passed": False
             })
-        # Đọc CCID SIM2
-        ser.write(b"AT+CICCID\r")
-        ser.flush()
-        time.sleep(1)
-        response = ser.read_all().decode(errors="ignore")
-        logger.info(f"SIM2 AT+CICCID Response: {response.strip()}")
-        for line in response.splitlines():
-            if "+ICCID:" in line or "ICCID:" in line:
-                ccid2 = line.strip().split(":")[-1].strip()
-        if ccid2:
-            detail_results.append({
-                "item": "SIM2 CCID",
+
+    # 4. So sánh CCID
+    if compare_needed:
+        if ccid1 and ccid2 and ccid1 != ccid2:
+            yield add_detail(detail_results, {
+                "item": COMPARE_ITEM,
                 "result": "PASS",
-                "detail": ccid2,
+                "detail": f"SIM1 CCID: {ccid1}\nSIM2 CCID: {ccid2}",
                 "passed": True
             })
         else:
-            detail_results.append({
-                "item": "SIM2 CCID",
+            yield add_detail(detail_results, {
+                "item": COMPARE_ITEM,
                 "result": "FAIL",
-                "detail": response.strip(),
+                "detail": f"SIM1 CCID: {ccid1}\nSIM2 CCID: {ccid2}\nCCID not switched or missing.",
                 "passed": False
             })
-        ser.close()
-    except Exception as e:
-        logger.error(f"SIM2 test error: {e}")
-        detail_results.append({
-            "item": "SIM2 test",
-            "result": "FAIL",
-            "detail": str(e),
-            "passed": False
-        })
-
-    # 4. So sánh CCID
-    if ccid1 and ccid2 and ccid1 != ccid2:
-        detail_results.append({
-            "item": "Switch SIM1 to SIM2",
-            "result": "PASS",
-            "detail": f"SIM1 CCID: {ccid1}\nSIM2 CCID: {ccid2}",
-            "passed": True
-        })
-    else:
-        detail_results.append({
-            "item": "Compare CCID SIM1 vs SIM2",
-            "result": "FAIL",
-            "detail": f"SIM1 CCID: {ccid1}\nSIM2 CCID: {ccid2}\nCCID not switched or missing.",
-            "passed": False
-        })
 
     # 5. Trả các GPIO về giá trị ban đầu
     set_gpio(GPIO_POWER, 0)
@@ -333,4 +359,10 @@ def test_task():
     message = f"SIM7602 Test: {num_pass} PASS, {num_fail} FAIL."
     logger.info(f"=== SIM7602 Test Completed: {status} ===")
     logger.info(f"Summary: {num_pass} PASS, {num_fail} FAIL")
-    return status, message, detail_results
\ No newline at end of file
+    return status, message, detail_results
+
+def cleanup():
+    """Được gọi khi task bị huỷ hoặc lỗi giữa chừng: tắt nguồn module và trả SIMSEL về SIM1"""
+    logger.info("Cleanup: power OFF SIM7602 module")
+    set_gpio(GPIO_POWER, 0, force=True)
+    set_gpio(GPIO_SIMSEL, 0, force=True)
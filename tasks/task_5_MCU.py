@@ -5,29 +5,20 @@ import os
 import re
 import glob
 
-logging.basicConfig(level=logging.INFO)
+import toolpaths
+
 logger = logging.getLogger(__name__)
 
 DESCRIPTION = "MCU Test"
 
-CO_MCU_SERIAL = "/dev/ttyS1"  # Replace with actual port if needed
+CO_MCU_FLASH_PORT = "/dev/ttyS3"  # UART nạp firmware cho co-MCU (stm32flash)
+PWM_CHIP = "/sys/class/pwm/pwmchip1"
 
-def set_gpio(gpio_pin, value):
-    GP_IOSET = "/usr/bin/gpioset"
-    chip_idx = gpio_pin // 32
-    line_idx = gpio_pin % 32
-    chip = f"gpiochip{chip_idx}"
-    line = str(line_idx)
-    try:
-        result = subprocess.run([GP_IOSET, chip, f"{line}={value}"], capture_output=True, text=True)
-        if result.returncode != 0:
-            logger.error(f"gpioset error: {result.stderr}")
-            return False, result.stderr
-        logger.info(f"GPIO {gpio_pin} ({chip} line {line}) set to {value}")
-        return True, ""
-    except Exception as e:
-        logger.error(f"GPIO setting failed: {e}")
-        return False, str(e)
+# Tài nguyên phần cứng mà task sử dụng (scheduler dùng để chạy song song các task không xung đột)
+RESOURCES = [f"serial:{CO_MCU_FLASH_PORT}", f"sysfs:{PWM_CHIP}"]
+
+# Giới hạn thời gian chạy (giây), stm32flash bị treo sẽ bị kill khi quá hạn
+TIMEOUT = 180
 
 def get_fw_version(bin_file):
     # Extract version string from filename: mcu_firmware.[version_string].bin
@@ -36,8 +27,7 @@ def get_fw_version(bin_file):
         return match.group(1)
     return "unknown"
 
-def flash_comcu_firmware(bin_file, serial_port="/dev/ttyS3"):
-    PWM_CHIP = "/sys/class/pwm/pwmchip1"
+def flash_comcu_firmware(bin_file, serial_port):
     PWM = f"{PWM_CHIP}/pwm0"
 
     # Check firmware file
@@ -48,20 +38,20 @@ def flash_comcu_firmware(bin_file, serial_port="/dev/ttyS3"):
     try:
         # Export PWM if not exists
         if not os.path.isdir(PWM):
-            subprocess.run(["/usr/bin/bash", "-c", f"echo 0 > {PWM_CHIP}/export"], check=True)
+            subprocess.run([toolpaths.tool("bash"), "-c", f"echo 0 > {PWM_CHIP}/export"], check=True)
         # Set period and duty cycle
-        subprocess.run(["/usr/bin/bash", "-c", f"echo 10000 > {PWM}/period"], check=True)
-        subprocess.run(["/usr/bin/bash", "-c", f"echo 5000 > {PWM}/duty_cycle"], check=True)
+        subprocess.run([toolpaths.tool("bash"), "-c", f"echo 10000 > {PWM}/period"], check=True)
+        subprocess.run([toolpaths.tool("bash"), "-c", f"echo 5000 > {PWM}/duty_cycle"], check=True)
         # Enable PWM
-        subprocess.run(["/usr/bin/bash", "-c", f"echo 1 > {PWM}/enable"], check=True)
+        subprocess.run([toolpaths.tool("bash"), "-c", f"echo 1 > {PWM}/enable"], check=True)
         time.sleep(1)
         # Disable PWM
-        subprocess.run(["/usr/bin/bash", "-c", f"echo 0 > {PWM}/enable"], check=True)
+        subprocess.run([toolpaths.tool("bash"), "-c", f"echo 0 > {PWM}/enable"], check=True)
         # Unexport PWM
-        subprocess.run(["/usr/bin/bash", "-c", f"echo 0 > {PWM_CHIP}/unexport"], check=True)
+        subprocess.run([toolpaths.tool("bash"), "-c", f"echo 0 > {PWM_CHIP}/unexport"], check=True)
         time.sleep(3)
         # Flash firmware via UART
-        cmd = ["/usr/bin/stm32flash", "-w", bin_file, "-v", "-g", "0x0", serial_port]
+        cmd = [toolpaths.tool("stm32flash"), "-w", bin_file, "-v", "-g", "0x0", serial_port]
         result = subprocess.run(cmd, capture_output=True, text=True)
         if result.returncode != 0:
             logger.error(f"Firmware flashing failed: {result.stderr}")
@@ -72,6 +62,15 @@ def flash_comcu_firmware(bin_file, serial_port="/dev/ttyS3"):
         logger.error(f"Error while flashing firmware: {e}")
         return False, str(e)
 
+def cleanup():
+    """Được gọi khi task bị huỷ hoặc lỗi giữa chừng: tắt và unexport PWM nếu còn đang bật"""
+    PWM = f"{PWM_CHIP}/pwm0"
+    if not os.path.isdir(PWM):
+        return
+    logger.info("Cleanup: disable PWM")
+    subprocess.run([toolpaths.tool("bash"), "-c", f"echo 0 > {PWM}/enable"])
+    subprocess.run([toolpaths.tool("bash"), "-c", f"echo 0 > {PWM_CHIP}/unexport"])
+
 def test_task():
     logger.info("=== Starting MCU Test ===")
     detail_results = []
@@ -97,7 +96,7 @@ def test_task():
 
     fw_path = fw_files[0]
     fw_version = get_fw_version(fw_path)
-    fw_ok, fw_msg = flash_comcu_firmware(fw_path)
+    fw_ok, fw_msg = flash_comcu_firmware(fw_path, CO_MCU_FLASH_PORT)
     detail_results.append({
         "item": "Flash MCU FW",
         "result": "PASS" if fw_ok else "FAIL",
@@ -107,7 +106,11 @@ def test_task():
     if not fw_ok:
         return "Failed", f"MCU firmware flashing error | Version: {fw_version}", detail_results
 
+    logger.info("=== MCU Test Completed: Passed ===")
+    return "Passed", f"MCU firmware flashed | Version: {fw_version}\nSummary: 1 PASS, 0 FAIL.", detail_results
+
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     status, detail, results = test_task()
     print(status, detail)
     for r in results:
@@ -0,0 +1,12 @@
+# tests/conftest.py
+"""
+Kiểm tra hành vi của các module dùng chung (không cần board):
+
+    pip install pytest
+    python -m pytest tests
+"""
+import os
+import sys
+
+# Các module của trạm nằm ở thư mục gốc (app.py import trực tiếp: import gpio, import scheduler...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,74 @@
+# tests/test_emitter.py
+from emitter import EventBatcher
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, event, data=None, **kwargs):
+        self.emitted.append((event, data))
+
+
+def make_batcher(max_events=50):
+    socketio = FakeSocketIO()
+    return EventBatcher(socketio, max_events=max_events), socketio
+
+
+def test_status_updates_merge_per_task_with_version_range():
+    batcher, socketio = make_batcher()
+    batcher.status('A 2 Rs485', {'status': 'Running'}, 7)
+    batcher.status('A 3 Rs422', {'status': 'Pending'}, 8)
+    batcher.status('A 2 Rs485', {'status': 'Passed'}, 9)
+    batcher.flush()
+    [(event, data)] = socketio.emitted
+    assert event == 'task_status_update'
+    assert (data['from_version'], data['version']) == (7, 9)
+    assert data['tasks'] == {'A 2 Rs485': {'status': 'Passed'}, 'A 3 Rs422': {'status': 'Pending'}}
+
+
+def test_logs_join_with_seq_range():
+    batcher, socketio = make_batcher()
+    batcher.log(11, 'line 11')
+    batcher.log(12, 'line 12')
+    batcher.flush()
+    [(event, data)] = socketio.emitted
+    assert event == 'console_log_update'
+    assert (data['first_seq'], data['seq'], data['log']) == (11, 12, 'line 11\nline 12')
+
+
+def test_consecutive_batches_have_contiguous_ranges():
+    batcher, socketio = make_batcher()
+    batcher.status('A 1 System', {'status': 'Running'}, 1)
+    batcher.log(1, 'a')
+    batcher.flush()
+    batcher.status('A 1 System', {'status': 'Passed'}, 2)
+    batcher.log(2, 'b')
+    batcher.flush()
+    statuses = [data for event, data in socketio.emitted if event == 'task_status_update']
+    logs = [data for event, data in socketio.emitted if event == 'console_log_update']
+    assert [(d['from_version'], d['version']) for d in statuses] == [(1, 1), (2, 2)]
+    assert [(d['first_seq'], d['seq']) for d in logs] == [(1, 1), (2, 2)]
+
+
+def test_max_events_flushes_immediately():
+    batcher, socketio = make_batcher(max_events=2)
+    batcher.log(1, 'a')
+    assert socketio.emitted == []
+    batcher.log(2, 'b')
+    assert [event for event, _ in socketio.emitted] == ['console_log_update']
+    assert batcher.queue_depth == 0
+
+
+def test_emit_flushes_pending_batch_first():
+    batcher, socketio = make_batcher()
+    batcher.status('A 1 System', {'status': 'Passed'}, 3)
+    batcher.emit('auto_test_finished', {'result': 'Passed'})
+    assert [event for event, _ in socketio.emitted] == ['task_status_update', 'auto_test_finished']
+    assert batcher.stats()['messages_sent'] == 2
+
+
+def test_empty_flush_sends_nothing():
+    batcher, socketio = make_batcher()
+    batcher.flush()
+    assert socketio.emitted == []
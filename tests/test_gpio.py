@@ -0,0 +1,97 @@
+# tests/test_gpio.py
+import pytest
+
+import gpio
+from sim import gpio_state
+
+
+class RecordingBackend:
+    """Backend giả ghi lại từng lần set_many, có thể làm lỗi lần ghi kế tiếp."""
+
+    name = 'recording'
+
+    def __init__(self):
+        self.writes = []
+        self.released = []
+        self.fail_next = False
+
+    def set_many(self, values):
+        if self.fail_next:
+            self.fail_next = False
+            raise OSError("write failed")
+        self.writes.append(dict(values))
+
+    def release(self, gpios):
+        self.released.append(sorted(gpios))
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def backend():
+    return RecordingBackend()
+
+
+def test_unchanged_lines_are_skipped(backend):
+    controller = gpio.GpioController(backend)
+    assert controller.set_many({129: 0, 135: 0}) == (True, "")
+    assert controller.set_many({129: 0, 135: 1}) == (True, "")
+    assert controller.set_many({129: 0, 135: 1}) == (True, "")
+    assert backend.writes == [{129: 0, 135: 0}, {135: 1}]
+    assert controller.stats() == {'writes_issued': 3, 'writes_skipped': 3}
+
+
+def test_force_writes_known_values(backend):
+    controller = gpio.GpioController(backend)
+    controller.set_value(144, 1)
+    controller.set_value(144, 1, force=True)
+    assert backend.writes == [{144: 1}, {144: 1}]
+    assert controller.stats() == {'writes_issued': 2, 'writes_skipped': 0}
+
+
+def test_pending_reports_lines_that_would_change(backend):
+    controller = gpio.GpioController(backend)
+    assert controller.pending({129: 1}) == {129: 1}
+    controller.set_many({129: 1, 135: 0})
+    assert controller.pending({129: 1, 135: True}) == {135: 1}
+    assert backend.writes == [{129: 1, 135: 0}]
+
+
+def test_failed_write_forgets_values(backend):
+    controller = gpio.GpioController(backend)
+    controller.set_value(129, 1)
+    backend.fail_next = True
+    ok, error = controller.set_value(129, 0)
+    assert not ok and error == "write failed"
+    # Giá trị thực của line không còn biết chắc: lần ghi sau (kể cả giá trị cũ) phải được thực hiện
+    assert controller.set_value(129, 1) == (True, "")
+    assert backend.writes == [{129: 1}, {129: 1}]
+
+
+def test_fallback_after_primary_releases_lines(backend):
+    fallback = RecordingBackend()
+    controller = gpio.GpioController(backend, fallback)
+    backend.fail_next = True
+    assert controller.set_many({129: 1, 127: 0}) == (True, "")
+    assert backend.released == [[127, 129]]
+    assert fallback.writes == [{129: 1, 127: 0}]
+
+
+def test_close_clears_cache(backend):
+    controller = gpio.GpioController(backend)
+    controller.set_value(129, 1)
+    controller.close()
+    controller.set_value(129, 1)
+    assert backend.writes == [{129: 1}, {129: 1}]
+
+
+def test_fake_backend_writes_sim_state(tmp_path):
+    controller = gpio.GpioController(gpio.FakeBackend(str(tmp_path)))
+    assert controller.set_many({144: 1, 129: 0}) == (True, "")
+    assert gpio_state.read_gpio(144, directory=str(tmp_path)) == 1
+    assert gpio_state.read_gpio(129, directory=str(tmp_path)) == 0
+    # Lần ghi không đổi giá trị không chạm tới file
+    gpio_state.write_line('gpiochip4', 16, 0, str(tmp_path))
+    controller.set_value(144, 1)
+    assert gpio_state.read_gpio(144, directory=str(tmp_path)) == 0
@@ -0,0 +1,77 @@
+# tests/test_scheduler.py
+import threading
+
+from scheduler import build_conflict_graph, order_by_dependencies, run_tasks_parallel
+
+
+def make_task(task_id, resources=None, prerequisites=None):
+    return {'id': task_id, 'resources': resources, 'prerequisites': prerequisites or {}}
+
+
+def test_conflict_graph_shared_and_undeclared_resources():
+    tasks = [
+        make_task('rs485', ['serial:/dev/ttyACM0', 'gpio:129']),
+        make_task('rs422', ['serial:/dev/ttyACM0', 'gpio:129']),
+        make_task('mcu', ['serial:/dev/ttyS3']),
+        make_task('legacy'),  # không khai báo RESOURCES: xung đột với mọi task
+    ]
+    assert build_conflict_graph(tasks) == {
+        'rs485': {'rs422', 'legacy'},
+        'rs422': {'rs485', 'legacy'},
+        'mcu': {'legacy'},
+        'legacy': {'rs485', 'rs422', 'mcu'},
+    }
+
+
+def test_order_by_dependencies_is_stable():
+    tasks = [make_task('rs485', prerequisites={'system': []}), make_task('mcu'), make_task('system')]
+    assert [task['id'] for task in order_by_dependencies(tasks)] == ['mcu', 'system', 'rs485']
+
+
+def test_order_by_dependencies_keeps_cycles_in_place():
+    tasks = [make_task('a', prerequisites={'b': []}), make_task('b', prerequisites={'a': []}), make_task('c')]
+    assert [task['id'] for task in order_by_dependencies(tasks)] == ['c', 'a', 'b']
+
+
+def run_and_trace(tasks, **kwargs):
+    """Chạy run_tasks_parallel với task giả, trả về (thứ tự sự kiện start/end, danh sách chưa chạy)."""
+    events = []
+    lock = threading.Lock()
+
+    def run_task(task):
+        with lock:
+            events.append(('start', task['id']))
+        with lock:
+            events.append(('end', task['id']))
+
+    not_started = run_tasks_parallel(tasks, run_task, **kwargs)
+    return events, not_started
+
+
+def test_conflicting_tasks_run_in_list_order():
+    tasks = [make_task('rs485', ['serial:a']), make_task('rs422', ['serial:a']), make_task('mcu', ['serial:b'])]
+    events, not_started = run_and_trace(tasks)
+    assert not_started == []
+    assert events.index(('end', 'rs485')) < events.index(('start', 'rs422'))
+
+
+def test_prerequisite_skip_and_order():
+    tasks = [make_task('system', ['i2c:2']), make_task('rs485', ['serial:a'], {'system': []})]
+    checked = []
+
+    def skip_task(task):
+        checked.append(task['id'])
+        return task['id'] == 'rs485'
+
+    events, not_started = run_and_trace(tasks, skip_task=skip_task)
+    assert not_started == []
+    # rs485 chỉ được xét sau khi system (task điều kiện) đã chạy xong, rồi bị bỏ qua
+    assert events == [('start', 'system'), ('end', 'system')]
+    assert checked == ['system', 'rs485']
+
+
+def test_should_stop_returns_unstarted_tasks():
+    tasks = [make_task('a', ['serial:a']), make_task('b', ['serial:a'])]
+    events, not_started = run_and_trace(tasks, should_stop=lambda: True)
+    assert events == []
+    assert [task['id'] for task in not_started] == ['a', 'b']
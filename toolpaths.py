@@ -0,0 +1,40 @@
+# toolpaths.py
+"""
+Đường dẫn các công cụ hệ thống mà task gọi (gpioset, stm32flash, i2cdetect, lsusb, ip, df...).
+
+Mặc định là đường dẫn tuyệt đối trên board. Có thể thay bằng:
+- DCG_TOOL_DIR: thư mục chứa công cụ thay thế (ví dụ sim/bin), công cụ nào có trong thư mục thì
+  dùng bản đó, còn lại vẫn dùng đường dẫn mặc định;
+- DCG_TOOL_<TÊN>: đường dẫn riêng cho một công cụ, ví dụ DCG_TOOL_STM32FLASH=/opt/bin/stm32flash.
+
+    subprocess.run([toolpaths.tool('gpioset'), chip, f"{line}={value}"], ...)
+"""
+import os
+
+TOOL_DIR_ENV = 'DCG_TOOL_DIR'
+TOOL_ENV_PREFIX = 'DCG_TOOL_'
+
+DEFAULT_TOOLS = {
+    'gpioset': '/usr/bin/gpioset',
+    'stm32flash': '/usr/bin/stm32flash',
+    'i2cdetect': '/usr/sbin/i2cdetect',
+    'lsusb': '/usr/bin/lsusb',
+    'ip': '/sbin/ip',
+    'df': '/bin/df',
+    'uname': '/usr/bin/uname',
+    'modprobe': '/usr/sbin/modprobe',
+    'bash': '/usr/bin/bash',
+}
+
+
+def tool(name):
+    """Đường dẫn của công cụ `name` theo thứ tự: DCG_TOOL_<TÊN>, DCG_TOOL_DIR, mặc định."""
+    path = os.environ.get(TOOL_ENV_PREFIX + name.upper())
+    if path:
+        return path
+    directory = os.environ.get(TOOL_DIR_ENV)
+    if directory:
+        candidate = os.path.join(directory, name)
+        if os.access(candidate, os.X_OK):
+            return candidate
+    return DEFAULT_TOOLS.get(name, name)